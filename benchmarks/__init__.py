@@ -0,0 +1,5 @@
+"""性能基准测试
+
+用本地模拟服务替代B站接口、Server酱和图床，在不访问真实服务的情况下
+测量监控循环的性能，结果可保存为 JSON 在不同提交之间对比。
+"""
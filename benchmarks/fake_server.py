@@ -0,0 +1,212 @@
+"""基准测试用的模拟服务
+
+实现监控用到的全部外部接口：
+- POST /room/v1/Room/get_status_info_by_uids  批量直播状态
+- GET  /room/v1/Room/get_info                  直播间信息
+- POST /{sendkey}.send                         Server酱通知
+- POST /upload                                 图床上传
+
+支持固定延迟+抖动、按比例注入 -352/-412 风控错误，以及脚本化的开播/下播切换。
+控制接口（/__bench__/...）供基准测试进程在另一个进程中驱动模拟服务：
+- POST /__bench__/flip   {"uids": [...], "status": 1}  切换直播状态，live_time 记为切换时间
+- GET  /__bench__/stats                                 各路径的请求计数
+
+单独运行: python -m benchmarks.fake_server --port 18080 --latency 20 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlparse
+
+STATUS_PATH = '/room/v1/Room/get_status_info_by_uids'
+ROOM_INFO_PATH = '/room/v1/Room/get_info'
+ROOM_ID_OFFSET = 10_000_000
+RISK_CODES = (-352, -412)
+
+
+class FakeBilibili:
+    """模拟服务的状态"""
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """初始化模拟状态
+
+        Args:
+            latency: 每个请求的固定延迟（秒）
+            jitter: 在固定延迟上叠加的随机延迟上限（秒）
+            error_rate: 状态接口返回风控错误的概率
+            seed: 随机数种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        # uid -> (live_status, live_time)
+        self.rooms: Dict[int, tuple] = {}
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def flip(self, uids: Iterable[int], status: int) -> None:
+        """切换直播状态
+
+        live_time 记为切换时的时间（保留小数），监控记录的检测延迟即从这一刻算起。
+        """
+        now = time.time()
+        with self._lock:
+            for uid in uids:
+                self.rooms[int(uid)] = (int(status), now if status == 1 else 0)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def delay(self) -> None:
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    def risk_code(self) -> Optional[int]:
+        """按比例返回风控错误码"""
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.random.choice(RISK_CODES)
+        return None
+
+    def status_info(self, uid: int) -> dict:
+        status, live_time = self.rooms.get(uid, (0, 0))
+        return {
+            'uid': uid,
+            'room_id': ROOM_ID_OFFSET + uid,
+            'uname': f'bench_{uid}',
+            'title': f'benchmark room {uid}',
+            'live_status': status,
+            'live_time': live_time,
+            'online': self.random.randint(100, 100000) if status == 1 else 0,
+        }
+
+    def room_info(self, room_id: int) -> dict:
+        status, live_time = self.rooms.get(room_id - ROOM_ID_OFFSET, (0, 0))
+        return {
+            'room_id': room_id,
+            'title': f'benchmark room {room_id - ROOM_ID_OFFSET}',
+            'live_status': status,
+            'live_time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(live_time)) if live_time else '',
+            'user_cover': '',
+            'keyframe': '',
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeBilibili/1.0'
+
+    @property
+    def fake(self) -> FakeBilibili:
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _reply(self, data, status: int = 200) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/__bench__/stats':
+            with self.fake._lock:
+                return self._reply({'requests': dict(self.fake.requests)})
+
+        self.fake.count(url.path)
+        self.fake.delay()
+        if url.path == ROOM_INFO_PATH:
+            room_id = int(parse_qs(url.query).get('room_id', ['0'])[0])
+            return self._reply({'code': 0, 'msg': 'ok', 'data': self.fake.room_info(room_id)})
+        self._reply({'code': -404, 'message': 'not found'}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._body()
+        if url.path == '/__bench__/flip':
+            data = json.loads(body or b'{}')
+            self.fake.flip(data.get('uids', []), int(data.get('status', 1)))
+            return self._reply({'code': 0})
+
+        if url.path == STATUS_PATH:
+            path = STATUS_PATH
+        elif url.path.endswith('.send'):
+            path = '/{sendkey}.send'
+        else:
+            path = url.path
+        self.fake.count(path)
+        self.fake.delay()
+
+        if path == STATUS_PATH:
+            code = self.fake.risk_code()
+            if code is not None:
+                return self._reply({'code': code, 'message': 'risk control', 'data': None})
+            uids = json.loads(body or b'{}').get('uids', [])
+            return self._reply({
+                'code': 0,
+                'msg': 'success',
+                'data': {str(uid): self.fake.status_info(int(uid)) for uid in uids}
+            })
+        if path == '/{sendkey}.send':
+            return self._reply({'code': 0, 'message': '', 'data': {'pushid': '1', 'readkey': 'bench'}})
+        if path == '/upload':
+            return self._reply([{'src': f'/file/bench_{int(time.time() * 1000)}.png'}])
+        self._reply({'code': -404, 'message': 'not found'}, 404)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """模拟服务（每个连接一个线程）"""
+    daemon_threads = True
+
+    def __init__(self, fake: FakeBilibili, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def serve(host: str, port: int, latency: float, jitter: float, error_rate: float,
+          seed: Optional[int] = None, ready=None) -> None:
+    """运行模拟服务直到进程退出
+
+    Args:
+        ready: 可选的 multiprocessing 连接，启动后发送实际监听地址
+    """
+    server = FakeServer(FakeBilibili(latency, jitter, error_rate, seed), host, port)
+    if ready is not None:
+        ready.send(server.base_url)
+        ready.close()
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='B站接口模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--latency', type=float, default=0, help='固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='随机抖动上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='风控错误比例（0~1）')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    print(f'模拟服务监听 http://{args.host}:{args.port}')
+    serve(args.host, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""监控循环基准测试
+
+在独立进程中启动模拟服务（benchmarks.fake_server），再为每个规模（UP主数量）
+启动一个全新的进程运行 BilibiliMonitor，连续执行若干轮检查，统计：
+- 每轮检查耗时
+- 检测延迟（模拟服务切换开播状态 → 监控记录检测到）和通知延迟
+- 每轮对各接口的请求次数
+- 数据库事务数和写事务速率
+- 进程峰值内存（RSS）
+- 图床上传耗时
+
+用法:
+    python -m benchmarks.run_benchmark --scales 10,1000,10000 --output bench.json
+    python -m benchmarks.run_benchmark --compare bench.json --output bench-new.json
+
+截图需要浏览器，不在测试范围内：截图间隔设为无穷大，上传单独测量。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 对比时展示的指标：(路径, 说明, 数值越小越好)
+COMPARE_FIELDS = (
+    ('cycle_seconds.mean', '每轮耗时(s)', True),
+    ('cycle_seconds.max', '最长一轮(s)', True),
+    ('detection_latency.p50', '检测延迟p50(s)', True),
+    ('detection_latency.p99', '检测延迟p99(s)', True),
+    ('requests_per_cycle.total', '每轮请求数', True),
+    ('db_transactions_per_cycle', '每轮事务数', True),
+    ('db_writes_per_second', '写事务/秒', True),
+    ('upload_seconds.mean', '上传耗时(s)', True),
+    ('peak_rss_mb', '峰值内存(MB)', True),
+)
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        'mean': round(sum(ordered) / len(ordered), 4),
+        'p50': round(ordered[len(ordered) // 2], 4),
+        'max': round(ordered[-1], 4),
+    }
+
+
+def _server_requests(session, base_url: str) -> Dict[str, int]:
+    return session.get(f'{base_url}/__bench__/stats', timeout=10).json()['requests']
+
+
+def _write_test_image(path: str) -> None:
+    from PIL import Image
+
+    Image.new('RGB', (640, 360), (30, 120, 200)).save(path)
+
+
+def run_scale(scale: int, base_url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前进程中运行一个规模的测试（应在新进程中调用）"""
+    import requests
+
+    workdir = tempfile.mkdtemp(prefix=f'bench_{scale}_')
+    os.chdir(workdir)
+    os.makedirs('data', exist_ok=True)
+    os.environ.update({
+        'BILIBILI_API_BASE': base_url,
+        'SERVER_CHAN_API_BASE': base_url,
+        'LOG_LEVEL': options['log_level'],
+        'BATCH_SIZE': str(options['batch_size']),
+    })
+    sys.path.insert(0, PROJECT_ROOT)
+
+    from src.core import metrics
+    from src.core.database import DatabaseManager
+    from src.core.latency import summarize_latency
+    from src.core.monitor import BilibiliMonitor
+    from src.core.tracing import TRACER
+
+    mids = [str(100000 + i) for i in range(scale)]
+    # 直接写入数据库，避免项目目录下的 .env 覆盖测试配置
+    db = DatabaseManager(os.path.join('data', 'database.db'))
+    for key, value in {
+        'cloudflare_domain': base_url,
+        'cloudflare_auth_code': 'bench',
+        'server_chan_key': 'bench',
+        'bilibili_cookies': 'bench=1',
+        'monitor_mids': json.dumps(mids),
+        'check_interval': '60',
+    }.items():
+        db.set_config(key, value)
+
+    monitor = BilibiliMonitor()
+    monitor.retry_delay = 0
+    monitor.screenshot_interval = float('inf')
+
+    rng = random.Random(options['seed'])
+    session = requests.Session()
+    flips_per_cycle = max(1, int(scale * options['flip_rate'])) if options['flip_rate'] else 0
+    live = set()
+
+    # 预热一轮：建立连接、加载配置
+    monitor.run_once()
+
+    started = time.time()
+    cycles = []
+    for _ in range(options['cycles']):
+        # 本轮开始前切换一部分UP主的状态，检测延迟 = 本轮处理到该UP主的时间
+        flipped = rng.sample(mids, flips_per_cycle)
+        going_live = [int(mid) for mid in flipped if mid not in live]
+        going_off = [int(mid) for mid in flipped if mid in live]
+        for uids, status in ((going_live, 1), (going_off, 0)):
+            if uids:
+                session.post(f'{base_url}/__bench__/flip', json={'uids': uids, 'status': status}, timeout=30)
+        live.symmetric_difference_update(flipped)
+
+        before = _server_requests(session, base_url)
+        transactions_before = sum(count for count, _ in metrics.DB_TRANSACTION_SECONDS.totals().values())
+        writes_before = sum(metrics.DB_WRITES.values().values())
+        cycle_start = time.perf_counter()
+        with TRACER.trace('cycle'):
+            monitor.run_once()
+        duration = time.perf_counter() - cycle_start
+        after = _server_requests(session, base_url)
+
+        cycles.append({
+            'seconds': duration,
+            'requests': {path: after.get(path, 0) - before.get(path, 0) for path in after},
+            'transactions': sum(count for count, _ in metrics.DB_TRANSACTION_SECONDS.totals().values())
+            - transactions_before,
+            'writes': sum(metrics.DB_WRITES.values().values()) - writes_before,
+        })
+    monitor.samples.flush_all()
+
+    latency = summarize_latency(db.get_latency_records(since=started))['overall']
+
+    upload_times = []
+    image_path = os.path.join(workdir, 'bench.png')
+    _write_test_image(image_path)
+    for _ in range(options['uploads']):
+        upload_start = time.perf_counter()
+        monitor.uploader.upload_image(image_path)
+        upload_times.append(time.perf_counter() - upload_start)
+
+    total_seconds = sum(cycle['seconds'] for cycle in cycles)
+    paths = sorted({path for cycle in cycles for path in cycle['requests']})
+    requests_per_cycle = {
+        path: round(sum(cycle['requests'].get(path, 0) for cycle in cycles) / len(cycles), 2)
+        for path in paths
+    }
+    requests_per_cycle['total'] = round(sum(requests_per_cycle.values()), 2)
+
+    return {
+        'mids': scale,
+        'cycles': len(cycles),
+        'flips_per_cycle': flips_per_cycle,
+        'cycle_seconds': _stats([cycle['seconds'] for cycle in cycles]),
+        'detection_latency': latency['detection'],
+        'notification_latency': latency['notification'],
+        'requests_per_cycle': requests_per_cycle,
+        'db_transactions_per_cycle': round(sum(c['transactions'] for c in cycles) / len(cycles), 2),
+        'db_writes_per_cycle': round(sum(c['writes'] for c in cycles) / len(cycles), 2),
+        'db_writes_per_second': round(sum(c['writes'] for c in cycles) / total_seconds, 2) if total_seconds else 0,
+        'upload_seconds': _stats(upload_times),
+        # Linux 下 ru_maxrss 的单位是 KB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _scale_worker(scale: int, base_url: str, options: Dict[str, Any], conn) -> None:
+    try:
+        conn.send({'ok': True, 'result': run_scale(scale, base_url, options)})
+    except BaseException as e:
+        conn.send({'ok': False, 'error': f'{type(e).__name__}: {e}'})
+    finally:
+        conn.close()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _lookup(data: Dict[str, Any], path: str):
+    for part in path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """生成与基准结果的对比表"""
+    lines = [f"基准: {baseline.get('revision') or '?'}  当前: {current.get('revision') or '?'}"]
+    old_scales = {str(item['mids']): item for item in baseline.get('results', [])}
+    for item in current.get('results', []):
+        old = old_scales.get(str(item['mids']))
+        lines.append(f"\n== {item['mids']} 个UP主 ==")
+        if old is None:
+            lines.append('  基准结果中没有该规模')
+            continue
+        for path, label, lower_is_better in COMPARE_FIELDS:
+            before, after = _lookup(old, path), _lookup(item, path)
+            if before is None or after is None:
+                continue
+            change = ''
+            if before:
+                ratio = (after - before) / before * 100
+                worse = ratio > 0 if lower_is_better else ratio < 0
+                change = f"{ratio:+.1f}%{'  ⚠' if worse and abs(ratio) >= 10 else ''}"
+            lines.append(f"  {label:<16} {before:>12} → {after:<12} {change}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='监控循环基准测试')
+    parser.add_argument('--scales', default='10,1000,10000', help='UP主数量，逗号分隔')
+    parser.add_argument('--cycles', type=int, default=5, help='每个规模运行的轮数')
+    parser.add_argument('--flip-rate', type=float, default=0.01, help='每轮切换开播状态的UP主比例')
+    parser.add_argument('--latency', type=float, default=20, help='模拟接口延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=10, help='模拟接口延迟抖动（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='状态接口风控错误比例（0~1）')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--uploads', type=int, default=5, help='图床上传测试次数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log-level', default='ERROR')
+    parser.add_argument('--output', help='结果保存路径（JSON）')
+    parser.add_argument('--compare', help='与该基准结果文件对比')
+    args = parser.parse_args()
+
+    from benchmarks.fake_server import serve
+
+    ctx = multiprocessing.get_context('spawn')
+    ready_recv, ready_send = ctx.Pipe(duplex=False)
+    server = ctx.Process(
+        target=serve,
+        args=('127.0.0.1', 0, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed, ready_send),
+        daemon=True
+    )
+    server.start()
+    base_url = ready_recv.recv()
+    print(f'模拟服务: {base_url}', file=sys.stderr)
+
+    options = {
+        'cycles': args.cycles,
+        'flip_rate': args.flip_rate,
+        'batch_size': args.batch_size,
+        'uploads': args.uploads,
+        'seed': args.seed,
+        'log_level': args.log_level,
+    }
+    results = []
+    try:
+        for scale in [int(value) for value in args.scales.split(',') if value.strip()]:
+            print(f'运行 {scale} 个UP主 ...', file=sys.stderr)
+            recv, send = ctx.Pipe(duplex=False)
+            worker = ctx.Process(target=_scale_worker, args=(scale, base_url, options, send))
+            worker.start()
+            send.close()
+            try:
+                message = recv.recv()
+            except EOFError:
+                message = {'ok': False, 'error': f'进程异常退出（exit code {worker.exitcode}）'}
+            worker.join()
+            if not message['ok']:
+                print(f'  失败: {message["error"]}', file=sys.stderr)
+                continue
+            results.append(message['result'])
+            result = message['result']
+            print(
+                f"  每轮 {result['cycle_seconds'].get('mean')}s，"
+                f"检测延迟p50 {result['detection_latency'].get('p50')}s，"
+                f"峰值内存 {result['peak_rss_mb']}MB",
+                file=sys.stderr
+            )
+    finally:
+        server.terminate()
+
+    report = {
+        'revision': _git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'options': dict(options, latency_ms=args.latency, jitter_ms=args.jitter, error_rate=args.error_rate),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), report))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,39 @@ from src.api.app import create_app
 
 def main():
     try:
-        app = create_app()
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=8000,
-            reload=False
-        )
+        # python run.py monitor: 以独立进程运行监控（配合 MONITOR_MODE=process）
+        if len(sys.argv) > 1 and sys.argv[1] == 'monitor':
+            from src.core.monitor_process import main as run_monitor_process
+            run_monitor_process()
+            return 0
+        
+        # python run.py replay <录制文件>: 在虚拟时钟上回放录制的上游流量并对比结果
+        if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+            from src.core.replay import main as run_replay
+            return run_replay(sys.argv[2:])
+        
+        workers = int(os.getenv('API_WORKERS', '1'))
+        if workers > 1 and os.getenv('MONITOR_MODE', 'thread').lower() != 'process':
+            print("多worker运行需要设置 MONITOR_MODE=process，否则每个worker都会启动一个监控")
+            return 1
+        if workers > 1:
+            # 多worker需要通过导入路径创建应用
+            uvicorn.run(
+                "src.api.app:create_app",
+                factory=True,
+                host="0.0.0.0",
+                port=8000,
+                workers=workers,
+                reload=False
+            )
+        else:
+            app = create_app()
+            uvicorn.run(
+                app,
+                host="0.0.0.0",
+                port=8000,
+                reload=False
+            )
     except KeyboardInterrupt:
         print("\n程序已停止")
     except Exception as e:
@@ -1,18 +1,26 @@
 """FastAPI应用程序"""
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from src.core.config import ConfigManager
-from src.core.database import DatabaseManager
-from src.core.monitor import BilibiliMonitor
-from src.utils.init_project import init_project
-import os
-from loguru import logger
-import threading
-from .routes import config, monitor as monitor_routes  # 重命名避免冲突
+from src.core.startup import STARTUP
+
+with STARTUP.phase('import.api'):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from src.core import metrics
+    from src.core.watchdog import WATCHDOG
+    from src.core.config import ConfigManager
+    from src.core.monitor import BilibiliMonitor
+    from src.core.monitor_process import MonitorClient
+    from src.core.imagestore import ImageStore
+    from src.utils.init_project import init_project
+    import os
+    from loguru import logger
+    import threading
+    from .routes import config, debug, images, tenants, monitor as monitor_routes  # 重命名避免冲突
 
 def create_app() -> FastAPI:
-    # 初始化项目
-    init_project()
+    # 初始化项目（同时创建数据库管理器，后续组件共用）
+    with STARTUP.phase('init_project'):
+        db_manager = init_project()
     
     # 创建FastAPI应用
     app = FastAPI(
@@ -30,23 +38,41 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
-    # 初始化核心组件
-    db_manager = DatabaseManager(os.path.join('data', 'database.db'))
-    config_manager = ConfigManager(db_manager)
-    monitor = BilibiliMonitor()
+    # 初始化核心组件（每个只创建一次）
+    with STARTUP.phase('config'):
+        config_manager = ConfigManager(db_manager)
+    
+    # process 模式下监控运行在独立进程中（python run.py monitor），
+    # API进程只读取共享快照，可以安全地启动多个worker
+    monitor_mode = os.getenv('MONITOR_MODE', 'thread').lower()
+    with STARTUP.phase('monitor'):
+        if monitor_mode == 'process':
+            monitor = MonitorClient()
+        else:
+            monitor = BilibiliMonitor(db_manager, config_manager)
     
     # 存储实例到应用状态
     app.state.db_manager = db_manager
     app.state.config_manager = config_manager
     app.state.monitor = monitor
+    # process 模式下截图由监控进程写入同一目录并负责配额淘汰，API进程只读取和生成缩略图
+    app.state.image_store = getattr(monitor, 'images', None) or ImageStore(evict=False)
     
     # 注册路由
     app.include_router(config.router)
     app.include_router(monitor_routes.router)  # 使用重命名后的路由
+    app.include_router(tenants.router)
+    app.include_router(images.router)
+    app.include_router(debug.router)
     
     @app.on_event("startup")
     async def startup_event():
         """启动时执行"""
+        STARTUP.mark_ready()
+        if monitor_mode == 'process':
+            logger.info("监控运行在独立进程中，API进程不启动监控线程")
+            return
+        
         # 验证配置
         if not config_manager.validate_config():
             logger.error("配置验证失败")
@@ -59,18 +85,36 @@ def create_app() -> FastAPI:
             except Exception as e:
                 logger.error(f"监控线程异常: {str(e)}")
                 
-        monitor_thread = threading.Thread(target=run_monitor, daemon=True)
+        monitor_thread = threading.Thread(target=run_monitor, name='monitor', daemon=True)
         monitor_thread.start()
+        WATCHDOG.watch_thread(monitor_thread)
         logger.info("监控线程已启动")
     
     @app.on_event("shutdown")
     async def shutdown_event():
         """关闭时执行"""
         logger.info("应用正在关闭...")
+        if monitor_mode != 'process':
+            monitor.stop()
     
     @app.get("/health")
     async def health_check():
         """健康检查端点（无需鉴权）"""
         return {"status": "ok"}
     
+    @app.get("/ready")
+    async def readiness_check():
+        """就绪检查端点（无需鉴权），检测落后或组件卡住时返回503"""
+        state = monitor.readiness()
+        return JSONResponse(state, status_code=200 if state['ready'] else 503)
+    
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        """Prometheus指标（无需鉴权）"""
+        text = metrics.REGISTRY.render()
+        if monitor_mode == 'process':
+            # 监控指标由监控进程随快照一起发布
+            text += monitor.metrics_text
+        return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+    
     return app
@@ -3,6 +3,7 @@ from fastapi import Request, HTTPException, Security
 from fastapi.security.api_key import APIKeyHeader
 from src.core.config import ConfigManager
 from src.core.monitor import BilibiliMonitor
+from src.core.database import DatabaseManager
 import os
 
 # 创建API密钥头部验证器
@@ -39,3 +40,10 @@ def get_monitor(
 ) -> BilibiliMonitor:
     """获取监控实例"""
     return request.app.state.monitor
+
+def get_db_manager(
+    request: Request,
+    api_key: str = Security(verify_api_key)
+) -> DatabaseManager:
+    """获取数据库管理器实例"""
+    return request.app.state.db_manager
@@ -0,0 +1,66 @@
+"""诊断相关路由"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any, List, Optional
+from ..dependencies import get_monitor, verify_api_key
+from src.core.monitor import BilibiliMonitor
+from src.core.profiler import format_collapsed
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["诊断"],
+    dependencies=[Depends(verify_api_key)]
+)
+
+@router.get("/traces")
+async def get_traces(
+    limit: int = Query(10, ge=1, le=1000),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> List[Dict[str, Any]]:
+    """获取最近若干轮检查的阶段耗时树"""
+    return await run_in_threadpool(monitor.get_traces, limit)
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0, le=300),
+    interval: float = Query(0.01, ge=0.001, le=1),
+    thread: Optional[str] = Query(None, description="只采样名称包含该字符串的线程"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+):
+    """在指定时间窗口内对监控进程进行采样分析
+    
+    collapsed 格式可直接用于 flamegraph.pl 或 speedscope
+    """
+    try:
+        result = await run_in_threadpool(monitor.profile, seconds, interval, thread)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return result
+    return PlainTextResponse(format_collapsed(result))
+
+@router.get("/startup")
+async def get_startup(
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, Any]:
+    """获取启动各阶段耗时（含按需加载的子系统）
+    
+    process 模式下 monitor 字段为监控进程的启动耗时
+    """
+    return await run_in_threadpool(monitor.startup_report)
+
+@router.get("/identities")
+async def get_identities(
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> List[Dict[str, Any]]:
+    """获取请求身份池状态（健康度、冷却剩余时间、请求数）"""
+    return await run_in_threadpool(monitor.identity_stats)
+
+@router.get("/transport")
+async def get_transport(
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, Any]:
+    """获取出站HTTP按主机的请求数、平均耗时、P95 和错误数"""
+    return await run_in_threadpool(monitor.transport_stats)
@@ -0,0 +1,40 @@
+"""截图访问路由
+
+不需要API密钥：摘要（SHA-256）不可猜测，通知中的链接需要直接在手机等客户端打开。
+"""
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from src.core.imagestore import DIGEST_PATTERN
+
+router = APIRouter(
+    prefix="/images",
+    tags=["图片"]
+)
+
+# 内容按摘要寻址，永不改变
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+@router.get("/{digest}")
+async def get_image(
+    digest: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, description="缩略图宽度（取不小于它的预设宽度）")
+):
+    """获取截图原图或缩略图（支持 ETag 和 Range）"""
+    store = request.app.state.image_store
+    if store is None or not DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+    etag = f'"{digest}"' if w is None else f'"{digest}-{w}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'Cache-Control': CACHE_CONTROL, 'ETag': etag})
+
+    if w is None:
+        path = store.path(digest)
+    else:
+        path = await run_in_threadpool(store.thumbnail, digest, w)
+    if path is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return FileResponse(path, headers={'Cache-Control': CACHE_CONTROL, 'ETag': etag})
@@ -1,9 +1,19 @@
 """监控相关路由"""
-from fastapi import APIRouter, Depends, HTTPException, Security
-from typing import Dict, Any, List
-from ..dependencies import get_monitor, get_config_manager, verify_api_key
+from fastapi import APIRouter, Depends, HTTPException, Query, Security
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional
+from ..dependencies import get_monitor, get_config_manager, get_db_manager, verify_api_key
 from src.core.monitor import BilibiliMonitor
 from src.core.config import ConfigManager
+from src.core.database import DatabaseManager
+from src.core.engagement import summarize_metrics
+from src.core.timeseries import load_samples
+from src.core.latency import summarize_latency
+from src.core.history import compute_streak, group_by_period, merge_live_sessions
+from src.core.export import to_csv, to_ndjson
+from src.core.maintenance import LiveArchive
+import datetime
+import itertools
 import json
 import logging
 
@@ -21,7 +31,7 @@ async def get_monitor_status(
     return {
         "monitor_mids": monitor.monitor_mids,
         "check_interval": monitor.check_interval,
-        "status_cache": monitor.status_cache
+        "status_cache": {mid: dict(status) for mid, status in monitor.status_cache.items()}
     }
 
 @router.get("/live/{mid}")
@@ -33,7 +43,137 @@ async def get_live_status(
     status = monitor.check_live_status(mid)
     if not status:
         raise HTTPException(status_code=404, detail="获取直播状态失败")
-    return status
+    return dict(status)
+
+@router.get("/live/{mid}/metrics")
+async def get_live_metrics(
+    mid: str,
+    live_id: Optional[int] = None,
+    db: DatabaseManager = Depends(get_db_manager)
+) -> Dict[str, Any]:
+    """获取一场直播的逐分钟互动数据（默认最近一场）"""
+    if live_id is None:
+        live_id = db.get_latest_live_id(mid)
+    if live_id is None:
+        raise HTTPException(status_code=404, detail="没有直播记录")
+    return {
+        "mid": mid,
+        "live_id": live_id,
+        "series": summarize_metrics(db.get_live_metrics(live_id))
+    }
+
+@router.get("/live/{mid}/changes")
+async def get_live_changes(
+    mid: str,
+    live_id: Optional[int] = None,
+    db: DatabaseManager = Depends(get_db_manager)
+) -> Dict[str, Any]:
+    """获取一场直播中的标题、封面、分区变化（默认最近一场）"""
+    if live_id is None:
+        live_id = db.get_latest_live_id(mid)
+    if live_id is None:
+        raise HTTPException(status_code=404, detail="没有直播记录")
+    return {
+        "mid": mid,
+        "live_id": live_id,
+        "changes": db.get_live_changes(live_id)
+    }
+
+@router.get("/live/{mid}/samples")
+async def get_live_samples(
+    mid: str,
+    live_id: Optional[int] = None,
+    points: Optional[int] = Query(None, ge=1, le=10000),
+    db: DatabaseManager = Depends(get_db_manager)
+) -> Dict[str, Any]:
+    """获取一场直播的采样序列（默认最近一场），可指定最大点数进行降采样"""
+    if live_id is None:
+        live_id = db.get_latest_live_id(mid)
+    if live_id is None:
+        raise HTTPException(status_code=404, detail="没有直播记录")
+    return {
+        "mid": mid,
+        "live_id": live_id,
+        "series": load_samples(db, live_id, points)
+    }
+
+@router.get("/latency")
+async def get_detection_latency(
+    mid: Optional[str] = None,
+    since: Optional[float] = Query(None, description="只统计该时间（Unix时间戳）之后的开播"),
+    db: DatabaseManager = Depends(get_db_manager)
+) -> Dict[str, Any]:
+    """获取开播检测延迟和通知延迟的分位数（总体及每个UP主）"""
+    return summarize_latency(db.get_latency_records(mid, since))
+
+def _daily_history(db: DatabaseManager, mid: Optional[str], start: Optional[str],
+                   end: Optional[str], include_live: bool) -> List[Dict[str, Any]]:
+    """读取按天汇总的直播时长，可选补上正在进行的直播"""
+    rows = db.get_daily_rollups(mid, start, end)
+    open_records = []
+    if include_live:
+        open_records = [
+            record for record in db.get_open_live_records()
+            if mid is None or str(record['mid']) == str(mid)
+        ]
+    return merge_live_sessions(rows, open_records, datetime.datetime.now(), start, end)
+
+@router.get("/history")
+async def get_history(
+    mid: Optional[str] = None,
+    start: Optional[datetime.date] = Query(None, description="起始日期（含）"),
+    end: Optional[datetime.date] = Query(None, description="结束日期（含）"),
+    period: str = Query("day", pattern="^(day|week)$"),
+    include_live: bool = Query(True, description="是否计入正在进行的直播"),
+    db: DatabaseManager = Depends(get_db_manager)
+) -> List[Dict[str, Any]]:
+    """按天或按周统计每个UP主的直播时长和场次"""
+    rows = _daily_history(
+        db, mid,
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+        include_live
+    )
+    return group_by_period(rows, period)
+
+@router.get("/history/{mid}/streak")
+async def get_streak(
+    mid: str,
+    lookback: int = Query(365, ge=1, le=3650, description="统计最近多少天"),
+    db: DatabaseManager = Depends(get_db_manager)
+) -> Dict[str, Any]:
+    """获取UP主的连续直播天数"""
+    today = datetime.date.today()
+    start = (today - datetime.timedelta(days=lookback - 1)).isoformat()
+    rows = _daily_history(db, mid, start, today.isoformat(), True)
+    return {"mid": mid, **compute_streak((row['day'] for row in rows if row['seconds'] > 0), today)}
+
+@router.get("/export")
+async def export_live_records(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[float] = Query(None, description="只导出该时间（Unix时间戳）之后开播的记录"),
+    mid: Optional[str] = None,
+    include_archive: bool = Query(False, description="同时导出已归档的记录（先输出归档部分）"),
+    db: DatabaseManager = Depends(get_db_manager)
+) -> StreamingResponse:
+    """流式导出直播记录及截图
+    
+    ndjson 每场直播一行（截图嵌套在 screenshots 中）；csv 与截图表左连接，每张截图一行。
+    """
+    since_time = datetime.datetime.fromtimestamp(since).isoformat(' ') if since is not None else None
+    records = db.iter_live_records(since_time, mid)
+    if include_archive:
+        records = itertools.chain(LiveArchive().iter_records(since_time, mid), records)
+    if format == 'csv':
+        body, media_type = to_csv(records), 'text/csv; charset=utf-8'
+    else:
+        body, media_type = to_ndjson(records), 'application/x-ndjson'
+    filename = f"live_records{'_' + mid if mid else ''}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/subscribers")
 async def get_subscribers(
@@ -140,9 +280,10 @@ async def remove_subscriber(
         # 立即更新监控器的列表
         monitor.update_monitor_list()
         
-        # 清理相关配置
-        config.db.set_config(f'last_status_{mid}', None)
-        config.db.set_config(f'name_{mid}', None)
+        # 清理相关配置（仍有租户订阅时保留）
+        if not config.db.count_tenant_subscribers(mid):
+            config.db.delete_config(f'last_status_{mid}')
+            config.db.delete_config(f'name_{mid}')
         
         return {"message": f"已移除用户 {mid}"}
     except ValueError:
@@ -157,4 +298,4 @@ async def get_subscriber_info(
     status = monitor.check_live_status(mid)
     if not status:
         raise HTTPException(status_code=404, detail="获取用户信息失败")
-    return status
+    return dict(status)
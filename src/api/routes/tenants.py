@@ -0,0 +1,136 @@
+"""租户相关路由"""
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Any, List, Optional
+from ..dependencies import get_db_manager, get_monitor, verify_api_key
+from src.core.monitor import BilibiliMonitor
+from src.core.database import DatabaseManager
+import json
+
+router = APIRouter(
+    prefix="/tenants",
+    tags=["租户管理"],
+    dependencies=[Depends(verify_api_key)]
+)
+
+def _mask(key: Optional[str]) -> Optional[str]:
+    """只显示密钥的前几位"""
+    return f"{key[:6]}***" if key else None
+
+def _get_tenant(db: DatabaseManager, tenant_id: str) -> Dict[str, Any]:
+    tenant = next((tenant for tenant in db.get_tenants() if tenant['id'] == tenant_id), None)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="租户不存在")
+    return tenant
+
+@router.get("")
+async def get_tenants(
+    db: DatabaseManager = Depends(get_db_manager)
+) -> List[Dict[str, Any]]:
+    """获取所有租户"""
+    return [
+        dict(tenant, server_chan_key=_mask(tenant['server_chan_key']),
+             notify_title_change=bool(tenant['notify_title_change']))
+        for tenant in db.get_tenants()
+    ]
+
+@router.put("/{tenant_id}")
+async def save_tenant(
+    tenant_id: str,
+    name: Optional[str] = None,
+    server_chan_key: Optional[str] = None,
+    notify_title_change: bool = True,
+    db: DatabaseManager = Depends(get_db_manager),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, Any]:
+    """创建或更新租户（名称、Server酱密钥、是否接收标题变更通知）"""
+    created = db.save_tenant(tenant_id, name or tenant_id, server_chan_key, notify_title_change)
+    monitor.update_monitor_list()
+    return {"message": "创建成功" if created else "更新成功", "id": tenant_id}
+
+@router.delete("/{tenant_id}")
+async def delete_tenant(
+    tenant_id: str,
+    db: DatabaseManager = Depends(get_db_manager),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, str]:
+    """删除租户及其全部订阅"""
+    mids = [mid for _, mid in db.get_tenant_subscriptions(tenant_id)]
+    if not db.delete_tenant(tenant_id):
+        raise HTTPException(status_code=404, detail="租户不存在")
+    monitor.update_monitor_list()
+    for mid in mids:
+        _cleanup_unwatched(db, mid)
+    return {"message": f"已删除租户 {tenant_id}"}
+
+@router.get("/{tenant_id}/subscribers")
+async def get_tenant_subscribers(
+    tenant_id: str,
+    db: DatabaseManager = Depends(get_db_manager),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> List[Dict[str, Any]]:
+    """获取租户的订阅列表（状态来自共享的状态缓存）"""
+    _get_tenant(db, tenant_id)
+    status_cache = monitor.status_cache
+    result = []
+    for _, mid in db.get_tenant_subscriptions(tenant_id):
+        status_info = status_cache.get(mid) or {}
+        result.append({
+            "mid": mid,
+            "name": status_info.get('name') or db.get_config(f'name_{mid}', '未知'),
+            "status": status_info.get('status', 0),
+            "room_id": status_info.get('room_id'),
+            "title": status_info.get('title')
+        })
+    return result
+
+@router.post("/{tenant_id}/subscribers/{mid}")
+async def add_tenant_subscriber(
+    tenant_id: str,
+    mid: str,
+    db: DatabaseManager = Depends(get_db_manager),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, Any]:
+    """为租户添加订阅（已在监控中的UP主不再请求上游验证）"""
+    _get_tenant(db, tenant_id)
+    try:
+        int(mid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的用户ID格式")
+
+    status = monitor.status_cache.get(mid)
+    if not status:
+        # 尚未被任何人监控，验证用户ID是否有效
+        status = monitor.check_live_status(mid)
+        if not status:
+            raise HTTPException(status_code=400, detail="无效的用户ID")
+        db.set_config(f'name_{mid}', status.get('name', '未知'))
+
+    added = db.add_tenant_subscription(tenant_id, mid)
+    monitor.update_monitor_list()
+    return {
+        "message": "添加成功" if added else "用户已在订阅列表中",
+        "name": status.get('name', '未知'),
+        "mid": mid
+    }
+
+@router.delete("/{tenant_id}/subscribers/{mid}")
+async def remove_tenant_subscriber(
+    tenant_id: str,
+    mid: str,
+    db: DatabaseManager = Depends(get_db_manager),
+    monitor: BilibiliMonitor = Depends(get_monitor)
+) -> Dict[str, str]:
+    """移除租户的订阅（没有其他订阅者时同时停止监控）"""
+    if not db.remove_tenant_subscription(tenant_id, mid):
+        raise HTTPException(status_code=404, detail="用户不在订阅列表中")
+    monitor.update_monitor_list()
+    _cleanup_unwatched(db, mid)
+    return {"message": f"已移除用户 {mid}"}
+
+def _cleanup_unwatched(db: DatabaseManager, mid: str) -> None:
+    """UP主不再被默认监控列表和任何租户订阅时清理相关配置"""
+    default_mids = json.loads(db.get_config('monitor_mids', '[]') or '[]')
+    if mid in default_mids or db.count_tenant_subscribers(mid):
+        return
+    db.delete_config(f'last_status_{mid}')
+    db.delete_config(f'name_{mid}')
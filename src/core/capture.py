@@ -0,0 +1,164 @@
+"""上游流量录制
+
+设置 CAPTURE_PATH 后，监控收到的每个上游响应（B站接口、Server酱、图床）都会连同时间戳
+写入 gzip 压缩的 JSON Lines 文件；同时记录检查周期、推送、状态变化和截图等事件，
+供 src.core.replay 在虚拟时钟上重放并与原始运行对比。
+
+记录格式（每行一个 JSON 对象，t 为 Unix 时间戳）：
+- {"type": "meta", ...}        录制开始时的监控配置和初始状态
+- {"type": "http", "key", "status", "body"} / {"type": "http", "key", "error"}
+- {"type": "reconcile", "mids"} 启动校准开始
+- {"type": "cycle"}            一轮检查开始（监控列表变化时带 mids）
+- {"type": "push", "room_id", "mid", "status", "detected_at"}
+- {"type": "transition", "mid", "status"}
+- {"type": "screenshot", "mid"}
+"""
+import atexit
+import gzip
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from loguru import logger
+from requests.adapters import BaseAdapter
+
+from . import clock
+from .transport import TRANSPORT
+
+
+def request_key(method: str, url: str, body=None) -> str:
+    """生成用于匹配录制响应的请求键
+
+    只取路径和查询参数；批量状态接口附加 uids，
+    通知和上传的请求体包含时间等易变内容，不参与匹配。
+    """
+    parsed = urlparse(url)
+    # 密钥类参数在回放环境中不同，不参与匹配
+    query = urlencode(sorted((name, value) for name, value in parse_qsl(parsed.query) if name != 'authCode'))
+    path = '/{sendkey}.send' if parsed.path.endswith('.send') else parsed.path
+    key = f"{method.upper()} {path}" + (f"?{query}" if query else '')
+    if body and parsed.path.endswith('get_status_info_by_uids'):
+        try:
+            uids = json.loads(body).get('uids', [])
+            key += ' uids=' + ','.join(str(uid) for uid in uids)
+        except (ValueError, AttributeError):
+            pass
+    return key
+
+
+def notification_title(body) -> Optional[str]:
+    """从 Server酱请求体中取出通知标题"""
+    try:
+        return json.loads(body).get('title')
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class _RecordingAdapter(BaseAdapter):
+    """记录响应的传输适配器
+
+    请求交给共享的传输适配器发送，录制时的连接池和长连接行为与正常运行一致。
+    """
+    def __init__(self, recorder: 'TrafficRecorder', adapter=None):
+        super().__init__()
+        self.recorder = recorder
+        self.adapter = adapter or TRANSPORT.adapter
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        try:
+            response = self.adapter.send(request, **kwargs)
+        except Exception as e:
+            self.recorder.write({'type': 'http', 'key': key, 'error': f"{type(e).__name__}: {e}"})
+            raise
+        record = {
+            'type': 'http',
+            'key': key,
+            'status': response.status_code,
+            'body': response.content.decode('utf-8', errors='replace'),
+        }
+        if request.url.endswith('.send'):
+            record['title'] = notification_title(request.body)
+        self.recorder.write(record)
+        return response
+
+    def close(self):
+        # 共享适配器不随会话关闭
+        pass
+
+
+class TrafficRecorder:
+    """流量录制器"""
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        """初始化录制器
+
+        Args:
+            path: 录制文件路径（追加写入，gzip 多成员格式可直接连续读取）
+            flush_interval: 写入缓冲的最长保留时间（秒）
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+        logger.info(f"流量录制已开启: {path}")
+
+    def attach(self, *sessions) -> None:
+        """为 requests 会话挂载录制适配器"""
+        adapter = _RecordingAdapter(self)
+        for session in sessions:
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+    def event(self, kind: str, **data: Any) -> None:
+        """记录一个事件"""
+        self.write({'type': kind, **data})
+
+    def write(self, record: Dict[str, Any]) -> None:
+        record.setdefault('t', clock.now())
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + '\n')
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class MemoryRecorder(TrafficRecorder):
+    """只在内存中保存记录（回放时收集结果）"""
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        record.setdefault('t', clock.now())
+        with self._lock:
+            self.records.append(record)
+
+    def close(self) -> None:
+        pass
+
+
+def load_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """读取录制文件（末尾未完整写入的行会被忽略）"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("录制文件中存在不完整的记录，已跳过")
+        except EOFError:
+            # 进程被强制终止时最后一个 gzip 成员可能不完整
+            logger.warning("录制文件末尾不完整，已读取到可用部分")
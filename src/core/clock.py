@@ -0,0 +1,75 @@
+"""时钟
+
+监控逻辑中与时间相关的判断（缓存有效期、截图间隔、检测时间、重试等待）统一通过
+本模块取时间和等待，回放流量时替换为虚拟时钟，即可按录制时的时间线快速重跑。
+定时任务（src.core.timers）使用单调时间，不受系统时间调整影响；虚拟时钟的单调时间与 now 相同。
+"""
+import threading
+import time
+
+
+class SystemClock:
+    """系统时钟"""
+    def now(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """虚拟时钟：sleep 只推进时间，不实际等待"""
+    def __init__(self, start: float):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+
+    def set(self, timestamp: float) -> None:
+        """跳到指定时间
+
+        回放时以录制的时间线为准，等待期间多推进的时间会在下一次同步时校正。
+        """
+        with self._lock:
+            self._now = float(timestamp)
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    """获取当前使用的时钟"""
+    return _clock
+
+
+def set_clock(clock) -> None:
+    """替换全局时钟（回放时使用）"""
+    global _clock
+    _clock = clock
+
+
+def now() -> float:
+    """当前时间（Unix时间戳）"""
+    return _clock.now()
+
+
+def monotonic() -> float:
+    """单调时间（秒），只用于计算间隔"""
+    return _clock.monotonic()
+
+
+def sleep(seconds: float) -> None:
+    """等待指定秒数"""
+    _clock.sleep(seconds)
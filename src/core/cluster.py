@@ -0,0 +1,275 @@
+"""分片集群模块
+
+多个监控节点共享同一个数据库时，通过租约瓜分 mid 空间：
+- mid 按哈希落入固定数量的分片
+- 分片通过一致性哈希分配给存活节点
+- 节点定期心跳并续租，失联节点的租约过期后由其他节点接管，正常停止的节点立即释放租约
+- 续租持续失败（数据库被锁或不可用）时，本节点在租约可能被接管之前停止处理全部分片
+
+部署要求：
+- 租约的过期判断比较的是各节点各自的系统时间，节点之间的时钟需要同步（NTP）。
+  接管前额外等待 CLUSTER_CLOCK_SKEW 秒（默认2秒），容忍不超过该值的时钟偏差；
+  偏差更大时，两个节点可能在一段时间内同时认为自己持有同一分片。
+- SQLiteLeaseStore 依赖 SQLite 的文件锁（WAL 模式还依赖共享内存），只适用于所有节点
+  运行在同一台主机、访问同一本地文件系统上的数据库（例如同一主机上的多个进程或容器）。
+  SQLite 在 NFS/SMB 等网络文件系统上的锁不可靠，跨主机部署需要换用基于共享服务的租约存储。
+"""
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from loguru import logger
+
+
+def _hash(value: str) -> int:
+    """稳定的64位哈希（不受 PYTHONHASHSEED 影响）"""
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class SQLiteLeaseStore:
+    """基于共享SQLite数据库的租约存储"""
+    def __init__(self, db_manager):
+        """初始化租约存储
+
+        Args:
+            db_manager: 数据库管理器
+        """
+        self.db = db_manager
+
+    def heartbeat(self, node_id: str, now: float) -> None:
+        """上报节点心跳"""
+        with self.db.get_connection() as conn:
+            conn.execute('''
+            INSERT INTO cluster_nodes (node_id, heartbeat) VALUES (?, ?)
+            ON CONFLICT(node_id) DO UPDATE SET heartbeat = ?
+            ''', (node_id, now, now))
+
+    def live_nodes(self, since: float) -> List[str]:
+        """获取心跳时间晚于 since 的节点"""
+        with self.db.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT node_id FROM cluster_nodes WHERE heartbeat >= ?', (since,)
+            ).fetchall()
+            return [row['node_id'] for row in rows]
+
+    def remove_node(self, node_id: str) -> None:
+        """移除节点及其全部租约"""
+        with self.db.get_connection() as conn:
+            conn.execute('DELETE FROM shard_leases WHERE owner = ?', (node_id,))
+            conn.execute('DELETE FROM cluster_nodes WHERE node_id = ?', (node_id,))
+
+    def acquire(self, shards: Iterable[int], node_id: str, now: float, expires_at: float) -> Set[int]:
+        """获取或续约分片租约（仅当租约空闲、已过期或本就属于自己）
+
+        Returns:
+            Set[int]: 成功持有的分片
+        """
+        acquired = set()
+        with self.db.get_connection() as conn:
+            for shard in shards:
+                cursor = conn.execute('''
+                INSERT INTO shard_leases (shard, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE shard_leases.owner = excluded.owner OR shard_leases.expires_at < ?
+                ''', (shard, node_id, expires_at, now))
+                if cursor.rowcount == 1:
+                    acquired.add(shard)
+        return acquired
+
+    def release(self, shards: Iterable[int], node_id: str) -> None:
+        """释放自己持有的分片租约"""
+        with self.db.get_connection() as conn:
+            conn.executemany(
+                'DELETE FROM shard_leases WHERE shard = ? AND owner = ?',
+                [(shard, node_id) for shard in shards]
+            )
+
+
+class MemoryLeaseStore:
+    """进程内租约存储（单机调试或本地替身）"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, float] = {}
+        self._leases: Dict[int, tuple] = {}
+
+    def heartbeat(self, node_id: str, now: float) -> None:
+        with self._lock:
+            self._nodes[node_id] = now
+
+    def live_nodes(self, since: float) -> List[str]:
+        with self._lock:
+            return [node for node, beat in self._nodes.items() if beat >= since]
+
+    def remove_node(self, node_id: str) -> None:
+        with self._lock:
+            self._nodes.pop(node_id, None)
+            for shard in [s for s, (owner, _) in self._leases.items() if owner == node_id]:
+                del self._leases[shard]
+
+    def acquire(self, shards: Iterable[int], node_id: str, now: float, expires_at: float) -> Set[int]:
+        acquired = set()
+        with self._lock:
+            for shard in shards:
+                lease = self._leases.get(shard)
+                if lease is None or lease[0] == node_id or lease[1] < now:
+                    self._leases[shard] = (node_id, expires_at)
+                    acquired.add(shard)
+        return acquired
+
+    def release(self, shards: Iterable[int], node_id: str) -> None:
+        with self._lock:
+            for shard in shards:
+                lease = self._leases.get(shard)
+                if lease and lease[0] == node_id:
+                    del self._leases[shard]
+
+
+class HashRing:
+    """一致性哈希环"""
+    def __init__(self, nodes: Iterable[str], replicas: int = 64):
+        """构建哈希环
+
+        Args:
+            nodes: 节点ID列表
+            replicas: 每个节点的虚拟节点数
+        """
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key: str) -> Optional[str]:
+        """获取 key 所属的节点"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+
+class ShardCoordinator:
+    """分片协调器"""
+    def __init__(self, store, node_id: str = None, shard_count: int = None, lease_ttl: float = None):
+        """初始化分片协调器
+
+        Args:
+            store: 租约存储（SQLiteLeaseStore 或 MemoryLeaseStore）
+            node_id: 节点ID，默认取 NODE_ID 环境变量或 主机名-进程号
+            shard_count: 分片数量，默认取 SHARD_COUNT 环境变量
+            lease_ttl: 租约有效期（秒），默认取 LEASE_TTL 环境变量
+        """
+        self.store = store
+        self.node_id = node_id or os.getenv('NODE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        self.shard_count = shard_count or int(os.getenv('SHARD_COUNT', '256'))
+        self.lease_ttl = lease_ttl or float(os.getenv('LEASE_TTL', '30'))
+        # 允许的节点间时钟偏差（秒），其他节点的租约过期超过该时间才接管
+        self.clock_skew = float(os.getenv('CLUSTER_CLOCK_SKEW', '2'))
+        if self.clock_skew >= self.lease_ttl:
+            logger.warning(f"CLUSTER_CLOCK_SKEW（{self.clock_skew}）不小于租约有效期（{self.lease_ttl}），失联节点的分片接管会明显延迟")
+        # 续租成功后本节点认为租约有效的时长：提前一个时钟偏差放弃，避免与接管的节点同时处理；
+        # 至少保留两次心跳间隔，偏差配置过大时不至于每次续租之间都失效
+        self.lease_valid_for = max(self.lease_ttl - self.clock_skew, self.lease_ttl * 2 / 3)
+        self.owned_shards: Set[int] = set()
+        # 上次成功续租的时间（单调时间，在写入租约之前取得）
+        self.renewed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def shard_of(self, mid) -> int:
+        """计算 mid 所属分片"""
+        return _hash(str(mid)) % self.shard_count
+
+    def lease_valid(self) -> bool:
+        """持有的租约是否仍然有效（距上次成功续租不足 lease_valid_for 秒）"""
+        return self.renewed_at is not None and time.monotonic() - self.renewed_at < self.lease_valid_for
+
+    def owns(self, mid) -> bool:
+        """当前节点是否持有 mid 所在分片"""
+        return self.shard_of(mid) in self.owned_shards and self.lease_valid()
+
+    def filter_mids(self, mids: Iterable) -> list:
+        """过滤出当前节点负责的 mid"""
+        if not self.lease_valid():
+            return []
+        owned = self.owned_shards
+        return [mid for mid in mids if self.shard_of(mid) in owned]
+
+    def refresh(self) -> Set[int]:
+        """心跳、重新计算分配并申请/续约/释放租约
+
+        Returns:
+            Set[int]: 当前持有的分片
+        """
+        with self._lock:
+            now = time.time()
+            renewed_at = time.monotonic()
+            self.store.heartbeat(self.node_id, now)
+            nodes = self.store.live_nodes(now - self.lease_ttl - self.clock_skew)
+            if self.node_id not in nodes:
+                nodes.append(self.node_id)
+            ring = HashRing(sorted(nodes))
+
+            desired = {
+                shard for shard in range(self.shard_count)
+                if ring.get(f"shard-{shard}") == self.node_id
+            }
+            # 分片已分配给其他节点时主动释放，以便尽快交接
+            released = self.owned_shards - desired
+            if released:
+                self.store.release(released, self.node_id)
+            # 以扣除时钟偏差后的时间判断其他节点的租约是否过期
+            owned = self.store.acquire(desired, self.node_id, now - self.clock_skew, now + self.lease_ttl)
+
+            gained = owned - self.owned_shards
+            lost = self.owned_shards - owned
+            if gained or lost:
+                logger.info(
+                    f"分片变更: 节点 {self.node_id} 持有 {len(owned)}/{self.shard_count} 个分片 "
+                    f"(+{len(gained)} -{len(lost)}), 存活节点 {len(nodes)} 个"
+                )
+            self.owned_shards = owned
+            self.renewed_at = renewed_at
+            return owned
+
+    def start(self) -> None:
+        """启动后台心跳线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._thread.start()
+        logger.info(f"分片协调器已启动: {self.node_id}")
+
+    def stop(self) -> None:
+        """停止心跳并释放全部租约（监控退出时调用，其他节点下次心跳即可接管，不必等租约过期）"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        with self._lock:
+            self.store.remove_node(self.node_id)
+            self.owned_shards = set()
+        logger.info(f"分片协调器已停止: {self.node_id}")
+
+    def _heartbeat_loop(self) -> None:
+        """心跳间隔为租约有效期的三分之一，保证租约不会在两次心跳之间过期"""
+        while not self._stop.wait(self.lease_ttl / 3):
+            self._renew()
+
+    def _renew(self) -> None:
+        """续租一次；持续失败到租约可能被其他节点接管时，放弃持有的全部分片"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"分片心跳失败: {str(e)}")
+            if self.owned_shards and not self.lease_valid():
+                with self._lock:
+                    logger.warning(f"分片租约续约失败超过有效期，放弃持有的 {len(self.owned_shards)} 个分片")
+                    self.owned_shards = set()
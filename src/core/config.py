@@ -5,6 +5,7 @@ from loguru import logger
 import os
 from dotenv import load_dotenv
 import time
+from .identity import parse_identities
 
 class ConfigManager:
     def __init__(self, db_manager):
@@ -19,7 +20,7 @@ class ConfigManager:
         Args:
             force: 是否强制重新加载
         """
-        current_time = time.time()
+        current_time = time.monotonic()
         # 如果距离上次加载不到1秒，且不是强制加载，则跳过
         if not force and (current_time - self.last_load_time) < 1:
             return
@@ -33,6 +34,7 @@ class ConfigManager:
             'cloudflare_auth_code': '图床认证码',
             'server_chan_key': 'Server酱密钥',
             'bilibili_cookies': 'B站cookies',
+            'bilibili_identities': '请求身份池',
             'monitor_mids': '监控列表',
             'check_interval': '检查间隔'
         }
@@ -76,7 +78,8 @@ class ConfigManager:
         return {
             'monitor_mids': json.loads(self.get('monitor_mids', '[]')),
             'check_interval': int(self.get('check_interval', '60')),
-            'cookies': self.get('bilibili_cookies')
+            'cookies': self.get('bilibili_cookies'),
+            'identities': parse_identities(self.get('bilibili_identities'))
         }
 
     def get_cloudflare_config(self) -> Dict[str, str]:
@@ -110,6 +113,10 @@ class ConfigManager:
             'bilibili_cookies': 'B站cookies',
             'monitor_mids': '监控列表'
         }
+        if os.getenv('PUBLIC_BASE_URL'):
+            # 截图可以直接从本地存储访问，图床是可选的复制目标
+            required_configs.pop('cloudflare_domain')
+            required_configs.pop('cloudflare_auth_code')
         
         missing = []
         for key, name in required_configs.items():
@@ -4,6 +4,9 @@ import os
 from contextlib import contextmanager
 import datetime
 import logging
+import time
+from src.core import metrics
+from src.core.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
@@ -25,22 +28,34 @@ class DatabaseManager:
     @contextmanager
     def get_connection(self):
         """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
+        # 多个监控节点可能共享同一个数据库文件，等待锁而不是立即报错
+        conn = sqlite3.connect(self.db_path, timeout=30)
         conn.row_factory = sqlite3.Row  # 让查询结果可以通过列名访问
+        start = time.perf_counter()
         try:
-            yield conn
-            conn.commit()
+            with TRACER.span('db'):
+                yield conn
+                conn.commit()
+            if conn.total_changes:
+                metrics.DB_WRITES.inc()
         except Exception:
             conn.rollback()
             raise
         finally:
             conn.close()
+            metrics.DB_TRANSACTION_SECONDS.observe(time.perf_counter() - start)
     
     def init_db(self):
         """初始化数据库表"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
+            # 新建的数据库启用增量回收，由后台维护分批释放空闲页（已有数据库不受影响）
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            
+            # 使用WAL模式，允许多个节点并发读写
+            cursor.execute('PRAGMA journal_mode=WAL')
+            
             # 创建配置表
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS configs (
@@ -63,6 +78,18 @@ class DatabaseManager:
             )
             ''')
             
+            # 导出和统计按开播时间范围查询
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_live_records_start ON live_records (start_time)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_live_records_mid_start ON live_records (mid, start_time)')
+            
+            # 检测延迟相关字段（旧数据库自动补充）
+            self._ensure_columns(cursor, 'live_records', {
+                'upstream_live_time': 'REAL',  # B站记录的开播时间
+                'detected_at': 'REAL',         # 检测到开播的时间
+                'notified_at': 'REAL',         # 开播通知发送完成的时间
+                'reconciled': 'INTEGER DEFAULT 0'  # 启动校准补录（停机期间开播），检测时间不代表检测延迟
+            })
+            
             # 创建截图记录表
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS screenshots (
@@ -72,6 +99,133 @@ class DatabaseManager:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             ''')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_screenshots_live ON screenshots (live_id)')
+            
+            # 截图在本地存储中的内容摘要（旧数据库自动补充）
+            self._ensure_columns(cursor, 'screenshots', {'image_hash': 'TEXT'})
+            
+            # 创建直播中标题、封面、分区变化记录表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                live_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                old_value TEXT,
+                new_value TEXT,
+                changed_at REAL NOT NULL
+            )
+            ''')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_live_changes_live ON live_changes (live_id)')
+            
+            # 创建直播互动数据表（每场直播每分钟一行）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_metrics (
+                live_id INTEGER NOT NULL,
+                minute INTEGER NOT NULL,
+                danmaku INTEGER DEFAULT 0,
+                gifts INTEGER DEFAULT 0,
+                online INTEGER DEFAULT 0,
+                watched INTEGER DEFAULT 0,
+                PRIMARY KEY (live_id, minute)
+            ) WITHOUT ROWID
+            ''')
+            
+            # 创建直播采样表（每场直播按分块存储差分压缩后的样本）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_samples (
+                live_id INTEGER NOT NULL,
+                chunk_start INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                ts_blob BLOB NOT NULL,
+                online_blob BLOB NOT NULL,
+                PRIMARY KEY (live_id, chunk_start)
+            ) WITHOUT ROWID
+            ''')
+            
+            # 创建按天汇总的直播时长表（直播结束时增量更新）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_daily (
+                mid INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                seconds REAL NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (mid, day)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute('SELECT 1 FROM live_daily LIMIT 1')
+            if cursor.fetchone() is None:
+                # 新建汇总表时用已结束的历史记录回填一次
+                cursor.execute('''
+                SELECT mid, start_time, end_time FROM live_records
+                WHERE status = 0 AND start_time IS NOT NULL AND end_time IS NOT NULL
+                ''')
+                for row in cursor.fetchall():
+                    self._add_daily_rollup(cursor, row['mid'], row['start_time'], row['end_time'])
+            
+            # 创建节点心跳表（分片模式）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cluster_nodes (
+                node_id TEXT PRIMARY KEY,
+                heartbeat REAL NOT NULL
+            )
+            ''')
+            
+            # 创建分片租约表（分片模式）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shard_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            ''')
+            
+            # 创建租户表（每个租户有自己的订阅和通知渠道）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tenants (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                server_chan_key TEXT,
+                notify_title_change INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL
+            )
+            ''')
+            
+            # 创建租户订阅表（同一个UP主被多个租户订阅时只轮询一次）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tenant_subscriptions (
+                tenant_id TEXT NOT NULL,
+                mid TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (tenant_id, mid)
+            ) WITHOUT ROWID
+            ''')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenant_subscriptions_mid ON tenant_subscriptions (mid)')
+    
+    def _add_daily_rollup(self, cursor, mid, start_time, end_time):
+        """把一场已结束的直播按天累加到 live_daily"""
+        from src.core.history import parse_time, split_by_day
+        
+        start, end = parse_time(start_time), parse_time(end_time)
+        if start is None or end is None:
+            return
+        for index, (day, seconds) in enumerate(split_by_day(start, end)):
+            cursor.execute('''
+            INSERT INTO live_daily (mid, day, seconds, sessions) VALUES (?, ?, ?, ?)
+            ON CONFLICT(mid, day) DO UPDATE SET
+                seconds = seconds + excluded.seconds,
+                sessions = sessions + excluded.sessions
+            ''', (mid, day, seconds, 1 if index == 0 else 0))
+    
+    def _ensure_columns(self, cursor, table, columns):
+        """为已有的表补充缺失的列"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
     
     def get_config(self, key, default=None):
         """获取配置"""
@@ -90,15 +244,212 @@ class DatabaseManager:
             ON CONFLICT(key) DO UPDATE SET value = ?
             ''', (key, value, value))
     
-    def add_live_record(self, mid, room_id, title, start_time=None):
-        """添加直播记录"""
+    def delete_config(self, key):
+        """删除配置"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM configs WHERE key = ?', (key,))
+    
+    def _bump_tenants_version(self, cursor):
+        """租户或订阅变化后递增版本号，监控据此判断是否需要重新加载"""
+        cursor.execute('''
+        INSERT INTO configs (key, value) VALUES ('tenants_version', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        ''')
+    
+    def save_tenant(self, tenant_id, name=None, server_chan_key=None, notify_title_change=True) -> bool:
+        """创建或更新租户
+        
+        Returns:
+            bool: 是否为新建的租户
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM tenants WHERE id = ?', (tenant_id,))
+            created = cursor.fetchone() is None
+            cursor.execute('''
+            INSERT INTO tenants (id, name, server_chan_key, notify_title_change, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                name = excluded.name,
+                server_chan_key = excluded.server_chan_key,
+                notify_title_change = excluded.notify_title_change
+            ''', (tenant_id, name, server_chan_key, int(bool(notify_title_change)), time.time()))
+            self._bump_tenants_version(cursor)
+            return created
+    
+    def delete_tenant(self, tenant_id) -> bool:
+        """删除租户及其订阅
+        
+        Returns:
+            bool: 租户是否存在
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM tenant_subscriptions WHERE tenant_id = ?', (tenant_id,))
+            cursor.execute('DELETE FROM tenants WHERE id = ?', (tenant_id,))
+            deleted = cursor.rowcount > 0
+            self._bump_tenants_version(cursor)
+            return deleted
+    
+    def get_tenants(self) -> list:
+        """获取所有租户（含订阅数）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT t.id, t.name, t.server_chan_key, t.notify_title_change, t.created_at,
+                   COUNT(s.mid) AS subscriptions
+            FROM tenants t LEFT JOIN tenant_subscriptions s ON s.tenant_id = t.id
+            GROUP BY t.id
+            ORDER BY t.created_at
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def add_tenant_subscription(self, tenant_id, mid) -> bool:
+        """为租户添加订阅
+        
+        Returns:
+            bool: 是否为新增的订阅（已订阅时为 False）
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            INSERT OR IGNORE INTO tenant_subscriptions (tenant_id, mid, created_at) VALUES (?, ?, ?)
+            ''', (tenant_id, str(mid), time.time()))
+            added = cursor.rowcount > 0
+            if added:
+                self._bump_tenants_version(cursor)
+            return added
+    
+    def remove_tenant_subscription(self, tenant_id, mid) -> bool:
+        """移除租户的订阅
+        
+        Returns:
+            bool: 订阅是否存在
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM tenant_subscriptions WHERE tenant_id = ? AND mid = ?', (tenant_id, str(mid))
+            )
+            removed = cursor.rowcount > 0
+            if removed:
+                self._bump_tenants_version(cursor)
+            return removed
+    
+    def get_tenant_subscriptions(self, tenant_id=None) -> list:
+        """获取订阅关系 [(tenant_id, mid), ...]，按订阅时间排序"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if tenant_id is None:
+                cursor.execute('SELECT tenant_id, mid FROM tenant_subscriptions ORDER BY created_at')
+            else:
+                cursor.execute(
+                    'SELECT tenant_id, mid FROM tenant_subscriptions WHERE tenant_id = ? ORDER BY created_at',
+                    (tenant_id,)
+                )
+            return [(row['tenant_id'], row['mid']) for row in cursor.fetchall()]
+    
+    def count_tenant_subscribers(self, mid) -> int:
+        """订阅了该UP主的租户数"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) AS n FROM tenant_subscriptions WHERE mid = ?', (str(mid),))
+            return cursor.fetchone()['n']
+    
+    def prune_orphan_configs(self, prefixes=('last_status_', 'name_')) -> int:
+        """删除不再被监控的UP主遗留的配置（以及值为空的配置）
+        
+        在同一个写事务中读取监控列表并删除，避免与添加订阅并发时误删新写入的键。
+        
+        Returns:
+            int: 删除的行数
+        """
+        import json
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("SELECT value FROM configs WHERE key = 'monitor_mids'")
+            row = cursor.fetchone()
+            try:
+                monitored = {str(mid) for mid in json.loads(row['value'] or '[]')} if row else set()
+            except ValueError:
+                # 监控列表损坏时不做任何删除
+                return 0
+            # 租户订阅的UP主同样在监控中
+            cursor.execute('SELECT DISTINCT mid FROM tenant_subscriptions')
+            monitored.update(row['mid'] for row in cursor.fetchall())
+            orphans = []
+            for prefix in prefixes:
+                cursor.execute(
+                    "SELECT key, value FROM configs WHERE key >= ? AND key < ?",
+                    (prefix, prefix + '\uffff')
+                )
+                orphans.extend(
+                    row['key'] for row in cursor.fetchall()
+                    if row['value'] is None or row['key'][len(prefix):] not in monitored
+                )
+            cursor.executemany('DELETE FROM configs WHERE key = ?', [(key,) for key in orphans])
+            return len(orphans)
+    
+    def get_configs_by_prefix(self, prefix) -> dict:
+        """一次读取所有以 prefix 开头的配置"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT key, value FROM configs WHERE key >= ? AND key < ?",
+                (prefix, prefix + '\uffff')
+            )
+            return {row['key']: row['value'] for row in cursor.fetchall()}
+    
+    def compare_and_set_config(self, key, expected, value) -> bool:
+        """原子地比较并设置配置
+        
+        仅当当前值等于 expected 时才写入，用于多个节点之间的去重。
+        
+        Args:
+            key: 配置键
+            expected: 期望的当前值，None 表示不存在或为空
+            value: 新值
+            
+        Returns:
+            bool: 是否写入成功
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if expected is None:
+                cursor.execute('''
+                UPDATE configs SET value = ? WHERE key = ? AND value IS NULL
+                ''', (value, key))
+                if cursor.rowcount == 0:
+                    cursor.execute('''
+                    INSERT OR IGNORE INTO configs (key, value) VALUES (?, ?)
+                    ''', (key, value))
+            else:
+                cursor.execute('''
+                UPDATE configs SET value = ? WHERE key = ? AND value = ?
+                ''', (value, key, expected))
+            return cursor.rowcount == 1
+    
+    def add_live_record(self, mid, room_id, title, start_time=None,
+                        upstream_live_time=None, detected_at=None, notified_at=None, reconciled=False):
+        """添加直播记录
+        
+        Args:
+            upstream_live_time: B站返回的开播时间（Unix时间戳）
+            detected_at: 检测到开播的时间（Unix时间戳）
+            notified_at: 开播通知发送完成的时间（Unix时间戳）
+            reconciled: 是否为启动校准补录的停机期间开播，不计入检测延迟统计
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             start_time = start_time or datetime.datetime.now()
             cursor.execute('''
-            INSERT INTO live_records (mid, room_id, title, start_time, status)
-            VALUES (?, ?, ?, ?, 1)
-            ''', (mid, room_id, title, start_time))
+            INSERT INTO live_records (mid, room_id, title, start_time, status,
+                                      upstream_live_time, detected_at, notified_at, reconciled)
+            VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+            ''', (mid, room_id, title, start_time, upstream_live_time, detected_at, notified_at, int(reconciled)))
             return cursor.lastrowid
     
     def update_live_status(self, mid, status, end_time=None):
@@ -108,10 +459,17 @@ class DatabaseManager:
             if status == 0:  # 下播
                 end_time = end_time or datetime.datetime.now()
                 cursor.execute('''
+                SELECT start_time FROM live_records WHERE mid = ? AND status = 1
+                ''', (mid,))
+                closing = cursor.fetchall()
+                cursor.execute('''
                 UPDATE live_records 
                 SET status = ?, end_time = ?
                 WHERE mid = ? AND status = 1
                 ''', (status, end_time, mid))
+                # 同一事务内更新按天汇总
+                for row in closing:
+                    self._add_daily_rollup(cursor, mid, row['start_time'], end_time)
             else:
                 cursor.execute('''
                 UPDATE live_records 
@@ -119,14 +477,45 @@ class DatabaseManager:
                 WHERE mid = ? AND status = 0
                 ''', (status, mid))
     
-    def add_screenshot(self, live_id, image_url):
-        """添加截图记录"""
+    def add_screenshot(self, live_id, image_url, image_hash=None):
+        """添加截图记录
+        
+        Returns:
+            int: 截图记录ID
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-            INSERT INTO screenshots (live_id, image_url)
-            VALUES (?, ?)
-            ''', (live_id, image_url))
+            INSERT INTO screenshots (live_id, image_url, image_hash)
+            VALUES (?, ?, ?)
+            ''', (live_id, image_url, image_hash))
+            return cursor.lastrowid
+    
+    def update_screenshot_url(self, screenshot_id, image_url):
+        """截图复制到图床后改用图床地址"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE screenshots SET image_url = ? WHERE id = ?', (image_url, screenshot_id))
+    
+    def add_live_change(self, live_id, change_type, old_value, new_value, changed_at):
+        """记录直播中的一次标题、封面或分区变化"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            INSERT INTO live_changes (live_id, type, old_value, new_value, changed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (live_id, change_type, old_value, new_value, changed_at))
+    
+    def get_live_changes(self, live_id) -> list:
+        """获取一场直播中的标题、封面、分区变化（按时间顺序）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT type, old_value, new_value, changed_at FROM live_changes
+            WHERE live_id = ?
+            ORDER BY id
+            ''', (live_id,))
+            return [dict(row) for row in cursor.fetchall()]
     
     def get_current_live_id(self, mid):
         """获取当前直播ID"""
@@ -140,6 +529,276 @@ class DatabaseManager:
             result = cursor.fetchone()
             return result['id'] if result else None
     
+    def get_daily_rollups(self, mid=None, start=None, end=None) -> list:
+        """获取按天汇总的直播时长
+        
+        Args:
+            mid: 只返回该UP主
+            start: 起始日期（YYYY-MM-DD，含）
+            end: 结束日期（YYYY-MM-DD，含）
+        """
+        sql = 'SELECT mid, day, seconds, sessions FROM live_daily WHERE 1 = 1'
+        params = []
+        if mid is not None:
+            sql += ' AND mid = ?'
+            params.append(mid)
+        if start is not None:
+            sql += ' AND day >= ?'
+            params.append(start)
+        if end is not None:
+            sql += ' AND day <= ?'
+            params.append(end)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql + ' ORDER BY mid, day', params)
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def iter_live_records(self, since=None, mid=None, batch_size=500):
+        """按开播时间顺序分批读取直播记录及其截图
+        
+        按 (start_time, id) 键集分页，每批一个短事务，内存占用与表大小无关，
+        也不会长时间持有读快照阻碍 WAL 检查点。
+        
+        Args:
+            since: 只返回该时间（datetime）之后开播的记录
+            mid: 只返回该UP主的记录
+            batch_size: 每批读取的记录数
+            
+        Yields:
+            dict: 直播记录，screenshots 字段为该场直播的截图列表
+        """
+        cursor_key = None
+        while True:
+            sql = 'SELECT * FROM live_records WHERE start_time IS NOT NULL'
+            params = []
+            if mid is not None:
+                sql += ' AND mid = ?'
+                params.append(mid)
+            if since is not None:
+                sql += ' AND start_time >= ?'
+                params.append(since)
+            if cursor_key is not None:
+                sql += ' AND (start_time, id) > (?, ?)'
+                params.extend(cursor_key)
+            sql += ' ORDER BY start_time, id LIMIT ?'
+            params.append(batch_size)
+            
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                records = [dict(row) for row in cursor.fetchall()]
+                if not records:
+                    return
+                self._attach_screenshots(cursor, records)
+            
+            yield from records
+            if len(records) < batch_size:
+                return
+            cursor_key = (records[-1]['start_time'], records[-1]['id'])
+    
+    def _attach_screenshots(self, cursor, records):
+        """一次查询为一批直播记录补上 screenshots 字段"""
+        placeholders = ','.join('?' * len(records))
+        cursor.execute(f'''
+        SELECT id, live_id, image_url, created_at FROM screenshots
+        WHERE live_id IN ({placeholders}) ORDER BY live_id, id
+        ''', [record['id'] for record in records])
+        screenshots = {}
+        for row in cursor.fetchall():
+            screenshots.setdefault(row['live_id'], []).append(
+                {'id': row['id'], 'image_url': row['image_url'], 'created_at': row['created_at']}
+            )
+        for record in records:
+            record['screenshots'] = screenshots.get(record['id'], [])
+    
+    def get_expired_live_records(self, before, limit=200) -> list:
+        """获取在 before 之前结束的直播记录（附带截图），用于归档
+        
+        Args:
+            before: 截止时间（datetime）
+            limit: 最多返回的记录数
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT * FROM live_records
+            WHERE status = 0 AND end_time IS NOT NULL AND end_time < ?
+            ORDER BY start_time, id LIMIT ?
+            ''', (before.isoformat(' '), limit))
+            records = [dict(row) for row in cursor.fetchall()]
+            if records:
+                self._attach_screenshots(cursor, records)
+            return records
+    
+    def delete_live_records(self, live_ids) -> int:
+        """删除直播记录及其截图、变化记录、互动数据和采样（按天汇总保留）
+        
+        Returns:
+            int: 删除的直播记录数
+        """
+        if not live_ids:
+            return 0
+        ids = [(live_id,) for live_id in live_ids]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('DELETE FROM screenshots WHERE live_id = ?', ids)
+            cursor.executemany('DELETE FROM live_changes WHERE live_id = ?', ids)
+            cursor.executemany('DELETE FROM live_metrics WHERE live_id = ?', ids)
+            cursor.executemany('DELETE FROM live_samples WHERE live_id = ?', ids)
+            cursor.executemany('DELETE FROM live_records WHERE id = ?', ids)
+            return len(ids)
+    
+    def delete_old_screenshots(self, days, limit=1000) -> int:
+        """删除早于 days 天前的截图记录（created_at 为 UTC 时间）
+        
+        Returns:
+            int: 删除的行数，小于 limit 说明已经删完
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            DELETE FROM screenshots WHERE id IN (
+                SELECT id FROM screenshots WHERE created_at < datetime('now', ?) LIMIT ?
+            )
+            ''', (f'-{days} days', limit))
+            return cursor.rowcount
+    
+    def delete_old_live_details(self, before_ts, limit=1000) -> int:
+        """删除早于 before_ts（Unix时间戳）的互动数据和采样分块
+        
+        Returns:
+            int: 删除的行数，小于 limit 说明已经删完
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            DELETE FROM live_metrics WHERE (live_id, minute) IN (
+                SELECT live_id, minute FROM live_metrics WHERE minute < ? LIMIT ?
+            )
+            ''', (before_ts, limit))
+            deleted = cursor.rowcount
+            cursor.execute('''
+            DELETE FROM live_samples WHERE (live_id, chunk_start) IN (
+                SELECT live_id, chunk_start FROM live_samples WHERE chunk_start < ? LIMIT ?
+            )
+            ''', (before_ts, limit))
+            return max(deleted, cursor.rowcount)
+    
+    def get_pragma(self, name):
+        """读取单值 PRAGMA（例如 auto_vacuum、freelist_count）"""
+        with self.get_connection() as conn:
+            return conn.execute(f'PRAGMA {name}').fetchone()[0]
+    
+    def incremental_vacuum(self, pages) -> int:
+        """释放最多 pages 个空闲页
+        
+        Returns:
+            int: 剩余的空闲页数
+        """
+        with self.get_connection() as conn:
+            # incremental_vacuum 每执行一步只释放一页，execute 只会执行一步，需用 executescript 执行完整
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+    
+    def optimize(self, analysis_limit=400):
+        """按需更新查询统计信息（PRAGMA optimize 只分析需要的表，analysis_limit 限制每个索引的扫描行数）"""
+        with self.get_connection() as conn:
+            conn.execute(f'PRAGMA analysis_limit={int(analysis_limit)}')
+            conn.execute('PRAGMA optimize')
+    
+    def get_open_live_records(self) -> list:
+        """获取所有未结束的直播记录（每个UP主取最近一条）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT id, mid, room_id, title, start_time FROM live_records
+            WHERE status = 1
+            ORDER BY start_time
+            ''')
+            records = {}
+            for row in cursor.fetchall():
+                records[str(row['mid'])] = dict(row)
+            return list(records.values())
+    
+    def get_latest_live_id(self, mid):
+        """获取最近一场直播的ID（无论是否已结束）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT id FROM live_records
+            WHERE mid = ?
+            ORDER BY start_time DESC LIMIT 1
+            ''', (mid,))
+            result = cursor.fetchone()
+            return result['id'] if result else None
+    
+    def add_live_metrics(self, rows):
+        """批量写入直播互动数据
+        
+        Args:
+            rows: (live_id, minute, danmaku, gifts, online, watched) 元组列表
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+            INSERT OR REPLACE INTO live_metrics (live_id, minute, danmaku, gifts, online, watched)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    def get_live_metrics(self, live_id) -> list:
+        """获取一场直播的逐分钟互动数据"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT minute, danmaku, gifts, online, watched FROM live_metrics
+            WHERE live_id = ?
+            ORDER BY minute
+            ''', (live_id,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def save_sample_chunk(self, live_id, chunk_start, count, ts_blob, online_blob):
+        """写入（或覆盖）一个采样分块"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            INSERT OR REPLACE INTO live_samples (live_id, chunk_start, count, ts_blob, online_blob)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (live_id, chunk_start, count, ts_blob, online_blob))
+    
+    def get_sample_chunks(self, live_id) -> list:
+        """获取一场直播的全部采样分块（按时间排序）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT chunk_start, count, ts_blob, online_blob FROM live_samples
+            WHERE live_id = ?
+            ORDER BY chunk_start
+            ''', (live_id,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_latency_records(self, mid=None, since=None) -> list:
+        """获取带有检测时间的直播记录（不含启动校准补录的记录，其检测时间是重启时间）
+        
+        Args:
+            mid: 只返回该UP主的记录
+            since: 只返回该时间（Unix时间戳）之后开播的记录
+        """
+        sql = '''
+        SELECT mid, upstream_live_time, detected_at, notified_at FROM live_records
+        WHERE upstream_live_time IS NOT NULL AND detected_at IS NOT NULL AND NOT reconciled
+        '''
+        params = []
+        if mid is not None:
+            sql += ' AND mid = ?'
+            params.append(mid)
+        if since is not None:
+            sql += ' AND upstream_live_time >= ?'
+            params.append(since)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
+    
     def get_current_live_record(self, room_id: int) -> dict:
         """获取当前直播记录
         
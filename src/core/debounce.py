@@ -0,0 +1,137 @@
+"""开播/下播状态防抖
+
+接口的 live_status 有三种取值：0 未直播、1 直播中、2 轮播。只有 1 算作直播，
+但断流重连、推流端重启、在直播和轮播之间来回切换时，状态会短暂离开 1 又回来。
+直接按单次观察切换状态会产生一整套 下播→开播（两条通知、一条新的直播记录、
+两次 get_info 请求、截图计时重置）。
+
+这里为每个UP主维护一个带滞回的状态机：已确认的状态以数据库中的 last_status 为准，
+观察到与之不同的状态时进入待确认，只有连续观察到足够次数、并且持续了足够时间才确认切换；
+待确认期间观察到原状态则直接取消（计入 live_flaps_suppressed_total）。
+待确认的UP主会在较短的间隔后单独复查一次，不必等到下一轮常规检查（复查时间登记在监控的计时轮上）。
+
+默认开播立即确认（检测延迟不变），下播需要连续两次观察并持续60秒。
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import clock, metrics
+from .timers import TimingWheel
+
+FLAPS_SUPPRESSED = metrics.REGISTRY.counter(
+    'live_flaps_suppressed_total', '待确认期间恢复原状态、未产生开播/下播的次数', ['direction']
+)
+
+
+class _Pending:
+    """一次待确认的状态切换"""
+    __slots__ = ('target', 'since', 'count')
+
+    def __init__(self, target: int, since: float):
+        self.target = target
+        self.since = since
+        self.count = 0
+
+
+class LiveDebouncer:
+    """按UP主的开播/下播防抖状态机"""
+    def __init__(self, timers: TimingWheel):
+        """初始化状态机
+
+        Args:
+            timers: 登记复查时间的计时轮
+        """
+        self.timers = timers
+        # 确认开播/下播所需的连续观察次数和最短持续时间（秒），两个条件都满足才确认
+        self.start_confirmations = int(os.getenv('LIVE_START_CONFIRMATIONS', '1'))
+        self.start_grace = float(os.getenv('LIVE_START_GRACE', '0'))
+        self.end_confirmations = int(os.getenv('LIVE_END_CONFIRMATIONS', '2'))
+        self.end_grace = float(os.getenv('LIVE_END_GRACE', '60'))
+        # 待确认的UP主在该间隔后单独复查
+        self.confirm_delay = float(os.getenv('LIVE_CONFIRM_DELAY', '15'))
+        self._pending: Dict[str, _Pending] = {}
+        # 到了复查时间的UP主
+        self._due: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def observe(self, mid: str, observed: int, confirmed: int, now: Optional[float] = None) -> Tuple[int, Optional[float]]:
+        """记录一次观察
+
+        Args:
+            mid: UP主ID
+            observed: 接口或推送给出的状态（0/1/2）
+            confirmed: 已确认的状态（数据库中的上次状态，0/1）
+            now: 观察时间，默认当前时间
+
+        Returns:
+            Tuple[int, Optional[float]]: (应采用的状态 0/1, 切换首次被观察到的时间)
+                                         没有确认新的切换时第二项为 None
+        """
+        now = clock.now() if now is None else now
+        target = 1 if observed == 1 else 0
+        with self._lock:
+            if target == (1 if confirmed == 1 else 0):
+                pending = self._pending.pop(mid, None)
+                if pending is not None:
+                    self._clear(mid)
+                    FLAPS_SUPPRESSED.inc(direction='end' if pending.target == 0 else 'start')
+                return confirmed, None
+
+            pending = self._pending.get(mid)
+            if pending is None or pending.target != target:
+                pending = self._pending[mid] = _Pending(target, now)
+            pending.count += 1
+
+            if target == 1:
+                confirmations, grace = self.start_confirmations, self.start_grace
+            else:
+                confirmations, grace = self.end_confirmations, self.end_grace
+            if pending.count >= confirmations and now - pending.since >= grace:
+                del self._pending[mid]
+                self._clear(mid)
+                return target, pending.since
+            # 持续时间还差得不多时在满足时复查，否则按复查间隔
+            remaining = grace - (now - pending.since)
+            self._due.discard(mid)
+            self.timers.schedule(
+                ('confirm', mid), min(remaining, self.confirm_delay) if remaining > 0 else self.confirm_delay,
+                self._mark_due, mid
+            )
+            return confirmed, None
+
+    def _mark_due(self, mid: str) -> None:
+        with self._lock:
+            if mid in self._pending:
+                self._due.add(mid)
+
+    def _clear(self, mid: str) -> None:
+        """取消复查（调用方持有锁）"""
+        self._due.discard(mid)
+        self.timers.cancel(('confirm', mid))
+
+    def pending(self) -> List[str]:
+        """有待确认切换的UP主"""
+        with self._lock:
+            return list(self._pending)
+
+    def due(self) -> List[str]:
+        """到了复查时间的UP主（计时轮推进后更新）"""
+        with self._lock:
+            return [mid for mid in self._pending if mid in self._due]
+
+    def settings(self) -> Dict[str, float]:
+        """当前的防抖参数（录制时写入 meta，回放时按录制时的参数运行）"""
+        return {
+            'start_confirmations': self.start_confirmations,
+            'start_grace': self.start_grace,
+            'end_confirmations': self.end_confirmations,
+            'end_grace': self.end_grace,
+            'confirm_delay': self.confirm_delay,
+        }
+
+    def forget(self, mids: Iterable[str]) -> None:
+        with self._lock:
+            for mid in mids:
+                if self._pending.pop(mid, None) is not None:
+                    self._clear(mid)
@@ -0,0 +1,169 @@
+"""状态快照差异检测
+
+每轮轮询结果与上一轮快照比较，产生类型化的变化事件：
+- went_live / went_offline：开播、下播
+- title_changed / cover_changed / area_changed：标题、封面、分区变化
+
+状态记录写入时已算好内容摘要（src.core.status.StatusRecord.digest），
+没有变化的UP主只需一次字典查找和整数比较；只有摘要变化的记录才逐字段比较并生成事件。
+首次出现（或重启后首轮）的UP主没有上一轮快照，只产生开播/下播事件，
+由监控与数据库中的上次状态核对，不产生标题等字段事件。
+
+事件通过 EventBus 分发，通知、存储等按事件类型订阅。
+"""
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Mapping
+
+from loguru import logger
+
+WENT_LIVE = 'went_live'
+WENT_OFFLINE = 'went_offline'
+TITLE_CHANGED = 'title_changed'
+COVER_CHANGED = 'cover_changed'
+AREA_CHANGED = 'area_changed'
+
+EVENT_TYPES = (WENT_LIVE, WENT_OFFLINE, TITLE_CHANGED, COVER_CHANGED, AREA_CHANGED)
+STATUS_EVENTS = (WENT_LIVE, WENT_OFFLINE)
+# 字段事件及其在快照元组中的位置
+_FIELD_EVENTS = ((TITLE_CHANGED, 1), (COVER_CHANGED, 2), (AREA_CHANGED, 3))
+
+
+class ChangeEvent:
+    """一条状态变化"""
+    __slots__ = ('type', 'mid', 'old', 'new', 'status')
+
+    def __init__(self, type: str, mid: str, old: Any, new: Any, status: Mapping):
+        """初始化事件
+
+        Args:
+            type: 事件类型（EVENT_TYPES 之一）
+            mid: UP主ID
+            old: 变化前的值（首次出现时为 None）
+            new: 变化后的值
+            status: 最新的直播状态信息
+        """
+        self.type = type
+        self.mid = mid
+        self.old = old
+        self.new = new
+        self.status = status
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'type': self.type, 'mid': self.mid, 'old': self.old, 'new': self.new}
+
+    def __repr__(self) -> str:
+        return f'ChangeEvent({self.type}, {self.mid}, {self.old!r} -> {self.new!r})'
+
+
+def _digest(status: Mapping) -> int:
+    """状态的内容摘要（状态记录自带，推送等来源的普通字典现算）"""
+    digest = getattr(status, 'digest', None)
+    if digest is None:
+        digest = hash((
+            int(status.get('status') or 0), status.get('room_id') or 0,
+            status.get('title') or '', status.get('cover') or '', status.get('area') or ''
+        ))
+    return digest
+
+
+def _snapshot(status: Mapping) -> tuple:
+    """快照元组：(status, title, cover, area)"""
+    return (
+        int(status.get('status') or 0), status.get('title') or '',
+        status.get('cover') or '', status.get('area') or ''
+    )
+
+
+class SnapshotDiffer:
+    """逐轮比较状态快照"""
+    def __init__(self):
+        self._digests: Dict[str, int] = {}
+        # 只为摘要变化的记录重建：(status, title, cover, area)
+        self._snapshots: Dict[str, tuple] = {}
+        # 正在直播的UP主（按开播先后，迭代顺序稳定）
+        self.live: Dict[str, None] = {}
+
+    def diff(self, statuses: Mapping[str, Mapping]) -> Dict[str, List[ChangeEvent]]:
+        """比较最新状态与上一轮快照（不更新快照）
+
+        快照在变化处理成功后由 commit() 更新，处理失败的UP主下一轮仍会产生同样的变化。
+
+        Args:
+            statuses: mid -> 最新状态（未取到状态的UP主不在其中，保留原快照）
+
+        Returns:
+            Dict[str, List[ChangeEvent]]: 有变化的 mid -> 事件列表（按 statuses 的顺序）
+        """
+        changes = {}
+        digests = self._digests
+        for mid, status in statuses.items():
+            if digests.get(mid) != _digest(status):
+                changes[mid] = self._compare(mid, status)
+        return changes
+
+    def commit(self, mid: str, status: Mapping) -> None:
+        """状态处理成功后，以该状态作为UP主的快照"""
+        self._digests[mid] = _digest(status)
+        current = _snapshot(status)
+        self._snapshots[mid] = current
+        if current[0] == 1:
+            self.live[mid] = None
+        else:
+            self.live.pop(mid, None)
+
+    def _compare(self, mid: str, status: Mapping) -> List[ChangeEvent]:
+        current = _snapshot(status)
+        previous = self._snapshots.get(mid)
+
+        events = []
+        if previous is None or previous[0] != current[0]:
+            if current[0] == 1:
+                events.append(ChangeEvent(WENT_LIVE, mid, previous and previous[0], 1, status))
+            else:
+                events.append(ChangeEvent(WENT_OFFLINE, mid, previous and previous[0], current[0], status))
+        if previous is not None:
+            for event_type, index in _FIELD_EVENTS:
+                if previous[index] != current[index]:
+                    events.append(ChangeEvent(event_type, mid, previous[index], current[index], status))
+        return events
+
+    def forget(self, mids: Iterable[str]) -> None:
+        """丢弃UP主的快照（取消监控或分片转移），再次出现时按首次出现处理"""
+        for mid in mids:
+            self._digests.pop(mid, None)
+            self._snapshots.pop(mid, None)
+            self.live.pop(mid, None)
+
+    def retain(self, mids: Iterable[str]) -> None:
+        """只保留指定UP主的快照"""
+        keep = {str(mid) for mid in mids}
+        self.forget([mid for mid in self._digests if mid not in keep])
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+class EventBus:
+    """按事件类型分发变化事件，订阅者的异常只记录日志，不影响其他订阅者"""
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[ChangeEvent], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: Callable[[ChangeEvent], None], *types: str) -> None:
+        """订阅事件
+
+        Args:
+            handler: 处理函数，参数为 ChangeEvent
+            types: 事件类型，不传时订阅全部类型
+        """
+        with self._lock:
+            for event_type in types or EVENT_TYPES:
+                self._handlers[event_type].append(handler)
+
+    def publish(self, event: ChangeEvent) -> None:
+        for handler in self._handlers.get(event.type, ()):
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"处理事件 {event.type} 失败（{event.mid}）: {str(e)}")
@@ -0,0 +1,143 @@
+"""直播互动数据聚合
+
+消费直播间广播消息（弹幕、礼物、在线人数、看过人数），不保存单条消息，
+只在每个直播间固定大小的环形缓冲区中按分钟计数，再定期把已结束的分钟
+写入 live_metrics 表。内存占用只与直播间数量有关，与消息量无关。
+"""
+import os
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+# 缓冲区保留的分钟数，需大于刷新间隔，保证数据在被覆盖前已写入数据库
+RING_MINUTES = 8
+
+FIELDS = ('danmaku', 'gifts', 'online', 'watched')
+
+
+class RoomCounters:
+    """单个直播间的分钟环形缓冲区"""
+    __slots__ = ('minutes', 'danmaku', 'gifts', 'online', 'watched', 'last_seen')
+
+    def __init__(self):
+        self.minutes = array('q', [-1] * RING_MINUTES)
+        self.danmaku = array('q', [0] * RING_MINUTES)
+        self.gifts = array('q', [0] * RING_MINUTES)
+        self.online = array('q', [0] * RING_MINUTES)
+        self.watched = array('q', [0] * RING_MINUTES)
+        self.last_seen = 0.0
+
+    def slot(self, minute: int) -> int:
+        """获取分钟对应的槽位，槽位属于更早的分钟时先清零"""
+        index = minute % RING_MINUTES
+        if self.minutes[index] != minute:
+            self.minutes[index] = minute
+            self.danmaku[index] = 0
+            self.gifts[index] = 0
+            self.online[index] = 0
+            self.watched[index] = 0
+        return index
+
+
+class EngagementAggregator:
+    """直播互动数据聚合器"""
+    def __init__(self, db_manager, live_id_resolver: Callable[[int], Optional[int]]):
+        """初始化聚合器
+
+        Args:
+            db_manager: 数据库管理器
+            live_id_resolver: 根据直播间ID获取当前直播记录ID的函数，未开播时返回 None
+        """
+        self.db = db_manager
+        self.live_id_resolver = live_id_resolver
+        # 刷新间隔不能超过缓冲区长度，否则未写入的分钟会被覆盖
+        self.flush_interval = min(int(os.getenv('ENGAGEMENT_FLUSH_INTERVAL', '60')), (RING_MINUTES - 2) * 60)
+        self.rooms: Dict[int, RoomCounters] = {}
+        self._flushed: Dict[int, int] = {}  # room_id -> 已写入的最后一分钟
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def handle_message(self, room_id: int, cmd: str, data) -> None:
+        """处理一条广播消息（由推送检测器在事件循环线程中调用）"""
+        now = time.time()
+        minute = int(now // 60)
+        with self._lock:
+            counters = self.rooms.get(room_id)
+            if counters is None:
+                counters = self.rooms[room_id] = RoomCounters()
+            counters.last_seen = now
+            index = counters.slot(minute)
+
+            if cmd == 'DANMU_MSG':
+                counters.danmaku[index] += 1
+            elif cmd == 'SEND_GIFT':
+                counters.gifts[index] += int(data.get('data', {}).get('num', 1) or 1)
+            elif cmd == 'ONLINE_RANK_COUNT':
+                counters.online[index] = max(counters.online[index], int(data.get('data', {}).get('count', 0) or 0))
+            elif cmd == 'WATCHED_CHANGE':
+                counters.watched[index] = max(counters.watched[index], int(data.get('data', {}).get('num', 0) or 0))
+
+    def flush(self) -> int:
+        """把已结束的分钟写入数据库
+
+        Returns:
+            int: 写入的行数
+        """
+        current_minute = int(time.time() // 60)
+        pending = []
+        with self._lock:
+            for room_id, counters in list(self.rooms.items()):
+                last_flushed = self._flushed.get(room_id, -1)
+                for index in range(RING_MINUTES):
+                    minute = counters.minutes[index]
+                    if last_flushed < minute < current_minute:
+                        pending.append((room_id, minute, counters.danmaku[index], counters.gifts[index],
+                                        counters.online[index], counters.watched[index]))
+                # 长时间没有消息的直播间释放缓冲区
+                if counters.last_seen < time.time() - RING_MINUTES * 60:
+                    del self.rooms[room_id]
+                    self._flushed.pop(room_id, None)
+            for room_id, minute, *_ in pending:
+                if room_id in self.rooms and minute > self._flushed.get(room_id, -1):
+                    self._flushed[room_id] = minute
+
+        rows = []
+        live_ids = {}
+        for room_id, minute, danmaku, gifts, online, watched in pending:
+            if room_id not in live_ids:
+                live_ids[room_id] = self.live_id_resolver(room_id)
+            live_id = live_ids[room_id]
+            if live_id:
+                rows.append((live_id, minute * 60, danmaku, gifts, online, watched))
+
+        if rows:
+            self.db.add_live_metrics(rows)
+            logger.debug(f"写入互动数据 {len(rows)} 行")
+        return len(rows)
+
+    def start(self) -> None:
+        """启动后台刷新线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        logger.info("互动数据聚合已启动")
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"写入互动数据失败: {str(e)}")
+
+
+def summarize_metrics(rows: List[dict]) -> Dict[str, list]:
+    """把逐分钟的数据行转换为按字段分组的时间序列"""
+    series = {'time': [row['minute'] for row in rows]}
+    for field in FIELDS:
+        series[field] = [row[field] for row in rows]
+    return series
@@ -0,0 +1,56 @@
+"""直播记录导出
+
+把直播记录（附带截图）逐条转换为 NDJSON 或 CSV 文本块，配合 StreamingResponse 使用，
+导出过程中只在内存中保留一批记录。
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+RECORD_COLUMNS = (
+    'id', 'mid', 'room_id', 'title', 'start_time', 'end_time', 'status',
+    'upstream_live_time', 'detected_at', 'notified_at', 'reconciled',
+)
+SCREENSHOT_COLUMNS = ('screenshot_id', 'screenshot_url', 'screenshot_at')
+
+# 每积累这么多字节输出一次，避免逐行产生过多的小块
+FLUSH_BYTES = 64 * 1024
+
+
+def to_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """每条直播记录一行 JSON，截图以列表嵌套"""
+    buffer = []
+    size = 0
+    for record in records:
+        line = json.dumps(
+            {**{column: record.get(column) for column in RECORD_COLUMNS}, 'screenshots': record['screenshots']},
+            ensure_ascii=False, default=str
+        ) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def to_csv(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """与截图表左连接的扁平 CSV：每张截图一行，没有截图的直播也保留一行"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(RECORD_COLUMNS + SCREENSHOT_COLUMNS)
+    for record in records:
+        base = [record.get(column) for column in RECORD_COLUMNS]
+        for screenshot in record['screenshots'] or [None]:
+            if screenshot is None:
+                writer.writerow(base + [None, None, None])
+            else:
+                writer.writerow(base + [screenshot['id'], screenshot['image_url'], screenshot['created_at']])
+        if output.tell() >= FLUSH_BYTES:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue()
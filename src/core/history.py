@@ -0,0 +1,106 @@
+"""直播历史统计
+
+live_daily 汇总表按 (UP主, 日期) 保存当天的直播秒数和开播场次，
+在直播记录关闭时增量更新，跨零点的直播按天拆分。
+统计接口只读取汇总表（O(天数) 行），正在进行的直播按当前时间临时补上。
+"""
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def parse_time(value) -> Optional[datetime.datetime]:
+    """解析数据库中的时间字段（datetime 默认适配器写入的 ISO 格式）"""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def split_by_day(start: datetime.datetime, end: datetime.datetime) -> List[Tuple[str, float]]:
+    """把一段时间按自然日（本地时间）拆分
+
+    Returns:
+        List[Tuple[str, float]]: [(YYYY-MM-DD, 秒数), ...]
+    """
+    parts = []
+    current = start
+    while current < end:
+        next_midnight = datetime.datetime.combine(current.date() + datetime.timedelta(days=1), datetime.time())
+        segment_end = min(end, next_midnight)
+        parts.append((current.date().isoformat(), (segment_end - current).total_seconds()))
+        current = segment_end
+    return parts
+
+
+def merge_live_sessions(rows: List[Dict[str, Any]], open_records: Iterable[Dict[str, Any]],
+                        now: datetime.datetime, start: Optional[str] = None,
+                        end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """把正在进行的直播（截至 now）合并进按天汇总的结果"""
+    totals = {(str(row['mid']), row['day']): dict(row, mid=str(row['mid'])) for row in rows}
+    for record in open_records:
+        started = parse_time(record['start_time'])
+        if started is None:
+            continue
+        for index, (day, seconds) in enumerate(split_by_day(started, now)):
+            if (start and day < start) or (end and day > end):
+                continue
+            key = (str(record['mid']), day)
+            row = totals.setdefault(key, {'mid': key[0], 'day': day, 'seconds': 0.0, 'sessions': 0})
+            row['seconds'] += seconds
+            if index == 0:
+                row['sessions'] += 1
+    return sorted(totals.values(), key=lambda row: (row['mid'], row['day']))
+
+
+def group_by_period(rows: List[Dict[str, Any]], period: str = 'day') -> List[Dict[str, Any]]:
+    """按天或按周（周一开始）汇总
+
+    Returns:
+        List[Dict[str, Any]]: [{'mid', 'period', 'hours', 'sessions'}, ...]
+    """
+    groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for row in rows:
+        day = datetime.date.fromisoformat(row['day'])
+        if period == 'week':
+            day -= datetime.timedelta(days=day.weekday())
+        key = (row['mid'], day.isoformat())
+        group = groups.setdefault(key, {'mid': key[0], 'period': key[1], 'seconds': 0.0, 'sessions': 0})
+        group['seconds'] += row['seconds']
+        group['sessions'] += row['sessions']
+    return [
+        {'mid': group['mid'], 'period': group['period'],
+         'hours': round(group['seconds'] / 3600, 2), 'sessions': group['sessions']}
+        for _, group in sorted(groups.items())
+    ]
+
+
+def compute_streak(days: Iterable[str], today: datetime.date) -> Dict[str, Any]:
+    """计算连续直播天数
+
+    今天还没开播时，从昨天开始往前数，避免当天开播前连续记录被清零。
+
+    Args:
+        days: 有直播的日期（YYYY-MM-DD）
+        today: 当天日期
+
+    Returns:
+        Dict[str, Any]: 当前连续天数、最长连续天数和最近直播日期
+    """
+    active = sorted({datetime.date.fromisoformat(day) for day in days})
+    if not active:
+        return {'current': 0, 'longest': 0, 'last_day': None}
+
+    longest = run = 1
+    for previous, day in zip(active, active[1:]):
+        run = run + 1 if day - previous == datetime.timedelta(days=1) else 1
+        longest = max(longest, run)
+
+    active_set = set(active)
+    cursor = today if today in active_set else today - datetime.timedelta(days=1)
+    current = 0
+    while cursor in active_set:
+        current += 1
+        cursor -= datetime.timedelta(days=1)
+    return {'current': current, 'longest': longest, 'last_day': active[-1].isoformat()}
@@ -0,0 +1,215 @@
+"""请求身份池
+
+风控按身份（cookie）和出口IP限制请求频率。身份池中每个身份有独立的会话、
+cookie、可选的出口代理和令牌桶配额，请求轮流分配给空闲的身份；
+返回 -352/-412/-799 的身份自动冷却一段时间（连续触发时加倍），
+健康度低的身份只在其他身份都不可用时使用。总吞吐量随身份数量增长。
+
+身份来自配置项 bilibili_identities（JSON 列表）::
+
+    [{"name": "a", "cookies": "SESSDATA=...", "proxy": "http://127.0.0.1:8001", "rate": 2}]
+
+未配置时使用一个不带 cookie 的默认身份，行为与单会话一致。
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+from loguru import logger
+
+from . import clock, metrics
+from .transport import create_session
+
+# 风控、请求过快
+RISK_CODES = (-352, -412, -799)
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
+    'Accept': '*/*',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-site',
+    'Pragma': 'no-cache',
+    'Cache-Control': 'no-cache',
+    'sec-ch-ua': '"Chromium";v="118", "Google Chrome";v="118"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"'
+}
+
+IDENTITY_HEALTH = metrics.REGISTRY.gauge('identity_health', '请求身份健康度（0-1）', ['identity'])
+IDENTITY_BENCHED = metrics.REGISTRY.counter('identity_benched_total', '请求身份因风控被冷却的次数', ['identity'])
+
+
+class Identity:
+    """单个请求身份"""
+    def __init__(self, name: str, cookies: str = '', proxy: str = '', rate: float = 0, burst: float = 1):
+        """初始化身份
+
+        Args:
+            name: 名称（用于日志和指标，不包含 cookie）
+            cookies: cookie 字符串，为空时不带 cookie
+            proxy: 出口代理地址，为空时直连
+            rate: 每秒允许的请求数，0 表示不限制
+            burst: 令牌桶容量（允许的突发请求数）
+        """
+        self.name = name
+        self.cookies = cookies
+        self.proxy = proxy
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.refilled_at = clock.now()
+        self.health = 1.0
+        self.strikes = 0  # 连续触发风控（或连续网络错误）的次数
+        self.benched_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.failures = 0
+
+        self.session = create_session(BROWSER_HEADERS)
+        if cookies:
+            self.session.headers['Cookie'] = cookies
+        if proxy:
+            self.session.proxies.update({'http': proxy, 'https': proxy})
+        IDENTITY_HEALTH.set(self.health, identity=name)
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个可用令牌的秒数"""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        now = clock.now()
+        return {
+            'name': self.name,
+            'proxy': bool(self.proxy),
+            'rate': self.rate,
+            'health': round(self.health, 3),
+            'benched_for': max(round(self.benched_until - now, 1), 0),
+            'strikes': self.strikes,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+
+class IdentityPool:
+    """请求身份池"""
+    def __init__(self, identities: List[Identity]):
+        self.identities = identities
+        # 冷却时长：基础值按连续触发次数加倍，不超过上限
+        self.bench_seconds = float(os.getenv('IDENTITY_BENCH_SECONDS', '60'))
+        self.max_bench_seconds = float(os.getenv('IDENTITY_MAX_BENCH_SECONDS', '1800'))
+        # 连续网络错误达到该次数也冷却（通常是代理失效）
+        self.max_errors = int(os.getenv('IDENTITY_MAX_ERRORS', '3'))
+        # 健康度低于该值的身份降为备用
+        self.min_health = 0.5
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, entries: List[Dict[str, Any]]) -> 'IdentityPool':
+        """根据配置创建身份池
+
+        Args:
+            entries: [{'name', 'cookies', 'proxy', 'rate', 'burst'}, ...]，为空时创建默认身份
+        """
+        default_rate = float(os.getenv('IDENTITY_RATE', '0'))
+        default_burst = float(os.getenv('IDENTITY_BURST', '5'))
+        identities = [
+            Identity(
+                entry.get('name') or f'identity-{index}',
+                cookies=entry.get('cookies', ''),
+                proxy=entry.get('proxy', ''),
+                rate=float(entry.get('rate', default_rate)),
+                burst=float(entry.get('burst', default_burst))
+            )
+            for index, entry in enumerate(entries or [])
+        ]
+        if not identities:
+            identities = [Identity('default', rate=default_rate, burst=default_burst)]
+        return cls(identities)
+
+    def __len__(self) -> int:
+        return len(self.identities)
+
+    @property
+    def sessions(self) -> List[requests.Session]:
+        return [identity.session for identity in self.identities]
+
+    def available(self) -> int:
+        """当前未冷却的身份数"""
+        now = clock.now()
+        return sum(1 for identity in self.identities if identity.benched_until <= now)
+
+    def acquire(self, exclude: Optional[Identity] = None) -> Optional[Identity]:
+        """取一个可用身份，需要时等待令牌
+
+        优先最久未使用的健康身份，exclude 只在没有其他身份可用时才会被选中。
+
+        Returns:
+            Optional[Identity]: 所有身份都在冷却中时返回 None
+        """
+        while True:
+            with self._lock:
+                now = clock.now()
+                candidates = [identity for identity in self.identities if identity.benched_until <= now]
+                if not candidates:
+                    return None
+                best = min(candidates, key=lambda identity: (
+                    identity is exclude,
+                    identity.health < self.min_health,
+                    identity.wait_time(now) > 0,
+                    identity.last_used
+                ))
+                wait = best.wait_time(now)
+                if wait <= 0:
+                    if best.rate:
+                        best.tokens -= 1
+                    best.last_used = now
+                    best.requests += 1
+                    return best
+            clock.sleep(wait)
+
+    def report(self, identity: Identity, ok: bool, code: Optional[int] = None) -> None:
+        """反馈一次请求结果
+
+        Args:
+            identity: 发出请求的身份
+            ok: 请求是否成功
+            code: 接口返回的错误码（网络错误时为 None）
+        """
+        with self._lock:
+            identity.health = identity.health * 0.8 + (0.2 if ok else 0.0)
+            IDENTITY_HEALTH.set(identity.health, identity=identity.name)
+            if ok:
+                identity.strikes = 0
+                return
+            identity.failures += 1
+            identity.strikes += 1
+            if code in RISK_CODES or identity.strikes >= self.max_errors:
+                seconds = min(self.bench_seconds * 2 ** (identity.strikes - 1), self.max_bench_seconds)
+                identity.benched_until = clock.now() + seconds
+                IDENTITY_BENCHED.inc(identity=identity.name)
+                logger.warning(f"身份 {identity.name} 暂停使用 {seconds:.0f} 秒（code={code}，连续失败 {identity.strikes} 次）")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [identity.stats() for identity in self.identities]
+
+
+def parse_identities(value: Optional[str]) -> List[Dict[str, Any]]:
+    """解析 bilibili_identities 配置"""
+    if not value:
+        return []
+    try:
+        entries = json.loads(value)
+    except ValueError:
+        logger.error("bilibili_identities 不是合法的 JSON，使用默认身份")
+        return []
+    return [entry for entry in entries if isinstance(entry, dict)]
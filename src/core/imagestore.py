@@ -0,0 +1,264 @@
+"""本地截图存储
+
+截图先写入本地存储，再异步复制到外部图床，图床不可用时截图不会丢失：
+- 按内容（SHA-256）寻址，相同的图片只存一份
+- 总占用超过配额时按最久未访问的顺序淘汰（访问时更新文件修改时间，重启后顺序不变）；
+  独立监控进程模式下只由监控进程淘汰，API进程只读取和生成缩略图（evict=False）
+- 缩略图只生成预设的几种宽度，首次请求时生成一次，之后直接读取
+- 通过 /images/{digest} 提供访问（见 src.api.routes.images），内容不可变，可长期缓存
+
+目录结构：{root}/{digest[:2]}/{digest}{.ext}，缩略图为 {root}/{digest[:2]}/{digest}_{width}.jpg
+"""
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from loguru import logger
+
+from . import metrics
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+IMAGE_STORE_BYTES = metrics.REGISTRY.gauge('image_store_bytes', '本地截图存储占用的字节数')
+IMAGE_STORE_EVICTIONS = metrics.REGISTRY.counter('image_store_evictions_total', '因超出配额被淘汰的图片数')
+
+DEFAULT_THUMBNAIL_SIZES = [320, 640]
+
+
+def _thumbnail_width(name: str) -> int:
+    """从缩略图文件名 {digest}_{width}.jpg 中取出宽度"""
+    try:
+        return int(name[65:].split('.', 1)[0])
+    except ValueError:
+        return 0
+
+
+class ImageStore:
+    """按内容寻址、带磁盘配额的本地图片存储"""
+    def __init__(self, root: Optional[str] = None, quota_bytes: Optional[int] = None,
+                 thumbnail_sizes: Optional[List[int]] = None, evict: bool = True):
+        """初始化存储
+
+        Args:
+            root: 存储目录，默认 IMAGE_STORE_DIR 或 data/images
+            quota_bytes: 磁盘配额（含缩略图），默认 IMAGE_STORE_QUOTA_MB（1024MB）
+            thumbnail_sizes: 允许的缩略图宽度，默认 IMAGE_THUMBNAIL_SIZES（320,640）
+            evict: 是否负责配额淘汰；同一目录只能有一个负责淘汰的实例，
+                其他进程的实例不删除文件，避免删掉写入方仍在引用的图片
+        """
+        self.root = root or os.getenv('IMAGE_STORE_DIR', os.path.join('data', 'images'))
+        if quota_bytes is None:
+            quota_bytes = int(float(os.getenv('IMAGE_STORE_QUOTA_MB', '1024')) * 1024 * 1024)
+        self.quota_bytes = quota_bytes
+        if thumbnail_sizes is None:
+            thumbnail_sizes = [int(size) for size in os.getenv('IMAGE_THUMBNAIL_SIZES', '320,640').split(',') if size.strip()]
+        thumbnail_sizes = sorted(size for size in thumbnail_sizes if size > 0)
+        if not thumbnail_sizes:
+            logger.warning(f"缩略图宽度配置为空，使用默认值 {DEFAULT_THUMBNAIL_SIZES}")
+            thumbnail_sizes = list(DEFAULT_THUMBNAIL_SIZES)
+        self.thumbnail_sizes = thumbnail_sizes
+        self.evict = evict
+        # 截图链接的公开地址前缀（例如 https://monitor.example.com），未配置时只能通过图床链接访问
+        self.public_base_url = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+        # digest -> [原图文件名, 占用字节数, 已计入占用的缩略图宽度]，最久未访问的在前
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """扫描已有文件，按修改时间恢复淘汰顺序"""
+        found = {}
+        for directory in os.listdir(self.root):
+            path = os.path.join(self.root, directory)
+            if not os.path.isdir(path):
+                continue
+            for name in os.listdir(path):
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(path, name))
+                digest = name[:64]
+                entry = found.setdefault(digest, [None, 0, 0.0, set()])
+                if name[64:65] != '_':
+                    entry[0] = name
+                    entry[2] = stat.st_mtime
+                else:
+                    entry[3].add(_thumbnail_width(name))
+                entry[1] += stat.st_size
+        for digest, (name, size, _, widths) in sorted(found.items(), key=lambda item: item[1][2]):
+            if name is None:
+                # 只剩缩略图的残留文件（可能是写入方正在替换，不负责淘汰时不清理）
+                if self.evict:
+                    self._remove_files(digest)
+                continue
+            self._entries[digest] = [name, size, widths]
+            self.total_bytes += size
+        IMAGE_STORE_BYTES.set(self.total_bytes)
+        if self._entries:
+            logger.debug(f"本地截图存储: {len(self._entries)} 张，{self.total_bytes / 1024 / 1024:.1f}MB")
+
+    def _dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2])
+
+    def put_file(self, path: str) -> str:
+        """存入图片文件（源文件保留），返回内容摘要"""
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+
+        with self._lock:
+            if digest in self._entries:
+                self._touch(digest)
+                return digest
+
+        name = digest + (os.path.splitext(path)[1].lower() or '.bin')
+        os.makedirs(self._dir(digest), exist_ok=True)
+        target = os.path.join(self._dir(digest), name)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        size = os.path.getsize(target)
+
+        with self._lock:
+            if digest not in self._entries:
+                self._entries[digest] = [name, size, set()]
+                self.total_bytes += size
+            if self.evict:
+                self._enforce_quota(keep=digest)
+        return digest
+
+    def path(self, digest: str) -> Optional[str]:
+        """原图路径（同时记为一次访问），不存在时返回 None"""
+        with self._lock:
+            entry = self._entries.get(digest) or self._discover(digest)
+            if entry is None:
+                return None
+            path = os.path.join(self._dir(digest), entry[0])
+            if not self.evict and not os.path.exists(path):
+                # 已被负责淘汰的进程删除
+                self._forget(digest)
+                return None
+            self._touch(digest)
+            return path
+
+    def _discover(self, digest: str) -> Optional[list]:
+        """查找其他进程（独立的监控进程）写入的图片并加入索引（调用方持有锁）"""
+        directory = self._dir(digest)
+        try:
+            names = [name for name in os.listdir(directory) if name.startswith(digest)]
+        except FileNotFoundError:
+            return None
+        original = next((name for name in names if name[64:65] == '.' and not name.endswith('.tmp')), None)
+        if original is None:
+            return None
+        names = [name for name in names if not name.endswith('.tmp')]
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+        widths = {_thumbnail_width(name) for name in names if name[64:65] == '_'}
+        entry = self._entries[digest] = [original, size, widths]
+        self.total_bytes += size
+        return entry
+
+    def thumbnail(self, digest: str, width: int) -> Optional[str]:
+        """缩略图路径，不存在时生成
+
+        Args:
+            width: 请求的宽度，取不小于它的最小预设宽度（超过所有预设时取最大的）
+
+        Returns:
+            Optional[str]: 原图不存在时返回 None
+        """
+        source = self.path(digest)
+        if source is None:
+            return None
+        width = next((size for size in self.thumbnail_sizes if size >= width), self.thumbnail_sizes[-1])
+        target = os.path.join(self._dir(digest), f"{digest}_{width}.jpg")
+        if os.path.exists(target):
+            return target
+
+        from PIL import Image
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        try:
+            with Image.open(source) as image:
+                image = image.convert('RGB')
+                if image.width > width:
+                    image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+                image.save(tmp_path, 'JPEG', quality=80, optimize=True)
+        except FileNotFoundError:
+            # 生成期间原图被负责淘汰的进程删除
+            with self._lock:
+                self._forget(digest)
+            return None
+        os.replace(tmp_path, target)
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                # 生成期间原图被淘汰，缩略图不再有人跟踪，直接删除
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+                return None
+            # 并发请求可能同时生成同一张缩略图，占用只计一次
+            if width not in entry[2]:
+                entry[2].add(width)
+                size = os.path.getsize(target)
+                entry[1] += size
+                self.total_bytes += size
+                if self.evict:
+                    self._enforce_quota(keep=digest)
+        return target
+
+    def url(self, digest: str) -> str:
+        """图片的访问地址（配置了 PUBLIC_BASE_URL 时为完整地址）"""
+        return f"{self.public_base_url}/images/{digest}"
+
+    def _touch(self, digest: str) -> None:
+        """记为最近访问（调用方持有锁）"""
+        self._entries.move_to_end(digest)
+        entry = self._entries[digest]
+        try:
+            os.utime(os.path.join(self._dir(digest), entry[0]), None)
+        except OSError:
+            pass
+
+    def _forget(self, digest: str) -> None:
+        """从索引中移除已不存在的图片（调用方持有锁）"""
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def _enforce_quota(self, keep: str) -> None:
+        """淘汰最久未访问的图片直到不超过配额（调用方持有锁）"""
+        while self.total_bytes > self.quota_bytes and len(self._entries) > 1:
+            digest = next(iter(self._entries))
+            if digest == keep:
+                self._entries.move_to_end(digest)
+                digest = next(iter(self._entries))
+            size = self._entries.pop(digest)[1]
+            self.total_bytes -= size
+            self._remove_files(digest)
+            IMAGE_STORE_EVICTIONS.inc()
+        IMAGE_STORE_BYTES.set(self.total_bytes)
+
+    def _remove_files(self, digest: str) -> None:
+        directory = self._dir(digest)
+        for name in os.listdir(directory):
+            if name.startswith(digest):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError as e:
+                    logger.warning(f"删除图片文件失败: {str(e)}")
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,56 @@
+"""检测延迟统计
+
+每场直播记录三个时间点：B站记录的开播时间、检测到开播的时间、开播通知发送完成的时间，
+据此计算检测延迟和端到端通知延迟的分位数。
+"""
+from typing import Any, Dict, List
+
+PERCENTILES = (50, 90, 99)
+
+
+def _summarize(values: List[float]) -> Dict[str, Any]:
+    """计算一组延迟（秒）的分位数"""
+    import numpy as np
+
+    if not values:
+        return {'count': 0}
+    data = np.asarray(values, dtype=float)
+    summary = {'count': int(data.size), 'mean': round(float(data.mean()), 2), 'max': round(float(data.max()), 2)}
+    for p, value in zip(PERCENTILES, np.percentile(data, PERCENTILES)):
+        summary[f'p{p}'] = round(float(value), 2)
+    return summary
+
+
+def summarize_latency(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总检测延迟
+
+    Args:
+        records: 包含 mid、upstream_live_time、detected_at、notified_at 的记录；
+            启动校准补录的记录（reconciled）检测时间是重启时间，不参与统计
+
+    Returns:
+        Dict[str, Any]: 总体及每个UP主的检测延迟和通知延迟分位数
+    """
+    groups: Dict[str, Dict[str, List[float]]] = {}
+    overall = {'detection': [], 'notification': []}
+    for record in records:
+        if record.get('reconciled'):
+            continue
+        upstream = record['upstream_live_time']
+        group = groups.setdefault(str(record['mid']), {'detection': [], 'notification': []})
+        # 检测时间可能因时钟误差略早于B站记录的时间，按0处理
+        detection = max(record['detected_at'] - upstream, 0)
+        group['detection'].append(detection)
+        overall['detection'].append(detection)
+        if record.get('notified_at'):
+            notification = max(record['notified_at'] - upstream, 0)
+            group['notification'].append(notification)
+            overall['notification'].append(notification)
+
+    return {
+        'overall': {name: _summarize(values) for name, values in overall.items()},
+        'by_mid': {
+            mid: {name: _summarize(values) for name, values in group.items()}
+            for mid, group in groups.items()
+        }
+    }
@@ -0,0 +1,258 @@
+"""直播间广播推送检测
+
+通过直播间的广播 WebSocket 接收 LIVE / PREPARING / ROUND 命令，
+在状态变化的瞬间得到通知，轮询只作为低频的一致性校验。
+
+数据包格式（大端）：
+    包总长度(4) 头部长度(2) 协议版本(2) 操作码(4) 序列号(4) + 包体
+协议版本：0 JSON，1 心跳人气值，2 zlib 压缩的多个包，3 brotli 压缩的多个包
+"""
+import asyncio
+import json
+import os
+import random
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，没有时使用 zlib 协议
+    brotli = None
+
+HEADER = struct.Struct('>IHHII')
+
+PROTO_JSON = 0
+PROTO_INT = 1
+PROTO_ZLIB = 2
+PROTO_BROTLI = 3
+
+OP_HEARTBEAT = 2
+OP_HEARTBEAT_REPLY = 3
+OP_MESSAGE = 5
+OP_AUTH = 7
+OP_AUTH_REPLY = 8
+
+# 广播命令对应的直播状态
+STATUS_COMMANDS = {
+    'LIVE': 1,
+    'PREPARING': 0,
+    'ROUND': 2,
+}
+
+
+def encode_packet(op: int, body: bytes = b'', protover: int = PROTO_INT, seq: int = 1) -> bytes:
+    """封装数据包"""
+    return HEADER.pack(HEADER.size + len(body), HEADER.size, protover, op, seq) + body
+
+
+def decode_packets(data: bytes) -> Iterator[Tuple[int, object]]:
+    """解析数据包（自动解压嵌套的压缩包）
+
+    Yields:
+        Tuple[int, object]: (操作码, 包体)，消息包体为解析后的JSON，心跳回复为人气值
+    """
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, header_len, protover, op, _ = HEADER.unpack_from(data, offset)
+        # 头部长度小于固定头部、包长度小于头部（包体长度为负）或超出剩余数据（被截断）时丢弃剩余部分
+        if header_len < HEADER.size or length < header_len or offset + length > len(data):
+            logger.warning(f"数据包长度异常: 包长度 {length}，头部长度 {header_len}，剩余 {len(data) - offset}")
+            return
+        body = data[offset + header_len:offset + length]
+        offset += length
+
+        if protover == PROTO_ZLIB:
+            try:
+                inner = zlib.decompress(body)
+            except zlib.error as e:
+                logger.warning(f"zlib解压失败: {str(e)}")
+                continue
+            yield from decode_packets(inner)
+        elif protover == PROTO_BROTLI:
+            if brotli is None:
+                logger.warning("收到brotli压缩包，但未安装brotli")
+                continue
+            try:
+                inner = brotli.decompress(body)
+            except brotli.error as e:
+                logger.warning(f"brotli解压失败: {str(e)}")
+                continue
+            yield from decode_packets(inner)
+        elif op == OP_HEARTBEAT_REPLY:
+            yield op, int.from_bytes(body[:4], 'big') if len(body) >= 4 else 0
+        elif op in (OP_MESSAGE, OP_AUTH_REPLY):
+            try:
+                yield op, json.loads(body)
+            except ValueError:
+                logger.debug(f"无法解析的消息体: {body[:100]!r}")
+        else:
+            yield op, body
+
+
+class LivePushDetector:
+    """在单个事件循环上维护多个直播间的广播连接"""
+    def __init__(self, on_status: Callable[[int, int], None], url: str = None):
+        """初始化推送检测器
+
+        Args:
+            on_status: 状态变化回调 (room_id, status)，在线程池中调用
+            url: 广播服务器地址，默认取 LIVE_WS_URL 环境变量
+        """
+        self.on_status = on_status
+        self.url = url or os.getenv('LIVE_WS_URL', 'wss://broadcastlv.chat.bilibili.com/sub')
+        self.heartbeat_interval = float(os.getenv('LIVE_WS_HEARTBEAT', '30'))
+        # 限制同时建立连接的数量，避免重启时瞬间建立数千条连接
+        self.connect_concurrency = int(os.getenv('LIVE_WS_CONNECT_CONCURRENCY', '20'))
+        # 其他消息（弹幕、礼物、人气等）的订阅者: (room_id, cmd, data)
+        self.message_handlers: List[Callable[[int, str, object], None]] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._connect_semaphore = None
+        self._thread = None
+        self._ready = threading.Event()
+        # 同一直播间的状态回调必须按顺序执行，按房间号固定分配到单线程执行器
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-push')
+            for _ in range(int(os.getenv('LIVE_WS_WORKERS', '4')))
+        ]
+
+    @property
+    def room_count(self) -> int:
+        return len(self._tasks)
+
+    def start(self) -> None:
+        """在后台线程中启动事件循环"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logger.info(f"推送检测已启动: {self.url}")
+
+    def _run_loop(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._connect_semaphore = asyncio.Semaphore(self.connect_concurrency)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def sync_rooms(self, room_ids) -> None:
+        """同步需要监听的直播间（线程安全）
+
+        Args:
+            room_ids: 需要监听的直播间ID集合
+        """
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._sync_rooms, set(room_ids))
+
+    def _sync_rooms(self, room_ids: set) -> None:
+        for room_id in list(self._tasks):
+            if room_id not in room_ids:
+                self._tasks.pop(room_id).cancel()
+        for room_id in room_ids:
+            if room_id and room_id not in self._tasks:
+                self._tasks[room_id] = self.loop.create_task(self._watch_room(room_id))
+        logger.debug(f"推送监听直播间数量: {len(self._tasks)}")
+
+    def stop(self) -> None:
+        """断开全部连接并停止事件循环"""
+        if self.loop is None:
+            return
+
+        async def _stop():
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            for task in tasks:
+                task.cancel()
+            # 等待连接任务处理取消（关闭 WebSocket）后再停止事件循环
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop.stop()
+
+        asyncio.run_coroutine_threadsafe(_stop(), self.loop)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(10)
+
+    async def _watch_room(self, room_id: int) -> None:
+        """维持单个直播间的连接，断线后指数退避重连"""
+        import websockets
+
+        backoff = 1
+        while True:
+            try:
+                async with self._connect_semaphore:
+                    ws = await websockets.connect(self.url, open_timeout=10, max_size=None)
+                try:
+                    await self._authenticate(ws, room_id)
+                    backoff = 1
+                    heartbeat = asyncio.ensure_future(self._heartbeat(ws))
+                    try:
+                        async for message in ws:
+                            if isinstance(message, bytes):
+                                self._dispatch(room_id, message)
+                    finally:
+                        heartbeat.cancel()
+                finally:
+                    await ws.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"直播间 {room_id} 推送连接断开: {str(e)}")
+            await asyncio.sleep(backoff + random.uniform(0, 1))
+            backoff = min(backoff * 2, 60)
+
+    async def _authenticate(self, ws, room_id: int) -> None:
+        """发送进房认证包"""
+        auth = {
+            'uid': 0,
+            'roomid': int(room_id),
+            'protover': PROTO_BROTLI if brotli else PROTO_ZLIB,
+            'platform': 'web',
+            'type': 2,
+        }
+        body = json.dumps(auth).encode('utf-8')
+        await ws.send(encode_packet(OP_AUTH, body))
+
+    async def _heartbeat(self, ws) -> None:
+        """定时发送心跳包"""
+        while True:
+            await ws.send(encode_packet(OP_HEARTBEAT, b'[object Object]'))
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def _dispatch(self, room_id: int, message: bytes) -> None:
+        """分发收到的数据包"""
+        for op, body in decode_packets(message):
+            if op == OP_HEARTBEAT_REPLY:
+                self._notify_handlers(room_id, 'HEARTBEAT_REPLY', {'popularity': body})
+                continue
+            if op != OP_MESSAGE or not isinstance(body, dict):
+                continue
+
+            # 部分命令带有后缀，例如 DANMU_MSG:4:0:2:2:2:0
+            cmd = str(body.get('cmd', '')).split(':', 1)[0]
+            status = STATUS_COMMANDS.get(cmd)
+            if status is not None:
+                logger.info(f"收到直播间 {room_id} 推送: {cmd}")
+                # 状态处理包含网络请求和数据库写入，放到线程池中避免阻塞事件循环
+                executor = self._executors[room_id % len(self._executors)]
+                executor.submit(self._safe_call, self.on_status, room_id, status)
+            self._notify_handlers(room_id, cmd, body)
+
+    def _notify_handlers(self, room_id: int, cmd: str, data: object) -> None:
+        for handler in self.message_handlers:
+            try:
+                handler(room_id, cmd, data)
+            except Exception as e:
+                logger.error(f"处理推送消息失败: {cmd} - {str(e)}")
+
+    @staticmethod
+    def _safe_call(func, *args) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"处理推送状态失败: {str(e)}")
@@ -0,0 +1,210 @@
+"""数据库后台维护
+
+按表配置保留期限，定期执行：
+1. 把过期的直播记录（连同截图）按开播月份追加到压缩归档文件，再从数据库删除，
+   归档后仍可通过导出接口查询；按天汇总表保留，历史统计不受影响
+2. 删除过期的截图、互动数据和采样
+3. 删除已取消订阅的UP主遗留的配置
+4. 增量回收空闲页并按需更新查询统计信息
+
+每一步都是一批数据一个短事务，批次之间让出数据库锁，监控的写入最多等待一个批次；
+单次维护有总时长上限，没做完的部分留到下一轮。多个节点共享数据库时通过配置表
+比较并设置，同一时间段只有一个节点执行维护。
+"""
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from .history import parse_time
+
+ARCHIVE_PREFIX = 'live_records_'
+ARCHIVE_SUFFIX = '.ndjson.gz'
+
+
+def _days(name: str) -> int:
+    """读取保留天数，0 表示永久保留"""
+    return max(int(os.getenv(name, '0')), 0)
+
+
+class LiveArchive:
+    """按月份存放的直播记录归档（gzip 压缩的 NDJSON，每次归档追加一个 gzip 成员）"""
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv('ARCHIVE_DIR', os.path.join('data', 'archive'))
+
+    def path_for(self, month: str) -> str:
+        return os.path.join(self.directory, f'{ARCHIVE_PREFIX}{month}{ARCHIVE_SUFFIX}')
+
+    def months(self) -> List[str]:
+        """已有归档的月份（YYYY-MM，升序）"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[len(ARCHIVE_PREFIX):-len(ARCHIVE_SUFFIX)] for name in os.listdir(self.directory)
+            if name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX)
+        )
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        """按开播月份追加记录，写入并落盘后才返回"""
+        os.makedirs(self.directory, exist_ok=True)
+        by_month: Dict[str, List[str]] = {}
+        for record in records:
+            started = parse_time(record['start_time'])
+            month = started.strftime('%Y-%m') if started else 'unknown'
+            by_month.setdefault(month, []).append(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        for month, lines in by_month.items():
+            with open(self.path_for(month), 'ab') as f:
+                f.write(gzip.compress(''.join(lines).encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def iter_records(self, since: Optional[str] = None, mid: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """按月份顺序读取归档记录
+
+        Args:
+            since: 只返回该时间（与 start_time 相同格式的字符串）之后开播的记录
+            mid: 只返回该UP主的记录
+        """
+        since_month = since[:7] if since else None
+        for month in self.months():
+            if since_month and month != 'unknown' and month < since_month:
+                continue
+            # 归档写入后、删除前进程退出会导致同一条记录被再次归档，按ID去重
+            seen = set()
+            with gzip.open(self.path_for(month), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['id'] in seen:
+                        continue
+                    seen.add(record['id'])
+                    if mid is not None and str(record['mid']) != str(mid):
+                        continue
+                    if since and (record['start_time'] or '') < since:
+                        continue
+                    yield record
+
+
+class MaintenanceWorker:
+    """数据库后台维护"""
+    def __init__(self, db_manager, archive: Optional[LiveArchive] = None):
+        """初始化维护任务
+
+        Args:
+            db_manager: 数据库管理器
+            archive: 直播记录归档，默认使用 ARCHIVE_DIR 目录
+        """
+        self.db = db_manager
+        self.archive = archive or LiveArchive()
+        self.interval = int(os.getenv('MAINTENANCE_INTERVAL', '3600'))
+        # 单次维护的总时长上限，以及每个批次之后让出数据库锁的时间
+        self.max_seconds = float(os.getenv('MAINTENANCE_MAX_SECONDS', '30'))
+        self.pause = float(os.getenv('MAINTENANCE_PAUSE', '0.05'))
+        self.batch_size = int(os.getenv('MAINTENANCE_BATCH_SIZE', '200'))
+        self.vacuum_pages = int(os.getenv('MAINTENANCE_VACUUM_PAGES', '256'))
+        self.live_records_days = _days('RETENTION_LIVE_RECORDS_DAYS')
+        self.screenshots_days = _days('RETENTION_SCREENSHOTS_DAYS')
+        self.metrics_days = _days('RETENTION_METRICS_DAYS')
+        self.last_result: Dict[str, Any] = {}
+        self._incremental_vacuum_warned = False
+        self._thread = None
+
+    def run_in_background(self) -> bool:
+        """在后台线程执行一轮维护（由监控的计时轮每隔 interval 秒触发），上一轮还没结束时跳过"""
+        if self._thread and self._thread.is_alive():
+            return False
+        self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        try:
+            if self.claim():
+                self.run_once()
+        except Exception as e:
+            logger.error(f"数据库维护失败: {str(e)}")
+
+    def claim(self) -> bool:
+        """在共享数据库中抢占本轮维护，避免多个节点重复执行"""
+        last_run = self.db.get_config('maintenance_last_run')
+        try:
+            if last_run is not None and time.time() - float(last_run) < self.interval * 0.9:
+                return False
+        except ValueError:
+            pass
+        return self.db.compare_and_set_config('maintenance_last_run', last_run, str(time.time()))
+
+    def run_once(self) -> Dict[str, Any]:
+        """执行一轮维护
+
+        Returns:
+            Dict[str, Any]: 各步骤处理的行数及耗时
+        """
+        deadline = time.monotonic() + self.max_seconds
+        start = time.monotonic()
+        result = {
+            'archived': self._archive_live_records(deadline),
+            'screenshots_deleted': self._delete_in_batches(
+                deadline, self.screenshots_days,
+                lambda: self.db.delete_old_screenshots(self.screenshots_days, self.batch_size)
+            ),
+            'details_deleted': self._delete_in_batches(
+                deadline, self.metrics_days,
+                lambda: self.db.delete_old_live_details(time.time() - self.metrics_days * 86400, self.batch_size)
+            ),
+            'configs_deleted': self.db.prune_orphan_configs(),
+            'free_pages': self._incremental_vacuum(deadline),
+        }
+        if time.monotonic() < deadline:
+            self.db.optimize()
+        result['seconds'] = round(time.monotonic() - start, 3)
+        result['finished'] = time.monotonic() < deadline
+        self.last_result = result
+        logger.info(f"数据库维护完成: {result}")
+        return result
+
+    def _archive_live_records(self, deadline: float) -> int:
+        if not self.live_records_days:
+            return 0
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.live_records_days)
+        archived = 0
+        while time.monotonic() < deadline:
+            records = self.db.get_expired_live_records(cutoff, self.batch_size)
+            if not records:
+                break
+            # 先写归档再删除，中途退出最多产生重复归档（读取时去重），不会丢数据
+            self.archive.append(records)
+            archived += self.db.delete_live_records([record['id'] for record in records])
+            if len(records) < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return archived
+
+    def _delete_in_batches(self, deadline: float, days: int, delete_batch) -> int:
+        if not days:
+            return 0
+        deleted = 0
+        while time.monotonic() < deadline:
+            count = delete_batch()
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return deleted
+
+    def _incremental_vacuum(self, deadline: float) -> int:
+        # auto_vacuum: 0=NONE, 1=FULL, 2=INCREMENTAL
+        if self.db.get_pragma('auto_vacuum') != 2:
+            if not self._incremental_vacuum_warned:
+                self._incremental_vacuum_warned = True
+                logger.info("数据库未启用增量回收，停机时执行一次 PRAGMA auto_vacuum=INCREMENTAL; VACUUM 后生效")
+            return self.db.get_pragma('freelist_count')
+        free_pages = self.db.get_pragma('freelist_count')
+        while free_pages and time.monotonic() < deadline:
+            free_pages = self.db.incremental_vacuum(self.vacuum_pages)
+            time.sleep(self.pause)
+        return free_pages
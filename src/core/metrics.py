@@ -0,0 +1,248 @@
+"""运行指标
+
+Prometheus 文本格式的计数器、仪表和直方图。热路径上的更新不加锁：
+每个线程写入自己的分片，只有导出时才汇总所有分片，
+因此监控线程、推送线程和请求线程之间不会互相等待。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    """按线程分片的指标基类"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._register_lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _shard(self) -> dict:
+        """获取当前线程的分片（每个线程只在首次使用时加锁注册一次）"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._register_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> List[dict]:
+        with self._register_lock:
+            return [dict(shard) for shard in self._shards]
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._snapshot():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _render_samples(self) -> List[str]:
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Gauge(_Metric):
+    """仪表：直接设置的值，或导出时调用回调函数取值"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        # 单次字典赋值本身是原子的，仪表只保留最后一次写入
+        self._values[self._key(labels)] = value
+
+    def _render_samples(self) -> List[str]:
+        if self.func is not None:
+            try:
+                return [f'{self.name} {float(self.func())}']
+            except Exception:
+                return []
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+            for key, value in sorted(dict(self._values).items())
+        ]
+
+
+class Histogram(_Metric):
+    """直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # [各桶计数..., +Inf桶计数, 总和]
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文，退出时记录耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _merged(self) -> Dict[Tuple[str, ...], list]:
+        merged: Dict[Tuple[str, ...], list] = {}
+        for shard in self._snapshot():
+            for key, entry in shard.items():
+                total = merged.setdefault(key, [0] * len(entry))
+                for i, value in enumerate(list(entry)):
+                    total[i] += value
+        return merged
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """各标签组合的 (观测次数, 总和)"""
+        return {key: (sum(entry[:-1]), entry[-1]) for key, entry in self._merged().items()}
+
+    def quantiles(self, q: float) -> Dict[Tuple[str, ...], Optional[float]]:
+        """按桶估算各标签组合的分位数（取所在桶的上界，落在 +Inf 桶时为 None）"""
+        result = {}
+        for key, entry in self._merged().items():
+            target = q * sum(entry[:-1])
+            cumulative = 0
+            result[key] = None
+            for bound, count in zip(self.buckets, entry[:-1]):
+                cumulative += count
+                if count and cumulative >= target:
+                    result[key] = bound
+                    break
+        return result
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key, entry in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {entry[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              func: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self.register(Gauge(name, documentation, labelnames, func))
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 监控循环
+CYCLE_SECONDS = REGISTRY.histogram('monitor_cycle_seconds', '每轮检查耗时')
+LAST_CYCLE = REGISTRY.gauge('monitor_last_cycle_timestamp', '最近一轮检查完成时间')
+
+# B站接口
+BILIBILI_REQUEST_SECONDS = REGISTRY.histogram('bilibili_request_seconds', 'B站接口请求耗时', ['api'])
+BILIBILI_RESPONSES = REGISTRY.counter('bilibili_responses_total', 'B站接口响应code计数', ['api', 'code'])
+STATUS_CACHE = REGISTRY.counter('status_cache_fallback_total', '请求失败时状态缓存命中情况', ['result'])
+
+# 截图与上传
+SCREENSHOT_SECONDS = REGISTRY.histogram('screenshot_capture_seconds', '截图耗时', ['result'])
+UPLOAD_SECONDS = REGISTRY.histogram('image_upload_seconds', '图片上传耗时', ['result'])
+UPLOAD_QUEUE_DEPTH = REGISTRY.gauge('image_upload_queue_depth', '排队、上传中和等待重试的图片数')
+UPLOAD_RETRIES = REGISTRY.counter('image_upload_retries_total', '图片上传重试次数')
+UPLOAD_DEDUPLICATED = REGISTRY.counter('image_upload_deduplicated_total', '因内容相同而合并或复用的上传数')
+UPLOAD_DROPPED = REGISTRY.counter('image_upload_dropped_total', '上传队列已满而跳过的图片数')
+
+# 通知
+NOTIFY_SECONDS = REGISTRY.histogram('notification_send_seconds', '通知发送耗时', ['result'])
+NOTIFY_FAILURES = REGISTRY.counter('notification_failures_total', '通知发送失败次数')
+
+# 数据库
+DB_TRANSACTION_SECONDS = REGISTRY.histogram(
+    'db_transaction_seconds', '数据库事务耗时',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+)
+DB_WRITES = REGISTRY.counter('db_write_transactions_total', '有数据变更的数据库事务数')
+
+# 出站HTTP（按主机，所有经过共享传输层的请求）
+HTTP_REQUEST_SECONDS = REGISTRY.histogram('http_request_seconds', '出站HTTP请求耗时', ['host'])
+HTTP_ERRORS = REGISTRY.counter('http_errors_total', '出站HTTP请求失败次数', ['host', 'error'])
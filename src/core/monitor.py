@@ -1,19 +1,40 @@
-from ..utils.screenshot import LiveScreenshot
+import atexit
 import time
 import os
 from src.core.database import DatabaseManager
 from src.core.config import ConfigManager
 from loguru import logger
 import json
+import queue
 import requests
 import random
 from ..utils.notifier import LiveNotifier
 from datetime import datetime
+from functools import partial
 import sys
 from typing import Dict, Any
+from . import clock, metrics
+from .tracing import TRACER
+from .watchdog import WATCHDOG
+from .startup import STARTUP
+from .transport import TRANSPORT
+from .timers import TimingWheel
+from .status import StatusCache, decode_status_batch
+from .diff import (AREA_CHANGED, COVER_CHANGED, STATUS_EVENTS, TITLE_CHANGED, WENT_LIVE,
+                   WENT_OFFLINE, ChangeEvent, EventBus, SnapshotDiffer)
+from ..utils.init_project import configure_logging
+
+# process_status 未传入上次状态时单独查询
+_UNKNOWN = object()
 
 class BilibiliMonitor:
-    def __init__(self):
+    def __init__(self, db_manager: DatabaseManager = None, config_manager: ConfigManager = None):
+        """初始化监控
+        
+        Args:
+            db_manager: 已创建的数据库管理器，不传时新建
+            config_manager: 已创建的配置管理器，不传时新建
+        """
         # 首先定义数据库文件路径
         self.db_file = os.path.join('data', 'database.db')
         
@@ -22,32 +43,14 @@ class BilibiliMonitor:
         os.makedirs('temp', exist_ok=True)
         os.makedirs('logs', exist_ok=True)
         
-        # 配置日志 - 修改为每天一个文件
-        log_path = os.path.join("logs", "monitor_{time:YYYY-MM-DD}.log")
-        # 移除之前的所有处理器
-        logger.remove()
-        # 添加新的文件处理器
-        logger.add(
-            log_path,
-            rotation="00:00",  # 每天午夜轮转
-            retention="7 days",  # 保留7天的日志
-            level=os.getenv('LOG_LEVEL', 'INFO'),
-            encoding='utf-8',
-            enqueue=True,  # 异步写入
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {module}:{function}:{line} - {message}"
-        )
-        # 添加控制台输出
-        logger.add(
-            sys.stderr,
-            level=os.getenv('LOG_LEVEL', 'INFO'),
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {module}:{function}:{line} - {message}"
-        )
+        # 配置日志（与API进程共用一份配置，已配置时跳过）
+        configure_logging()
         
         # 初始化数据库
-        self.db_manager = DatabaseManager(self.db_file)
+        self.db_manager = db_manager or DatabaseManager(self.db_file)
         
         # 初始化配置管理器
-        self.config_manager = ConfigManager(self.db_manager)
+        self.config_manager = config_manager or ConfigManager(self.db_manager)
         
         # 验证配置
         if not self.config_manager.validate_config():
@@ -62,179 +65,327 @@ class BilibiliMonitor:
         # 添加新的配置项
         self.retry_delay = 10  # 重试等待时间（秒
         self.between_checks_delay = 5  # UP主之间的检查间隔（秒）
+        self.batch_size = int(os.getenv('BATCH_SIZE', '50'))  # 每次批量查询的UP主数量
+        # B站直播接口地址（压测时指向本地模拟服务）
+        self.api_base = os.getenv('BILIBILI_API_BASE', 'https://api.live.bilibili.com').rstrip('/')
         
         # 添加截图间隔配置
         self.screenshot_interval = int(os.getenv('SCREENSHOT_INTERVAL', '3600'))  # 默认1小时
         self.last_screenshot_times = {}  # 记录每个主播的上次截图时间
+        # 请求全部失败时，不超过该时间（秒）的缓存状态仍可使用
+        self.status_cache_ttl = int(os.getenv('STATUS_CACHE_TTL', '300'))
+        
+        # 定时工作（截图间隔、待确认复查、下一轮检查、出错重试、状态保存、数据库维护）统一登记在计时轮上，
+        # 每轮只处理到期的任务，不再逐个扫描正在直播的UP主
+        self.timers = TimingWheel()
+        self._screenshots_due = set()  # 到了截图时间的UP主
         
         logger.info(f"初始化完成，监控配置：")
         logger.info(f"- 监控列表：{self.monitor_mids}")
         logger.info(f"- 检查间隔：{self.check_interval}秒")
         logger.info(f"- 重试延迟：{self.retry_delay}秒")
         logger.info(f"- 截图间隔：{self.screenshot_interval}秒")
+        logger.info(f"- 批量大小：{self.batch_size}")
         
-        # 初始化其他组件
-        self.screenshot = LiveScreenshot()
-        
-        # 修改请求会话的初始化 - 不使用cookie
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36',
-            'Accept': '*/*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-site',
-            'Pragma': 'no-cache',
-            'Cache-Control': 'no-cache',
-            'sec-ch-ua': '"Chromium";v="118", "Google Chrome";v="118"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"'
-        })
+        # 截图（依赖 selenium/PIL）和图床上传在首次使用时才加载，加快启动
+        self._screenshot = None
+        self._uploader = None
+        self._upload_queue = None
+        
+        # 截图先存入本地（按内容寻址、带磁盘配额），配置了图床时再异步复制过去
+        from .imagestore import ImageStore
+        self.images = ImageStore()
+        self.replicate_images = bool(self.config_manager.get_cloudflare_config()['domain'])
+        
+        # 请求身份池：多组 cookie/出口代理轮流发出状态请求，触发风控的身份自动冷却
+        # 未配置时只有一个不带 cookie 的默认身份
+        from .identity import IdentityPool
+        self.identities = IdentityPool.from_config(bilibili_config['identities'])
+        self.session = self.identities.sessions[0]
+        # 每个身份可能同时有一个状态请求，再留出通知、截图上传和接口调用的余量
+        TRANSPORT.ensure_pool_size(len(self.identities) + 4)
+        
+        # 状态缓存（每个UP主一条原地更新的紧凑记录）
+        self.status_cache = StatusCache()
+        self._monitor_mids_raw = None
         
-        # 添加状态缓存
-        self.status_cache = {}
+        # 多租户：轮询所有租户订阅与默认监控列表的并集，状态变化按订阅关系分发
+        from .tenants import TenantRegistry
+        self.tenants = TenantRegistry(self.db_manager)
+        self.default_mids = {str(mid) for mid in self.monitor_mids}  # 通知发往默认的Server酱渠道
+        
+        # 逐轮差异检测：只处理有变化的UP主和正在直播的UP主，变化以事件分发给订阅者
+        self.differ = SnapshotDiffer()
+        self.events = EventBus()
+        
+        # 开播/下播防抖：断流重连、直播与轮播来回切换不产生新的下播→开播
+        from .debounce import LiveDebouncer
+        self.debouncer = LiveDebouncer(self.timers)
+        self.events.subscribe(self._store_change, TITLE_CHANGED, COVER_CHANGED, AREA_CHANGED)
+        self.events.subscribe(self._notify_title_change, TITLE_CHANGED)
+        # 默认监控列表（monitor_mids）的标题变更通知开关，租户各自在租户设置中配置
+        self.notify_title_change = os.getenv('NOTIFY_TITLE_CHANGE', 'true').lower() == 'true'
+        
+        # 直播采样（在线人数等）按场次压缩存储
+        from .timeseries import TimeSeriesRecorder
+        self.samples = TimeSeriesRecorder(self.db_manager)
+        self.current_live_ids = {}  # mid -> 当前直播记录ID
+        
+        # 每轮检查结束后的回调（例如发布状态快照）
+        self.cycle_listeners = []
         
         # 初始化通知器
         server_chan_config = self.config_manager.get_server_chan_config()
         self.notifier = LiveNotifier(server_chan_config['sendkey'])
         
-        # 初始化图片上传器
-        cloudflare_config = self.config_manager.get_cloudflare_config()
-        from ..utils.uploader import ImageUploader  # 添加导入
-        self.uploader = ImageUploader(cloudflare_config)
+        # 分片模式：多个节点共享数据库，各自负责一部分UP主
+        self.cluster = None
+        if os.getenv('CLUSTER_MODE', 'false').lower() == 'true':
+            from .cluster import ShardCoordinator, SQLiteLeaseStore
+            self.cluster = ShardCoordinator(SQLiteLeaseStore(self.db_manager))
+        
+        # 推送模式：通过直播间广播实时检测开播/下播，轮询降级为低频一致性校验
+        self.push_detector = None
+        self.room_to_mid = {}
+        # 推送线程只把状态变化放入队列，由监控循环线程处理，与轮询、复查不会同时处理同一个UP主
+        self._pushes = queue.Queue()
+        self.sweep_interval = int(os.getenv('PUSH_SWEEP_INTERVAL', '300'))
+        if os.getenv('PUSH_MODE', 'false').lower() == 'true':
+            from .live_ws import LivePushDetector
+            self.push_detector = LivePushDetector(self.enqueue_push)
+        
+        # 直播互动数据聚合（依赖推送模式的广播连接）
+        self.engagement = None
+        if self.push_detector and os.getenv('ENGAGEMENT_METRICS', 'false').lower() == 'true':
+            from .engagement import EngagementAggregator
+            self.engagement = EngagementAggregator(self.db_manager, self._live_id_for_room)
+            self.push_detector.message_handlers.append(self.engagement.handle_message)
+        
+        # 数据库后台维护（保留期限、归档、空间回收）
+        self.maintenance = None
+        if int(os.getenv('MAINTENANCE_INTERVAL', '3600')) > 0:
+            from .maintenance import MaintenanceWorker
+            self.maintenance = MaintenanceWorker(self.db_manager)
+        
+        # 恢复上次退出前保存的运行状态（状态缓存、截图时间、当前直播记录）
+        from .state import MonitorStateStore
+        self.state_store = MonitorStateStore()
+        self.update_monitor_list()
+        self.restore_state()
+        
+        # 流量录制：记录上游响应和关键事件，供 src.core.replay 回放对比
+        self.recorder = None
+        self._recorded_mids = None
+        capture_path = os.getenv('CAPTURE_PATH', '')
+        if capture_path:
+            from .capture import TrafficRecorder
+            self.recorder = TrafficRecorder(capture_path)
+            self.recorder.attach(
+                *self.identities.sessions,
+                self.notifier.session,
+                self.notifier.notifier.session
+            )
+            self.recorder.event(
+                'meta',
+                check_interval=self.check_interval,
+                screenshot_interval=self.screenshot_interval,
+                batch_size=self.batch_size,
+                retry_delay=self.retry_delay,
+                debounce=self.debouncer.settings(),
+                last_status={
+                    str(mid): self.db_manager.get_config(f'last_status_{mid}')
+                    for mid in self.monitor_mids
+                },
+                last_screenshot_times=self.last_screenshot_times
+            )
+        
+        # 队列深度等指标在导出时读取
+        metrics.REGISTRY.gauge('monitor_mids', '监控列表长度', func=lambda: len(self.monitor_mids))
+        metrics.REGISTRY.gauge('status_cache_size', '状态缓存条目数', func=lambda: len(self.status_cache))
+        metrics.REGISTRY.gauge('timers_pending', '计时轮上登记的定时任务数', func=lambda: len(self.timers))
+        if self.cluster:
+            metrics.REGISTRY.gauge('cluster_owned_shards', '本节点持有的分片数',
+                                   func=lambda: len(self.cluster.owned_shards))
+        if self.push_detector:
+            metrics.REGISTRY.gauge('push_rooms', '推送监听的直播间数',
+                                   func=lambda: self.push_detector.room_count)
+        if self.engagement:
+            metrics.REGISTRY.gauge('engagement_rooms', '互动数据缓冲区中的直播间数',
+                                   func=lambda: len(self.engagement.rooms))
         
+    @property
+    def screenshot(self):
+        """截图器（首次使用时加载浏览器相关依赖）"""
+        if self._screenshot is None:
+            with STARTUP.phase('lazy.screenshot'):
+                from ..utils.screenshot import LiveScreenshot
+                self._screenshot = LiveScreenshot()
+        return self._screenshot
+    
+    @screenshot.setter
+    def screenshot(self, value):
+        self._screenshot = value
+    
+    @property
+    def uploader(self):
+        """图床上传器（首次使用时创建）"""
+        if self._uploader is None:
+            with STARTUP.phase('lazy.uploader'):
+                from ..utils.uploader import ImageUploader
+                self._uploader = ImageUploader(self.config_manager.get_cloudflare_config())
+                if self.recorder:
+                    self.recorder.attach(self._uploader.uploader.session)
+        return self._uploader
+    
+    @uploader.setter
+    def uploader(self, value):
+        self._uploader = value
+    
+    @property
+    def upload_queue(self):
+        """图床异步上传队列（首次使用时创建）"""
+        if self._upload_queue is None:
+            from ..utils.uploader import UploadQueue
+            self._upload_queue = UploadQueue(self.uploader)
+        return self._upload_queue
+    
+    def _acquire_identity(self, attempt: int, previous):
+        """为本次请求取一个身份，重试时优先换用其他身份，只能用同一个身份时才等待重试延迟"""
+        identity = self.identities.acquire(exclude=previous)
+        if identity is None:
+            logger.warning("所有请求身份都在冷却中，跳过请求")
+        elif attempt > 0 and identity is previous:
+            delay = self.retry_delay + random.uniform(0, 3)
+            logger.debug(f"第{attempt + 1}次重试，等待{delay:.1f}秒")
+            clock.sleep(delay)
+        return identity
+
     def check_live_status(self, mid: str, retry_count=3) -> Dict[str, Any]:
         """检查直播状态"""
+        identity = None
         for attempt in range(retry_count):
+            identity = self._acquire_identity(attempt, identity)
+            if identity is None:
+                break
             try:
-                if attempt > 0:
-                    delay = self.retry_delay + random.uniform(0, 3)
-                    logger.debug(f"第{attempt + 1}次重试，等待{delay:.1f}秒")
-                    time.sleep(delay)
                 
-                url = f'https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids'
+                url = f'{self.api_base}/room/v1/Room/get_status_info_by_uids'
                 referer = 'https://live.bilibili.com'
                 
                 logger.debug(f"请求API: {url} (uid: {mid})")
                 
-                response = self.session.post(
-                    url,
-                    json={'uids': [int(mid)]},
-                    timeout=10,
-                    headers={
-                        'Referer': referer,
-                        'Origin': 'https://live.bilibili.com'
-                    }
-                )
+                request_start = time.perf_counter()
+                with TRACER.span('bilibili.status', mid=mid):
+                    response = identity.session.post(
+                        url,
+                        json={'uids': [int(mid)]},
+                        timeout=10,
+                        headers={
+                            'Referer': referer,
+                            'Origin': 'https://live.bilibili.com'
+                        }
+                    )
+                metrics.BILIBILI_REQUEST_SECONDS.observe(time.perf_counter() - request_start, api='status')
                 
-                data = response.json()
+                code, items, data = decode_status_batch(response.content)
+                metrics.BILIBILI_RESPONSES.inc(api='status', code=code)
                 
-                if data['code'] == 0 and 'data' in data:
-                    user_data = data['data'].get(str(mid), {})
-                    status_info = {
-                        'status': user_data.get('live_status', 0),
-                        'room_id': user_data.get('room_id', 0),
-                        'title': user_data.get('title', ''),
-                        'name': user_data.get('uname', ''),
-                        'timestamp': time.time()
-                    }
-                    
-                    # 更新状态缓存
-                    self.status_cache[mid] = status_info
+                if items is not None:
+                    # 更新状态缓存（已有记录原地更新）
+                    status_info = self.status_cache.put(
+                        mid, *(items.get(str(mid)) or (0, 0, '', '', 0, 0, '', '')), clock.now()
+                    )
+                    self.identities.report(identity, True)
                     logger.debug(f"获取状态成功: {status_info}")
                     return status_info
                 else:
-                    logger.warning(f"API返回异常: {data}")
-                    if data['code'] in [-352, -412, -799]:  # 风控、请求过快
-                        continue
+                    logger.warning(f"API返回异常（身份 {identity.name}）: {data}")
+                    # 风控、请求过快时该身份会被冷却，重试换用其他身份
+                    self.identities.report(identity, False, code)
                 
             except Exception as e:
                 logger.error(f"检查直播状态失败: {str(e)}")
-                if attempt < retry_count - 1:
-                    continue
+                self.identities.report(identity, False)
         
         # 如果所有重试都失败了，返回缓存的状态
-        if mid in self.status_cache:
-            cache_time = time.time() - self.status_cache[mid]['timestamp']
-            if cache_time < 300:  # 缓存时间小于5分钟
-                logger.info(f"使用缓存的状态（{cache_time:.0f}秒前）")
-                return self.status_cache[mid]
-        
-        return None
+        return self._cached_status(mid)
 
     def check_multiple_live_status(self, mids, retry_count=3):
         """批量检查直播状态"""
+        identity = None
         for attempt in range(retry_count):
+            identity = self._acquire_identity(attempt, identity)
+            if identity is None:
+                break
             try:
-                if attempt > 0:
-                    delay = self.retry_delay + random.uniform(0, 3)
-                    logger.debug(f"第{attempt + 1}次重试，等待{delay:.1f}秒")
-                    time.sleep(delay)
                 
-                url = 'https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids'
+                url = f'{self.api_base}/room/v1/Room/get_status_info_by_uids'
                 referer = 'https://live.bilibili.com'
                 
                 # 转换所有mid为整数
                 uid_list = [int(mid) for mid in mids]
-                logger.debug(f"批量请求API: {url} (uids: {uid_list})")
+                logger.opt(lazy=True).debug("批量请求API: {} (uids: {})", lambda: url, lambda: uid_list)
                 
-                response = self.session.post(
-                    url,
-                    json={'uids': uid_list},
-                    timeout=10,
-                    headers={
-                        'Referer': referer,
-                        'Origin': 'https://live.bilibili.com'
-                    }
-                )
+                request_start = time.perf_counter()
+                with TRACER.span('bilibili.status_batch', uids=len(uid_list), attempt=attempt + 1):
+                    response = identity.session.post(
+                        url,
+                        json={'uids': uid_list},
+                        timeout=10,
+                        headers={
+                            'Referer': referer,
+                            'Origin': 'https://live.bilibili.com'
+                        }
+                    )
+                metrics.BILIBILI_REQUEST_SECONDS.observe(time.perf_counter() - request_start, api='status_batch')
                 
-                data = response.json()
+                # 只取用到的字段，状态记录原地更新，不为每个UP主新建字典
+                code, items, data = decode_status_batch(response.content)
+                metrics.BILIBILI_RESPONSES.inc(api='status_batch', code=code)
                 
-                if data['code'] == 0 and 'data' in data:
-                    result = {}
-                    for mid, user_data in data['data'].items():
-                        status_info = {
-                            'status': user_data.get('live_status', 0),
-                            'room_id': user_data.get('room_id', 0),
-                            'title': user_data.get('title', ''),
-                            'name': user_data.get('uname', ''),
-                            'timestamp': time.time()
-                        }
-                        result[mid] = status_info
-                        self.status_cache[mid] = status_info
+                if items is not None:
+                    now = clock.now()
+                    put = self.status_cache.put
+                    result = {mid: put(mid, *fields, now) for mid, fields in items.items()}
                     
-                    # 修改日志格式，让它更易读
-                    log_info = "\n".join([
+                    # 日志内容只在开启 DEBUG 时才生成
+                    logger.opt(lazy=True).debug("批量获取状态成功:\n{}", lambda: "\n".join(
                         f"[{info['name']}] 状态: {'直播中' if info['status'] == 1 else '未直播'}, "
                         f"标题: {info['title']}"
-                        for mid, info in result.items()
-                    ])
-                    logger.debug(f"批量获取状态成功:\n{log_info}")
+                        for info in result.values()
+                    ))
+                    self.identities.report(identity, True)
                     return result
                 else:
-                    logger.warning(f"API返回异常: {data}")
-                    if data['code'] in [-352, -412, -799]:  # 风控、请求过快
-                        continue
+                    logger.warning(f"API返回异常（身份 {identity.name}）: {data}")
+                    # 风控、请求过快时该身份会被冷却，重试换用其他身份
+                    self.identities.report(identity, False, code)
                 
             except Exception as e:
                 logger.error(f"批量检查状态失败: {str(e)}")
-                if attempt < retry_count - 1:
-                    continue
+                self.identities.report(identity, False)
         
         # 如果所有重试都失败了，返回缓存的状态
         result = {}
         for mid in mids:
-            if mid in self.status_cache:
-                cache_time = time.time() - self.status_cache[mid]['timestamp']
-                if cache_time < 300:  # 缓存时间小于5分钟
-                    logger.info(f"使用缓存的状态（{cache_time:.0f}秒前）: {mid}")
-                    result[mid] = self.status_cache[mid]
+            status = self._cached_status(mid)
+            if status is not None:
+                result[mid] = status
         
         return result if result else None
 
+    def _cached_status(self, mid: str):
+        """请求失败时使用的缓存状态，超过 status_cache_ttl 秒时返回 None"""
+        status = self.status_cache.get(mid)
+        if status is not None:
+            cache_time = clock.now() - status['timestamp']
+            if cache_time < self.status_cache_ttl:
+                logger.info(f"使用缓存的状态（{cache_time:.0f}秒前）: {mid}")
+                metrics.STATUS_CACHE.inc(result='hit')
+                return status
+        metrics.STATUS_CACHE.inc(result='miss')
+        return None
+
     def get_live_duration(self, start_time: str) -> str:
         """计算直播时长
         
@@ -260,25 +411,23 @@ class BilibiliMonitor:
             mid: UP主ID
             live_status: 直播状态信息
         """
-        current_time = time.time()
-        last_time = self.last_screenshot_times.get(mid, 0)
-        
-        # 判断是否需要截图
-        need_screenshot = (
-            # 从未截图
-            last_time == 0 or
-            # 达到截图间隔
-            (current_time - last_time) >= self.screenshot_interval
-        )
+        current_time = clock.now()
         
-        if need_screenshot:
+        # 从未截图或达到截图间隔时才截图
+        if self._screenshot_due(mid):
             logger.info(f"开始获取直播截图: {live_status['name']}")
             
-            # 获取截图
+            # 获取截图（使用身份池中的 cookie 和出口代理，身份没有 cookie 时使用 bilibili_cookies）
+            identity = self.identities.acquire()
             screenshot_file, success = self.screenshot.capture(
                 live_status['room_id'],
-                self.cookies
+                (identity and identity.cookies) or self.cookies,
+                proxy=identity.proxy if identity else None
             )
+            if self.recorder:
+                # 以开始截图的时间为准，回放时按录制结果决定截图是否成功
+                self.recorder.event('screenshot', t=current_time, mid=mid,
+                                    room_id=live_status['room_id'], success=bool(success and screenshot_file))
             
             if success and screenshot_file:
                 try:
@@ -287,39 +436,29 @@ class BilibiliMonitor:
                     live_time = live_info.get('live_time', '')
                     duration = self.get_live_duration(live_time)
                     
-                    # 上传截图
-                    image_url = self.uploader.upload_screenshot(screenshot_file)
+                    # 先存入本地存储，图床只作为异步复制目标，不可用时截图不会丢失
+                    digest = self.images.put_file(screenshot_file)
+                    local_url = self.images.url(digest)
+                    logger.info(f"截图已保存: {digest}")
                     
-                    if image_url:
-                        logger.info(f"截图上传成功: {image_url}")
-                        
-                        # 更新数据库
-                        self.last_screenshot_times[mid] = current_time
-                        live_id = self.db_manager.get_current_live_id(mid)
-                        if live_id:
-                            self.db_manager.add_screenshot(live_id, image_url)
-                        
-                        # 发送截图通知
-                        title = f"📸 直播截图：{live_status['name']}"
-                        content = (
-                            f"# {live_status['name']} 的直播截图\n\n"
-                            f"## 📺 直播信息\n\n"
-                            f"- 📝 标题：**{live_status['title']}**\n"
-                            f"- 🏠 房间号：**{live_status['room_id']}**\n"
-                            f"- ⏰ 开播时间：**{live_time}**\n"
-                            f"- ⌛ 已播时长：**{duration}**\n"
-                            f"- 🔗 直播间：[点击进入直播间](https://live.bilibili.com/{live_status['room_id']})\n\n"
-                            f"## 🖼️ 直播画面\n\n"
-                            f"![直播画面]({image_url})\n\n"
-                            "---\n"
-                            "*由 Bilibili Live Monitor 自动发送*"
-                        )
-                        
-                        self.notifier.notifier.send(
-                            title=title,
-                            content=content,
-                            short=f"{live_status['name']} 直播截图"
+                    # 更新数据库
+                    self._set_screenshot_time(mid, current_time)
+                    live_id = self.db_manager.get_current_live_id(mid)
+                    screenshot_id = self.db_manager.add_screenshot(live_id, local_url, digest) if live_id else None
+                    
+                    notify = partial(self._notify_screenshot, mid, live_status, live_time, duration)
+                    if self.images.public_base_url:
+                        # 本地地址可以公开访问，立即通知
+                        notify(local_url)
+                        notify = None
+                    if self.replicate_images:
+                        self.upload_queue.submit(
+                            self.images.path(digest),
+                            partial(self._on_image_replicated, screenshot_id, notify=notify),
+                            key=digest
                         )
+                    elif notify:
+                        logger.warning("未配置 PUBLIC_BASE_URL 和图床，截图只保存在本地，不发送截图通知")
                         
                 finally:
                     # 清理临时文件
@@ -330,94 +469,682 @@ class BilibiliMonitor:
                     except Exception as e:
                         logger.error(f"删除临时文件失败: {str(e)}")
 
+    def _screenshot_due(self, mid: str) -> bool:
+        """是否到了截图时间（从未截图，或登记的截图时间已到）"""
+        return mid in self._screenshots_due or ('screenshot', mid) not in self.timers
+
+    def _set_screenshot_time(self, mid: str, taken_at: float) -> None:
+        """记录截图时间，并在计时轮上登记下一次截图"""
+        self.last_screenshot_times[mid] = taken_at
+        self._screenshots_due.discard(mid)
+        self.timers.schedule(
+            ('screenshot', mid), taken_at + self.screenshot_interval - clock.now(),
+            self._screenshots_due.add, mid
+        )
+
+    def _clear_screenshot_time(self, mid: str) -> None:
+        """下播或取消监控时清除截图时间"""
+        self.last_screenshot_times.pop(mid, None)
+        self._screenshots_due.discard(mid)
+        self.timers.cancel(('screenshot', mid))
+
+    def set_screenshot_times(self, times: Dict[str, float]) -> None:
+        """恢复截图时间（重启后从状态文件、回放时从录制文件）"""
+        for mid, taken_at in times.items():
+            self._set_screenshot_time(str(mid), taken_at)
+
+    def _on_image_replicated(self, screenshot_id, image_url, notify=None) -> None:
+        """截图复制到图床后的回调：记录图床地址，本地地址不能公开访问时此时才发送通知"""
+        if image_url:
+            logger.info(f"截图上传成功: {image_url}")
+            if screenshot_id:
+                self.db_manager.update_screenshot_url(screenshot_id, image_url)
+            if notify:
+                notify(image_url)
+        else:
+            logger.warning("截图复制到图床失败，仅保存在本地")
+
+    def _notify_screenshot(self, mid: str, live_status: dict, live_time: str, duration: str, image_url: str) -> None:
+        """发送截图通知"""
+        title = f"📸 直播截图：{live_status['name']}"
+        content = (
+            f"# {live_status['name']} 的直播截图\n\n"
+            f"## 📺 直播信息\n\n"
+            f"- 📝 标题：**{live_status['title']}**\n"
+            f"- 🏠 房间号：**{live_status['room_id']}**\n"
+            f"- ⏰ 开播时间：**{live_time}**\n"
+            f"- ⌛ 已播时长：**{duration}**\n"
+            f"- 🔗 直播间：[点击进入直播间](https://live.bilibili.com/{live_status['room_id']})\n\n"
+            f"## 🖼️ 直播画面\n\n"
+            f"![直播画面]({image_url})\n\n"
+            "---\n"
+            "*由 Bilibili Live Monitor 自动发送*"
+        )
+        
+        # 同一张截图发往所有订阅者
+        self.notifier.broadcast(
+            self._recipients(mid), title, content, f"{live_status['name']} 直播截图"
+        )
+
+    def poll_statuses(self, mids) -> Dict[str, Dict[str, Any]]:
+        """分批获取监控列表的直播状态
+        
+        Args:
+            mids: UP主ID列表
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: mid -> 状态信息
+        """
+        result = {}
+        chunks = [mids[i:i + self.batch_size] for i in range(0, len(mids), self.batch_size)]
+        workers = min(self.identities.available(), len(chunks))
+        if workers > 1:
+            # 多个身份时各批次并发请求，每个身份受自己的配额限制
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='status') as executor:
+                batches = list(executor.map(self.check_multiple_live_status, chunks))
+        else:
+            batches = [self.check_multiple_live_status(chunk) for chunk in chunks]
+        for statuses in batches:
+            if statuses:
+                result.update({str(mid): info for mid, info in statuses.items()})
+        return result
+
+    def process_status(self, mid: str, live_status: Dict[str, Any], last_status_str=_UNKNOWN) -> None:
+        """处理单个UP主的最新状态
+        
+        Args:
+            mid: UP主ID
+            live_status: 最新的直播状态信息
+            last_status_str: 数据库中的上次状态（轮询时整轮批量读取），不传时单独查询
+        """
+        # 获取上次状态
+        if last_status_str is _UNKNOWN:
+            last_status_str = self.db_manager.get_config(f'last_status_{mid}')
+        last_status = int(last_status_str) if last_status_str is not None else 0
+        
+        # 接口给出的状态（0 未直播、1 直播中、2 轮播），经过防抖得到当前状态（0/1）
+        observed = int(live_status.get('status', 0))
+        current_status, first_seen = self.debouncer.observe(str(mid), observed, last_status)
+        
+        # 轮询结果本身就是缓存中的记录（已原地更新），推送等其他来源的状态写回缓存
+        if live_status is not self.status_cache.get(str(mid)):
+            self.status_cache.put(
+                str(mid), observed, live_status.get('room_id') or 0,
+                live_status.get('title'), live_status.get('name'),
+                live_status.get('online') or 0, live_status.get('live_time') or 0,
+                live_status.get('cover'), live_status.get('area'),
+                live_status.get('timestamp') or clock.now()
+            )
+        
+        # 如果状态发生变化
+        if current_status != last_status:
+            with TRACER.span('transition', mid=mid, status=current_status):
+                self._handle_transition(mid, live_status, last_status_str, current_status, first_seen)
+        
+        # 如果正在直播，记录采样并检查是否需要定时截图（待确认下播期间暂停）
+        elif current_status == 1 and observed == 1:
+            self.record_sample(mid, live_status)
+            
+            # 只在达到截图间隔时才截图
+            if self._screenshot_due(mid):
+                with TRACER.span('screenshot', mid=mid):
+                    self.handle_screenshot(mid, live_status)
+
+    def _handle_transition(self, mid: str, live_status: Dict[str, Any],
+                           last_status_str, current_status: int, first_seen: float = None) -> None:
+        """处理开播/下播状态变化
+        
+        Args:
+            first_seen: 防抖确认前首次观察到该变化的时间，下播时间以此为准
+        """
+        # 先原子地抢占状态变更，多个节点同时观察到同一变化时只有一个会发送通知
+        if not self.db_manager.compare_and_set_config(
+            f'last_status_{mid}', last_status_str, str(current_status)
+        ):
+            logger.debug(f"状态变更已由其他节点处理: {mid}")
+            return
+        if self.recorder:
+            self.recorder.event('transition', mid=mid, status=current_status)
+        
+        if current_status == 1:
+            # 推送检测会带上收到推送的时间，轮询则以收到接口响应的时间为准
+            detected_at = live_status.get('detected_at') or live_status.get('timestamp') or clock.now()
+            if first_seen:
+                detected_at = min(detected_at, first_seen)
+            
+            # 开播通知（发往所有订阅了该UP主的渠道）
+            recipients = self._recipients(mid)
+            if recipients:
+                self.notifier.notify_live_start(
+                    name=live_status['name'],
+                    room_id=live_status['room_id'],
+                    title=live_status['title'],
+                    recipients=recipients
+                )
+            notified_at = clock.now()
+            
+            logger.info(f"[开播] {live_status['name']} ({mid})")
+            self.current_live_ids[mid] = self.db_manager.add_live_record(
+                mid=mid,
+                room_id=live_status['room_id'],
+                title=live_status['title'],
+                start_time=datetime.fromtimestamp(clock.now()),
+                upstream_live_time=live_status.get('live_time') or None,
+                detected_at=detected_at,
+                notified_at=notified_at
+            )
+            self.record_sample(mid, live_status)
+            self.events.publish(ChangeEvent(WENT_LIVE, mid, last_status_str and int(last_status_str), 1, live_status))
+        else:
+            # 下播通知
+            recipients = self._recipients(mid)
+            if recipients:
+                self.notifier.notify_live_end(
+                    name=live_status['name'],
+                    room_id=live_status['room_id'],
+                    title=live_status['title'],
+                    recipients=recipients
+                )
+            
+            logger.info(f"[下播] {live_status['name']} ({mid})")
+            live_id = self.current_live_ids.pop(mid, None) or self.db_manager.get_current_live_id(mid)
+            if live_id:
+                self.samples.close(live_id)
+            self.db_manager.update_live_status(
+                mid, status=0, end_time=datetime.fromtimestamp(min(first_seen or clock.now(), clock.now()))
+            )
+            
+            # 下播时清除截图时间记录
+            self._clear_screenshot_time(mid)
+            self.events.publish(ChangeEvent(WENT_OFFLINE, mid, last_status_str and int(last_status_str),
+                                            current_status, live_status))
+    
+    def _store_change(self, event: ChangeEvent) -> None:
+        """直播中的标题、封面、分区变化记入当前直播记录"""
+        if int(event.status.get('status') or 0) != 1:
+            return
+        live_id = self.current_live_ids.get(event.mid) or self.db_manager.get_current_live_id(event.mid)
+        if live_id is None:
+            return
+        self.db_manager.add_live_change(live_id, event.type, event.old, event.new, clock.now())
+        logger.info(f"[{event.type}] {event.status.get('name')} ({event.mid}): {event.old} -> {event.new}")
+    
+    def _notify_title_change(self, event: ChangeEvent) -> None:
+        """直播中修改标题时发送通知"""
+        if int(event.status.get('status') or 0) != 1:
+            return
+        recipients = self._recipients(event.mid, 'notify_title_change')
+        if not recipients:
+            return
+        self.notifier.notify_title_change(
+            name=event.status.get('name'),
+            room_id=event.status.get('room_id'),
+            old_title=event.old,
+            new_title=event.new,
+            recipients=recipients
+        )
+    
+    def _recipients(self, mid: str, option: str = None) -> list:
+        """UP主状态变化需要发往的通知渠道：默认渠道（在默认监控列表中时）和订阅了该UP主的租户
+        
+        Args:
+            option: 通知开关（如 notify_title_change），只发往开启了该通知的渠道
+        """
+        recipients = []
+        if str(mid) in self.default_mids and (option is None or getattr(self, option)):
+            recipients.append(self.notifier.notifier)
+        recipients.extend(self.tenants.channels(mid, option))
+        return recipients
+
+    def enqueue_push(self, room_id: int, status: int) -> None:
+        """收到广播推送的状态变化（推送线程调用），交给监控循环线程处理"""
+        self._pushes.put((room_id, status, clock.now()))
+
+    def process_pushes(self, timeout: float = 0) -> int:
+        """在监控循环线程中处理排队的推送
+        
+        Args:
+            timeout: 队列为空时最多等待的秒数，收到推送后立即处理
+        
+        Returns:
+            int: 处理的推送数
+        """
+        handled = 0
+        try:
+            push = self._pushes.get(timeout=timeout) if timeout > 0 else self._pushes.get_nowait()
+            while True:
+                try:
+                    self.handle_push_status(*push)
+                except Exception as e:
+                    logger.error(f"处理推送状态失败: {str(e)}")
+                handled += 1
+                push = self._pushes.get_nowait()
+        except queue.Empty:
+            return handled
+
+    def handle_push_status(self, room_id: int, status: int, detected_at: float = None) -> None:
+        """处理广播推送的状态变化（只在监控循环线程中调用）
+        
+        Args:
+            room_id: 直播间ID
+            status: 推送的直播状态
+            detected_at: 收到推送的时间，默认为当前时间
+        """
+        mid = self.room_to_mid.get(room_id)
+        if mid is None:
+            return
+        if self.cluster and not self.cluster.owns(mid):
+            return
+        
+        detected_at = detected_at or clock.now()
+        if self.recorder:
+            self.recorder.event('push', room_id=room_id, mid=mid, status=status, detected_at=detected_at)
+        with TRACER.trace('push', mid=mid, room_id=room_id, status=status):
+            # 推送消息不包含标题和用户名，补查一次最新信息
+            live_status = self.check_live_status(mid, retry_count=1) or self.status_cache.get(mid)
+            if not live_status:
+                logger.warning(f"推送状态变化但获取直播信息失败: {mid}")
+                return
+            
+            # 接口数据可能稍有延迟，以推送的状态为准
+            live_status = dict(live_status, status=status, detected_at=detected_at)
+            self.process_status(mid, live_status)
+
+    def _live_id_for_room(self, room_id: int):
+        """获取直播间当前直播记录ID"""
+        mid = self.room_to_mid.get(room_id)
+        return self.db_manager.get_current_live_id(mid) if mid is not None else None
+
+    def sync_push_rooms(self) -> None:
+        """根据状态缓存同步推送监听的直播间"""
+        room_to_mid = {}
+        for mid in self.monitor_mids:
+            if self.cluster and not self.cluster.owns(mid):
+                continue
+            room_id = (self.status_cache.get(mid) or {}).get('room_id')
+            if room_id:
+                room_to_mid[room_id] = mid
+        self.room_to_mid = room_to_mid
+        self.push_detector.sync_rooms(room_to_mid.keys())
+
+    def record_sample(self, mid: str, live_status: Dict[str, Any]) -> None:
+        """记录直播中的采样数据"""
+        live_id = self.current_live_ids.get(mid)
+        if live_id is None:
+            # 重启后缓存为空，从数据库恢复
+            live_id = self.db_manager.get_current_live_id(mid)
+            if live_id is None:
+                return
+            self.current_live_ids[mid] = live_id
+        self.samples.record(
+            live_id,
+            int(live_status.get('timestamp') or clock.now()),
+            online=live_status.get('online', 0)
+        )
+
+    def run_once(self) -> None:
+        """执行一轮检查"""
+        # 先执行到期的定时任务（标记到了截图时间的UP主等）
+        self.timers.advance()
+        
+        # 更新监控列表
+        with TRACER.span('update_monitor_list'):
+            self.update_monitor_list()
+        
+        if self.recorder:
+            # 监控列表只在变化时写入录制文件
+            if self.monitor_mids != self._recorded_mids:
+                self._recorded_mids = list(self.monitor_mids)
+                self.recorder.event('cycle', mids=self._recorded_mids)
+            else:
+                self.recorder.event('cycle')
+        
+        # 分片模式下只检查本节点持有的分片
+        mids = self.monitor_mids
+        if self.cluster:
+            mids = self.cluster.filter_mids(mids)
+            logger.debug(f"本节点负责 {len(mids)}/{len(self.monitor_mids)} 个UP主")
+        
+        with TRACER.span('poll', mids=len(mids)):
+            statuses = self.poll_statuses(mids)
+        
+        if len(statuses) < len(mids):
+            logger.warning(f"获取直播状态失败: {len(mids) - len(statuses)}/{len(mids)} 个UP主")
+        
+        # 只处理状态有变化的UP主，没有变化且未直播的UP主本轮不再逐个处理
+        if self.cluster:
+            self.differ.retain(mids)
+        with TRACER.span('diff', statuses=len(statuses)):
+            changes = self.differ.diff(statuses)
+        
+        pending = self.debouncer.pending()
+        if not changes and not self.differ.live and not pending:
+            return
+        # 上次状态整轮一次性读取，不为每个UP主单独查询数据库
+        last_statuses = self.db_manager.get_configs_by_prefix('last_status_')
+        
+        for mid, events in changes.items():
+            # 处理期间分片可能已被转移给其他节点
+            if self.cluster and not self.cluster.owns(mid):
+                continue
+            self.process_status(mid, statuses[mid], last_statuses.get(f'last_status_{mid}'))
+            # 开播、下播的同时发生的标题等变化已包含在开播/下播通知中
+            if not any(event.type in STATUS_EVENTS for event in events):
+                for event in events:
+                    self.events.publish(event)
+            # 处理成功后才更新快照，处理失败（抛出异常）的UP主下一轮重新处理
+            self.differ.commit(mid, statuses[mid])
+        
+        # 持续直播中的UP主记录采样、定时截图，待确认的UP主累计观察次数
+        for mid in dict.fromkeys([*self.differ.live, *pending]):
+            if mid in changes or mid not in statuses:
+                continue
+            if self.cluster and not self.cluster.owns(mid):
+                continue
+            self.process_status(mid, statuses[mid], last_statuses.get(f'last_status_{mid}'))
+
+    def recheck_pending(self, mids=None) -> None:
+        """单独复查到期的待确认UP主，不等下一轮常规检查
+        
+        Args:
+            mids: 要复查的UP主，默认为到期的待确认UP主（回放时按录制的列表）
+        """
+        self.timers.advance()
+        mids = self.debouncer.due() if mids is None else mids
+        if self.cluster:
+            mids = [mid for mid in mids if self.cluster.owns(mid)]
+        if not mids:
+            return
+        if self.recorder:
+            self.recorder.event('recheck', mids=mids)
+        with TRACER.trace('recheck', mids=len(mids)):
+            statuses = self.poll_statuses(mids)
+            for mid in mids:
+                live_status = statuses.get(str(mid))
+                if live_status:
+                    self.process_status(mid, live_status)
+                    # 复查结果同样计入差异检测的快照，下一轮据此判断是否有变化
+                    self.differ.commit(str(mid), live_status)
+
+    def restore_state(self) -> None:
+        """从状态文件恢复运行状态"""
+        state = self.state_store.load()
+        if not state:
+            return
+        self.status_cache.update(state.get('status_cache') or {})
+        self.set_screenshot_times(state.get('last_screenshot_times') or {})
+        self.current_live_ids.update(state.get('current_live_ids') or {})
+        # 停机期间被移除的UP主不再保留
+        monitored = {str(mid) for mid in self.monitor_mids}
+        self.evict([mid for mid in list(self.status_cache) if mid not in monitored])
+        logger.info(
+            f"已恢复运行状态（{clock.now() - state.get('saved_at', 0):.0f}秒前保存）: "
+            f"{len(self.status_cache)} 条状态缓存，{len(self.last_screenshot_times)} 条截图时间"
+        )
+    
+    def save_state(self) -> None:
+        """保存运行状态（监控线程可能同时在修改，先做浅拷贝），同时写入缓冲中的直播采样"""
+        self.samples.flush_all()
+        self.state_store.save({
+            'status_cache': self.status_cache.to_dict(),
+            'last_screenshot_times': dict(self.last_screenshot_times),
+            'current_live_ids': dict(self.current_live_ids),
+        })
+    
+    def stop(self) -> None:
+        """停止监控时调用：保存运行状态，释放分片租约"""
+        self.save_state()
+        if self.cluster:
+            self.cluster.stop()
+    
+    def reconcile(self) -> Dict[str, list]:
+        """启动时一次性校准
+        
+        用一轮批量状态查询对齐所有UP主的上次状态和未结束的直播记录。
+        停机期间错过的开播/下播只写入记录并汇总成一条通知，不逐个发送。
+        
+        Returns:
+            Dict[str, list]: 停机期间开播（started）和下播（ended）的UP主
+        """
+        if self.recorder:
+            # 回放时按此事件重新执行校准，之后的检查周期只在监控列表变化时再记录
+            self._recorded_mids = list(self.monitor_mids)
+            self.recorder.event('reconcile', mids=self._recorded_mids)
+        mids = self.monitor_mids
+        if self.cluster:
+            mids = self.cluster.filter_mids(mids)
+        last_statuses = self.db_manager.get_configs_by_prefix('last_status_')
+        open_records = {str(record['mid']): record for record in self.db_manager.get_open_live_records()}
+        
+        with TRACER.trace('reconcile', mids=len(mids)):
+            statuses = self.poll_statuses(mids)
+        
+        started, ended = [], []
+        end_time = datetime.fromtimestamp(clock.now())
+        for mid in mids:
+            live_status = statuses.get(str(mid))
+            if not live_status:
+                continue
+            last_status_str = last_statuses.get(f'last_status_{mid}')
+            last_status = int(last_status_str) if last_status_str is not None else 0
+            current_status = int(live_status.get('status', 0))
+            record = open_records.get(str(mid))
+            
+            if current_status == last_status:
+                if current_status == 1 and record:
+                    self.current_live_ids[mid] = record['id']
+                elif current_status != 1 and record:
+                    # 状态已是未直播但记录没有关闭，直接补上结束时间
+                    self.db_manager.update_live_status(mid, status=0, end_time=end_time)
+                continue
+            
+            if not self.db_manager.compare_and_set_config(
+                f'last_status_{mid}', last_status_str, str(current_status)
+            ):
+                continue
+            if current_status == 1:
+                if record:
+                    # 上一场的记录没有正常关闭
+                    self.db_manager.update_live_status(mid, status=0, end_time=end_time)
+                started.append((mid, live_status))
+            elif last_status == 1:
+                live_id = self.current_live_ids.pop(mid, None) or (record or {}).get('id')
+                if live_id:
+                    self.samples.close(live_id)
+                self.db_manager.update_live_status(mid, status=0, end_time=end_time)
+                self._clear_screenshot_time(mid)
+                ended.append((mid, live_status))
+        
+        if started or ended:
+            self._notify_missed_transitions(started, ended)
+        notified_at = clock.now()
+        for mid, live_status in started:
+            self.current_live_ids[mid] = self.db_manager.add_live_record(
+                mid=mid,
+                room_id=live_status['room_id'],
+                title=live_status['title'],
+                start_time=datetime.fromtimestamp(clock.now()),
+                upstream_live_time=live_status.get('live_time') or None,
+                detected_at=live_status.get('timestamp') or clock.now(),
+                notified_at=notified_at,
+                reconciled=True
+            )
+        
+        # 校准全部完成后以本次结果作为差异检测的初始快照；中途失败时首轮检查按首次出现重新核对
+        for mid, live_status in statuses.items():
+            self.differ.commit(mid, live_status)
+        
+        logger.info(f"启动校准完成: {len(mids)} 个UP主，停机期间 {len(started)} 人开播、{len(ended)} 人下播")
+        return {
+            'started': [mid for mid, _ in started],
+            'ended': [mid for mid, _ in ended],
+        }
+    
+    def _notify_missed_transitions(self, started: list, ended: list) -> None:
+        """把停机期间错过的状态变化按通知渠道各汇总成一条通知"""
+        by_channel = {}
+        for index, transitions in enumerate((started, ended)):
+            for mid, info in transitions:
+                for channel in self._recipients(mid):
+                    by_channel.setdefault(id(channel), (channel, [], []))[index + 1].append((mid, info))
+        for channel, channel_started, channel_ended in by_channel.values():
+            self._send_missed_summary(channel, channel_started, channel_ended)
+    
+    def _send_missed_summary(self, channel, started: list, ended: list) -> None:
+        """向一个通知渠道发送停机期间的状态变化汇总"""
+        lines = []
+        if started:
+            lines.append("## 🔴 正在直播\n")
+            lines.extend(
+                f"- **{info['name']}**：{info['title']} "
+                f"([进入直播间](https://live.bilibili.com/{info['room_id']}))"
+                for _, info in started
+            )
+            lines.append("")
+        if ended:
+            lines.append("## ⚫ 已下播\n")
+            lines.extend(f"- **{info['name']}**：{info['title']}" for _, info in ended)
+            lines.append("")
+        lines.append("---\n*由 Bilibili Live Monitor 自动发送*")
+        
+        channel.send(
+            title=f"🔄 监控重启期间：{len(started)} 人开播，{len(ended)} 人下播",
+            content="# 监控重启期间的直播状态变化\n\n" + "\n".join(lines),
+            short=f"{len(started)} 人开播，{len(ended)} 人下播"
+        )
+    
     def run(self):
         """运行监控循环"""
+        WATCHDOG.interval = self.sweep_interval if self.push_detector else self.check_interval
+        WATCHDOG.start()
+        # 正常退出（包括收到 SIGTERM 后退出）时保存运行状态
+        atexit.register(self.stop)
+        if self.cluster:
+            self.cluster.start()
+        
+        # 后台预先建立到各上游的连接，第一轮检查不用等待 TLS 握手
+        upload_domain = self.config_manager.get_cloudflare_config()['domain']
+        TRANSPORT.prewarm(
+            [self.api_base, self.notifier.notifier.api_base,
+             upload_domain if '://' in upload_domain else f'https://{upload_domain}'],
+            proxies={identity.proxy for identity in self.identities.identities}
+        )
+        
+        # 常规轮询开始前先一次性校准停机期间的变化
+        try:
+            self.update_monitor_list()
+            self.reconcile()
+        except Exception as e:
+            logger.error(f"启动校准失败: {str(e)}")
+        
+        if self.push_detector:
+            self.push_detector.start()
+        if self.engagement:
+            self.engagement.start()
+        # 下一轮检查、状态保存、数据库维护都是计时轮上的任务，主循环只推进计时轮并复查到期的待确认状态
+        self.timers.schedule('cycle', 0, self._run_cycle)
+        self.timers.every('save_state', max(self.state_store.save_interval, self.timers.tick), self.save_state)
+        if self.maintenance:
+            self.timers.every('maintenance', self.maintenance.interval, self.maintenance.run_in_background)
+            logger.info(f"数据库维护已启动，间隔 {self.maintenance.interval} 秒")
+        
         while True:
-            try:
-                # 更新监控列表
-                self.update_monitor_list()
-                
-                # 遍历监控列表
-                for mid in self.monitor_mids:
-                    # 获取当前状态
-                    live_status = self.check_live_status(mid)
-                    if not live_status:
-                        logger.warning(f"获取直播状态失败: {mid}")
-                        continue
-                    
-                    # 获取上次状态
-                    last_status_str = self.db_manager.get_config(f'last_status_{mid}')
-                    last_status = int(last_status_str) if last_status_str is not None else 0
-                    
-                    # 获取当前状态
-                    current_status = int(live_status.get('status', 0))
-                    
-                    # 更新状态缓存
-                    self.status_cache[mid] = {
-                        'status': current_status,
-                        'room_id': live_status.get('room_id'),
-                        'title': live_status.get('title'),
-                        'name': live_status.get('name'),
-                        'timestamp': time.time() + self.check_interval
-                    }
-                    
-                    # 如果状态发生变化
-                    if current_status != last_status:
-                        if current_status == 1:
-                            # 开播通知
-                            self.notifier.notify_live_start(
-                                name=live_status['name'],
-                                room_id=live_status['room_id'],
-                                title=live_status['title']
-                            )
-                            
-                            logger.info(f"[开播] {live_status['name']} ({mid})")
-                            self.db_manager.add_live_record(
-                                mid=mid,
-                                room_id=live_status['room_id'],
-                                title=live_status['title']
-                            )
-                        else:
-                            # 下播通知
-                            self.notifier.notify_live_end(
-                                name=live_status['name'],
-                                room_id=live_status['room_id'],
-                                title=live_status['title']
-                            )
-                            
-                            logger.info(f"[下播] {live_status['name']} ({mid})")
-                            self.db_manager.update_live_status(mid, status=0)
-                            
-                            # 下播时清除截图时间记录
-                            self.last_screenshot_times.pop(mid, None)
-                        
-                        self.db_manager.set_config(f'last_status_{mid}', str(current_status))
-                    
-                    # 如果正在直播，检查是否需要定时截图
-                    elif current_status == 1:
-                        current_time = time.time()
-                        last_time = self.last_screenshot_times.get(mid, 0)
-                        
-                        # 只在达到截图间隔时才截图
-                        if (current_time - last_time) >= self.screenshot_interval:
-                            self.handle_screenshot(mid, live_status)
+            self.timers.advance()
+            if self.debouncer.due():
+                try:
+                    self.recheck_pending()
+                except Exception as e:
+                    logger.error(f"复查待确认状态失败: {str(e)}")
+            if self.push_detector:
+                # 等待推送的同时作为主循环的节拍
+                self.process_pushes(self.timers.tick)
+            else:
+                clock.sleep(self.timers.tick)
+
+    def _run_cycle(self) -> None:
+        """执行一轮检查，并登记下一轮"""
+        # 推送模式下轮询只做一致性校验
+        interval = self.sweep_interval if self.push_detector else self.check_interval
+        try:
+            with metrics.CYCLE_SECONDS.time(), TRACER.trace('cycle'):
+                self.run_once()
+            metrics.LAST_CYCLE.set(time.time())
+            WATCHDOG.beat()
             
-                # 等待下次检查
-                logger.debug(f"等待 {self.check_interval} 秒后进行下次检查")
-                time.sleep(self.check_interval)
-                
-            except Exception as e:
-                logger.error(f"监控循环出错: {str(e)}")
-                time.sleep(10)  # 出错后等待10秒再继续
+            if self.push_detector:
+                self.sync_push_rooms()
+            
+            for listener in self.cycle_listeners:
+                listener()
+            logger.debug(f"等待 {interval} 秒后进行下次检查")
+        except Exception as e:
+            logger.error(f"监控循环出错: {str(e)}")
+            interval = 10  # 出错后等待10秒再继续
+        self.timers.schedule('cycle', interval, self._run_cycle)
+
+    def readiness(self) -> dict:
+        """获取看门狗就绪状态"""
+        return WATCHDOG.readiness()
+
+    def get_traces(self, limit: int = None) -> list:
+        """获取最近的检查周期追踪"""
+        return TRACER.recent(limit)
+
+    def startup_report(self) -> dict:
+        """获取启动各阶段耗时"""
+        return STARTUP.report()
+
+    def identity_stats(self) -> list:
+        """获取请求身份池状态"""
+        return self.identities.stats()
+
+    def transport_stats(self) -> dict:
+        """获取出站HTTP按主机的耗时统计"""
+        return TRANSPORT.stats()
+
+    def profile(self, seconds: float, interval: float = 0.01, thread_name: str = None) -> dict:
+        """对本进程进行一段时间的采样分析"""
+        from .profiler import sample_stacks
+        return sample_stacks(seconds, interval, thread_name)
 
     # 在 BilibiliMonitor 类中添加方法
     def update_monitor_list(self):
-        """更新监控列表"""
+        """更新监控列表（默认监控列表与所有租户订阅的并集，均未变化时跳过），移除的UP主同时清理其缓存"""
         try:
-            # 从数据库获取最新的监控列表
-            monitor_mids = json.loads(self.config_manager.get('monitor_mids', '[]'))
+            # 从数据库获取最新的监控列表和租户订阅版本
+            raw = self.config_manager.get('monitor_mids', '[]')
+            version = self.tenants.current_version()
+            if raw == self._monitor_mids_raw and version == self.tenants.version:
+                return
+            default_mids = json.loads(raw)
+            if version != self.tenants.version:
+                self.tenants.load(version)
+            default_keys = {str(mid) for mid in default_mids}
+            # 同一个UP主被多个租户订阅（或同时在默认列表中）只监控一次
+            monitor_mids = default_mids + [mid for mid in self.tenants.mids() if mid not in default_keys]
+            removed = {str(mid) for mid in self.monitor_mids} - {str(mid) for mid in monitor_mids}
             self.monitor_mids = monitor_mids
-            logger.info(f"监控列表已更新: {self.monitor_mids}")
+            self.default_mids = default_keys
+            self._monitor_mids_raw = raw
+            if removed:
+                self.evict(removed)
+            logger.info(f"监控列表已更新: {len(monitor_mids)} 个UP主，移除 {len(removed)} 个")
+            logger.opt(lazy=True).debug("监控列表: {}", lambda: self.monitor_mids)
         except Exception as e:
             logger.error(f"更新监控列表失败: {str(e)}")
 
+    def evict(self, mids) -> None:
+        """清理不再监控的UP主的状态缓存、截图时间、当前直播记录和采样分块"""
+        mids = [str(mid) for mid in mids]
+        removed = self.status_cache.evict(mids)
+        self.differ.forget(mids)
+        self.debouncer.forget(mids)
+        for mid in mids:
+            self._clear_screenshot_time(mid)
+            live_id = self.current_live_ids.pop(mid, None)
+            if live_id:
+                # 不再记录该场直播的采样，写入剩余样本并释放分块
+                self.samples.close(live_id)
+        logger.debug(f"已清理 {len(mids)} 个UP主的缓存（状态缓存 {removed} 条）")
+
@@ -0,0 +1,238 @@
+"""独立监控进程
+
+MONITOR_MODE=process 时，监控在独立进程中运行，API进程只做读取和转发：
+- 监控进程每轮检查后把状态发布到共享内存快照（见 snapshot.py）
+- API进程通过 MonitorClient 读取快照，命令（刷新列表、查询状态）经本地IPC发回监控进程
+
+启动方式: python run.py monitor
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from . import metrics
+from .snapshot import SnapshotReader, SnapshotWriter
+
+
+def get_snapshot_path() -> str:
+    """共享快照文件路径，优先使用内存文件系统"""
+    default_dir = '/dev/shm' if os.path.isdir('/dev/shm') else 'temp'
+    return os.getenv('MONITOR_SNAPSHOT_PATH', os.path.join(default_dir, 'bilibili_monitor.snapshot'))
+
+
+def get_ipc_address():
+    """命令通道地址：Unix套接字路径，或 host:port 形式的TCP地址"""
+    address = os.getenv('MONITOR_IPC_ADDRESS', os.path.join('temp', 'monitor.sock'))
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def get_ipc_authkey() -> bytes:
+    """命令通道认证密钥"""
+    return os.getenv('MONITOR_IPC_AUTHKEY', os.getenv('API_KEY', 'bilibili-monitor')).encode('utf-8')
+
+
+class MonitorService:
+    """监控进程内的服务：运行监控、发布快照、处理命令"""
+    def __init__(self, monitor):
+        """初始化监控服务
+
+        Args:
+            monitor: BilibiliMonitor 实例
+        """
+        self.monitor = monitor
+        self.writer = SnapshotWriter(get_snapshot_path())
+        self._publish_lock = threading.Lock()
+        self.monitor.cycle_listeners.append(self.publish)
+
+    def publish(self) -> None:
+        """发布当前状态快照"""
+        with self._publish_lock:
+            version = self.writer.publish({
+                'monitor_mids': list(self.monitor.monitor_mids),
+                'check_interval': self.monitor.check_interval,
+                # 监控线程可能同时在修改缓存，先复制成普通字典
+                'status_cache': self.monitor.status_cache.to_dict(),
+                'metrics': metrics.REGISTRY.render(),
+                'readiness': self.monitor.readiness(),
+                'updated_at': time.time(),
+                'pid': os.getpid()
+            })
+        logger.debug(f"状态快照已发布: v{version}")
+
+    def handle_command(self, command: str, args: tuple) -> Any:
+        """执行API进程发来的命令"""
+        if command == 'update_monitor_list':
+            self.monitor.update_monitor_list()
+            self.publish()
+            return None
+        if command == 'check_live_status':
+            return self.monitor.check_live_status(*args)
+        if command == 'get_traces':
+            return self.monitor.get_traces(*args)
+        if command == 'profile':
+            return self.monitor.profile(*args)
+        if command == 'startup_report':
+            return self.monitor.startup_report()
+        if command == 'identity_stats':
+            return self.monitor.identity_stats()
+        if command == 'transport_stats':
+            return self.monitor.transport_stats()
+        raise ValueError(f"未知命令: {command}")
+
+    def _serve_connection(self, conn) -> None:
+        """处理单个连接上的请求，直到对端关闭"""
+        with conn:
+            while True:
+                try:
+                    command, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send((True, self.handle_command(command, args)))
+                except Exception as e:
+                    logger.error(f"执行命令失败: {command} - {str(e)}")
+                    conn.send((False, str(e)))
+
+    def serve_commands(self) -> None:
+        """监听命令通道"""
+        address = get_ipc_address()
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)
+        with Listener(address, authkey=get_ipc_authkey()) as listener:
+            logger.info(f"命令通道已启动: {address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f"接受命令连接失败: {str(e)}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def run(self) -> None:
+        """启动命令通道并运行监控循环（阻塞）"""
+        self.publish()
+        threading.Thread(target=self.serve_commands, daemon=True).start()
+        self.monitor.run()
+
+
+class MonitorClient:
+    """API进程内的监控代理，接口与 BilibiliMonitor 中路由用到的部分一致"""
+    def __init__(self):
+        self.reader = SnapshotReader(get_snapshot_path())
+        self._local = threading.local()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return self.reader.read()[1] or {}
+
+    @property
+    def snapshot_version(self) -> int:
+        return self.reader.read()[0]
+
+    @property
+    def monitor_mids(self) -> List[str]:
+        return self._snapshot().get('monitor_mids', [])
+
+    @property
+    def check_interval(self) -> Optional[int]:
+        return self._snapshot().get('check_interval')
+
+    @property
+    def status_cache(self) -> Dict[str, Any]:
+        return self._snapshot().get('status_cache', {})
+
+    @property
+    def metrics_text(self) -> str:
+        return self._snapshot().get('metrics', '')
+
+    def readiness(self) -> Dict[str, Any]:
+        """根据快照判断监控进程是否就绪：快照过旧说明监控进程卡住或已退出"""
+        snapshot = self._snapshot()
+        state = dict(snapshot.get('readiness') or {'ready': False, 'reasons': ['尚未收到监控进程快照']})
+        if snapshot:
+            age = time.time() - snapshot.get('updated_at', 0)
+            limit = state.get('lag_limit', 0)
+            if limit and age > limit:
+                state['ready'] = False
+                state['reasons'] = state.get('reasons', []) + [f'快照已 {age:.0f} 秒未更新']
+        return state
+
+    def _call(self, command: str, *args) -> Any:
+        """通过命令通道调用监控进程，每个线程复用一条连接"""
+        conn = getattr(self._local, 'conn', None)
+        for attempt in range(2):
+            try:
+                if conn is None:
+                    conn = Client(get_ipc_address(), authkey=get_ipc_authkey())
+                    self._local.conn = conn
+                conn.send((command, args))
+                ok, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # 监控进程重启后旧连接失效，重连一次
+                conn = self._local.conn = None
+                if attempt == 1:
+                    raise
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def update_monitor_list(self) -> None:
+        self._call('update_monitor_list')
+
+    def check_live_status(self, mid: str) -> Optional[Dict[str, Any]]:
+        return self._call('check_live_status', mid)
+
+    def get_traces(self, limit: int = None) -> list:
+        return self._call('get_traces', limit)
+
+    def profile(self, seconds: float, interval: float = 0.01, thread_name: str = None) -> dict:
+        return self._call('profile', seconds, interval, thread_name)
+
+    def identity_stats(self) -> list:
+        return self._call('identity_stats')
+
+    def transport_stats(self) -> dict:
+        return self._call('transport_stats')
+
+    def startup_report(self) -> dict:
+        """API进程自身的启动耗时，附带监控进程的启动耗时"""
+        from .startup import STARTUP
+
+        report = STARTUP.report()
+        try:
+            report['monitor'] = self._call('startup_report')
+        except (OSError, EOFError, RuntimeError) as e:
+            report['monitor'] = {'error': str(e)}
+        return report
+
+
+def main() -> None:
+    """监控进程入口"""
+    from src.core.config import ConfigManager
+    from src.core.startup import STARTUP
+
+    with STARTUP.phase('import.monitor'):
+        from src.core.monitor import BilibiliMonitor
+        from src.utils.init_project import init_project
+    with STARTUP.phase('init_project'):
+        db_manager = init_project()
+    with STARTUP.phase('monitor'):
+        monitor = BilibiliMonitor(db_manager, ConfigManager(db_manager))
+        service = MonitorService(monitor)
+    STARTUP.mark_ready()
+    # 收到 SIGTERM 时正常退出，让 atexit 保存运行状态并释放分片租约
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    service.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""按需采样分析
+
+在指定时间窗口内定时抓取所有线程（或指定线程）的调用栈，按折叠栈格式
+（flamegraph.pl / speedscope 可直接读取）汇总采样次数。
+与 cProfile 不同，采样不需要在被分析的线程内开启，也不会拖慢被分析的代码。
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+_profile_lock = threading.Lock()
+
+
+def _collapse(frame) -> str:
+    """把调用栈折叠为 根;...;叶 形式的字符串"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def sample_stacks(duration: float, interval: float = 0.01,
+                  thread_name: Optional[str] = None) -> Dict[str, object]:
+    """采样调用栈
+
+    Args:
+        duration: 采样时长（秒）
+        interval: 采样间隔（秒）
+        thread_name: 只采样名称包含该字符串的线程，None 表示全部线程
+
+    Returns:
+        Dict[str, object]: 包含采样次数和折叠栈计数的结果
+
+    Raises:
+        RuntimeError: 已有采样正在进行
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("已有采样正在进行")
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident, str(ident))
+                if thread_name and thread_name not in name:
+                    continue
+                stacks[f"{name};{_collapse(frame)}"] += 1
+            samples += 1
+            time.sleep(interval)
+        return {
+            'duration': duration,
+            'interval': interval,
+            'samples': samples,
+            'stacks': dict(stacks.most_common()),
+        }
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(result: Dict[str, object]) -> str:
+    """转换为折叠栈文本（每行: 栈 次数）"""
+    return ''.join(f"{stack} {count}\n" for stack, count in result['stacks'].items())
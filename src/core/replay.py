@@ -0,0 +1,300 @@
+"""录制流量回放
+
+把 CAPTURE_PATH 录制的流量在虚拟时钟上重新喂给 BilibiliMonitor：
+- 上游请求按请求键依次返回录制的响应，并把虚拟时钟推进到录制时收到响应的时间
+- 启动校准、检查周期、复查和推送事件按录制时间触发，重试等待等只推进虚拟时钟，不实际等待
+- 截图不启动浏览器，按录制的结果模拟成功或失败
+回放结束后对比状态变化、通知、截图和（可选）数据库直播记录与原始运行的差异。
+
+用法: python run.py replay data/capture.jsonl.gz [--original-db data/database.db] [--tolerance 1]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from loguru import logger
+from requests.adapters import BaseAdapter
+
+from . import clock
+from .capture import MemoryRecorder, load_capture, notification_title, request_key
+
+# 回放时数据库直播记录参与对比的字段
+RECORD_FIELDS = ('mid', 'room_id', 'title', 'status', 'upstream_live_time')
+
+
+class ReplayAdapter(BaseAdapter):
+    """返回录制响应的传输适配器"""
+    def __init__(self, http_records: Iterable[Dict[str, Any]], virtual_clock: clock.VirtualClock):
+        super().__init__()
+        self.clock = virtual_clock
+        self.queues: Dict[str, deque] = {}
+        for record in http_records:
+            self.queues.setdefault(record['key'], deque()).append(record)
+        self.misses: List[str] = []
+        self.sent: List[Dict[str, Any]] = []
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        queue = self.queues.get(key)
+        if not queue:
+            self.misses.append(key)
+            raise requests.ConnectionError(f"回放中没有该请求的录制响应: {key}")
+        record = queue.popleft()
+        self.clock.set(record['t'])
+        if 'error' in record:
+            raise requests.ConnectionError(record['error'])
+        if request.url.endswith('.send'):
+            self.sent.append({'t': self.clock.now(), 'title': notification_title(request.body)})
+
+        response = requests.Response()
+        response.status_code = record['status']
+        response._content = record['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+    @property
+    def unused(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class _ReplayScreenshot:
+    """不启动浏览器的截图替身，按录制的结果返回成功或失败"""
+    def __init__(self, screenshots: Iterable[Dict[str, Any]]):
+        self.results: Dict[Any, deque] = {}
+        for record in screenshots:
+            self.results.setdefault(str(record['room_id']), deque()).append(record['success'])
+        self._count = 0
+
+    def capture(self, room_id, cookies=None, proxy=None):
+        results = self.results.get(str(room_id))
+        if not results or not results.popleft():
+            return None, False
+        # 截图文件在上传后会被删除，每次生成一个新的占位文件
+        self._count += 1
+        path = os.path.join('temp', f'replay_{room_id}_{self._count}.png')
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+        return path, True
+
+    def abort(self):
+        pass
+
+
+def _diff(original: List[Dict[str, Any]], replayed: List[Dict[str, Any]],
+          key: Callable[[Dict[str, Any]], Any], tolerance: float) -> Dict[str, Any]:
+    """按键和出现顺序配对两组事件，找出缺失、多出和时间偏移超出容差的事件"""
+    groups: Dict[Any, List[list]] = {}
+    for side, events in enumerate((original, replayed)):
+        for event in events:
+            groups.setdefault(key(event), [[], []])[side].append(event['t'])
+
+    missing, extra, shifted = [], [], []
+    for name, (before, after) in groups.items():
+        for t in before[len(after):]:
+            missing.append({'key': name, 't': t})
+        for t in after[len(before):]:
+            extra.append({'key': name, 't': t})
+        for t0, t1 in zip(before, after):
+            if abs(t1 - t0) > tolerance:
+                shifted.append({'key': name, 'original': t0, 'replay': t1, 'delta': round(t1 - t0, 3)})
+    return {
+        'original': len(original),
+        'replay': len(replayed),
+        'missing': missing,
+        'extra': extra,
+        'shifted': shifted,
+    }
+
+
+def _events(source: List[Dict[str, Any]], kind: str) -> List[Dict[str, Any]]:
+    return [record for record in source if record['type'] == kind]
+
+
+def _live_records(db_path: str, since: float, until: float) -> List[Dict[str, Any]]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            'SELECT * FROM live_records WHERE detected_at >= ? AND detected_at <= ? ORDER BY detected_at',
+            (since, until)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def replay(capture_path: str, original_db: Optional[str] = None, tolerance: float = 1.0) -> Dict[str, Any]:
+    """回放录制文件并与原始运行对比
+
+    Args:
+        capture_path: 录制文件路径
+        original_db: 原始运行的数据库文件，提供时对比直播记录
+        tolerance: 事件时间允许的偏差（秒）
+
+    Returns:
+        Dict[str, Any]: 回放耗时和各类差异
+    """
+    capture_path = os.path.abspath(capture_path)
+    original_db = os.path.abspath(original_db) if original_db else None
+    records = list(load_capture(capture_path))
+    meta = next((record for record in records if record['type'] == 'meta'), None)
+    if meta is None:
+        raise ValueError("录制文件中没有 meta 记录")
+    records = records[records.index(meta):]
+    drivers = [record for record in records if record['type'] in ('reconcile', 'cycle', 'push', 'recheck')]
+    if not drivers:
+        raise ValueError("录制文件中没有检查周期或推送事件")
+
+    # 回放使用独立的工作目录和数据库，不影响正在运行的实例
+    os.chdir(tempfile.mkdtemp(prefix='replay_'))
+    os.makedirs('data', exist_ok=True)
+    os.environ.update({
+        'CAPTURE_PATH': '',
+        'CLUSTER_MODE': 'false',
+        'PUSH_MODE': 'false',
+        'BATCH_SIZE': str(meta['batch_size']),
+        'SCREENSHOT_INTERVAL': str(meta['screenshot_interval']),
+    })
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from .database import DatabaseManager
+    from .monitor import BilibiliMonitor
+    from ..utils.uploader import UploadQueue
+
+    db = DatabaseManager(os.path.join('data', 'database.db'))
+    initial_mids = next((record['mids'] for record in drivers if 'mids' in record), list(meta['last_status']))
+    for key, value in {
+        'cloudflare_domain': 'replay.invalid',
+        'cloudflare_auth_code': 'replay',
+        'server_chan_key': 'replay',
+        'bilibili_cookies': 'replay=1',
+        'monitor_mids': json.dumps(initial_mids),
+        'check_interval': str(meta['check_interval']),
+    }.items():
+        db.set_config(key, value)
+    # 恢复录制开始时的状态，避免已在直播的UP主被当作新开播
+    for mid, status in meta['last_status'].items():
+        if status is not None:
+            db.set_config(f'last_status_{mid}', status)
+
+    virtual_clock = clock.VirtualClock(meta['t'])
+    previous_clock = clock.get_clock()
+    clock.set_clock(virtual_clock)
+    try:
+        monitor = BilibiliMonitor()
+        monitor.retry_delay = meta['retry_delay']
+        for key, value in (meta.get('debounce') or {}).items():
+            setattr(monitor.debouncer, key, value)
+        monitor.set_screenshot_times(meta['last_screenshot_times'])
+        monitor.screenshot = _ReplayScreenshot(_events(records, 'screenshot'))
+        monitor.recorder = MemoryRecorder()
+
+        adapter = ReplayAdapter((record for record in records if record['type'] == 'http'), virtual_clock)
+        for session in (*monitor.identities.sessions, monitor.notifier.session,
+                        monitor.notifier.notifier.session, monitor.uploader.uploader.session):
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        # 单个上传线程，截图地址按录制时的顺序写入
+        monitor._upload_queue = UploadQueue(monitor.uploader, workers=1)
+
+        wall_start = time.perf_counter()
+        for record in drivers:
+            virtual_clock.set(record['t'])
+            if record['type'] in ('reconcile', 'cycle') and 'mids' in record:
+                monitor.config_manager.set('monitor_mids', json.dumps(record['mids']))
+            if record['type'] == 'reconcile':
+                monitor.update_monitor_list()
+                monitor.reconcile()
+            elif record['type'] == 'cycle':
+                monitor.run_once()
+            elif record['type'] == 'recheck':
+                monitor.recheck_pending(record['mids'])
+            else:
+                monitor.room_to_mid[record['room_id']] = record['mid']
+                monitor.handle_push_status(record['room_id'], record['status'], record.get('detected_at'))
+            # 截图的图床复制在后台进行，推进虚拟时间前先等它完成
+            if monitor._upload_queue:
+                monitor._upload_queue.drain()
+        monitor.samples.flush_all()
+        wall_seconds = time.perf_counter() - wall_start
+    finally:
+        clock.set_clock(previous_clock)
+
+    virtual_seconds = records[-1]['t'] - meta['t']
+    original_sent = [record for record in records if record['type'] == 'http' and 'title' in record]
+    report = {
+        'virtual_seconds': round(virtual_seconds, 1),
+        'wall_seconds': round(wall_seconds, 2),
+        'speedup': round(virtual_seconds / wall_seconds, 1) if wall_seconds else None,
+        'reconciles': sum(1 for record in drivers if record['type'] == 'reconcile'),
+        'cycles': sum(1 for record in drivers if record['type'] == 'cycle'),
+        'pushes': sum(1 for record in drivers if record['type'] == 'push'),
+        'unmatched_requests': len(adapter.misses),
+        'unused_responses': adapter.unused,
+        'transitions': _diff(
+            _events(records, 'transition'), _events(monitor.recorder.records, 'transition'),
+            lambda event: f"{event['mid']}:{event['status']}", tolerance
+        ),
+        'notifications': _diff(original_sent, adapter.sent, lambda event: event['title'], tolerance),
+        'screenshots': _diff(
+            _events(records, 'screenshot'), _events(monitor.recorder.records, 'screenshot'),
+            lambda event: event['mid'], tolerance
+        ),
+    }
+
+    if original_db:
+        def as_events(rows):
+            return [{'t': row['detected_at'], **{field: row[field] for field in RECORD_FIELDS}} for row in rows]
+
+        until = records[-1]['t'] + tolerance
+        report['live_records'] = _diff(
+            as_events(_live_records(original_db, meta['t'], until)),
+            as_events(_live_records(os.path.join('data', 'database.db'), meta['t'], until)),
+            lambda event: tuple(str(event[field]) for field in RECORD_FIELDS), tolerance
+        )
+
+    report['identical'] = not report['unmatched_requests'] and all(
+        not (diff['missing'] or diff['extra'] or diff['shifted'])
+        for name, diff in report.items()
+        if name in ('transitions', 'notifications', 'screenshots', 'live_records')
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='run.py replay', description='回放录制的上游流量')
+    parser.add_argument('capture', help='录制文件路径（CAPTURE_PATH）')
+    parser.add_argument('--original-db', help='原始运行的数据库文件，用于对比直播记录')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='事件时间允许的偏差（秒）')
+    parser.add_argument('--output', help='对比结果保存路径（JSON）')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = replay(args.capture, args.original_db, args.tolerance)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    logger.info(
+        f"回放完成：虚拟时间 {report['virtual_seconds']} 秒，实际耗时 {report['wall_seconds']} 秒，"
+        f"{'与原始运行一致' if report['identical'] else '存在差异'}"
+    )
+    return 0 if report['identical'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""共享内存状态快照
+
+监控进程把状态写入内存映射文件，任意数量的API进程无锁读取：
+- 写入方使用顺序锁（seqlock）：写入前后各递增一次版本号，写入期间版本号为奇数
+- 读取方读到奇数版本或前后版本不一致时重试，不需要任何跨进程锁
+- 版本号未变化时直接返回上次解码的结果，不再读取和解析数据
+- 版本号变化时直接从映射内存解析（安装了 orjson 时不复制数据，否则先复制一份再解析），
+  解析完成后再校验版本号，期间被覆盖的结果丢弃重读
+"""
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+try:
+    # 可选：orjson 可以直接解析 memoryview，读取新快照时不复制数据
+    import orjson
+
+    def _decode(view: memoryview) -> Any:
+        return orjson.loads(view)
+except ImportError:
+    def _decode(view: memoryview) -> Any:
+        return json.loads(bytes(view))
+
+MAGIC = b'BLMSNAP1'
+# 魔数(8) + 版本号(8) + 数据长度(4) + 保留(4)
+HEADER = struct.Struct('<8sQI4x')
+DEFAULT_CAPACITY = 1 << 20  # 1MB
+
+
+class SnapshotWriter:
+    """快照写入方（仅限单个进程）"""
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        """初始化写入方
+
+        Args:
+            path: 映射文件路径，建议放在 /dev/shm 等内存文件系统上
+            capacity: 初始数据区容量（字节），不足时自动扩容
+        """
+        self.path = path
+        self.version = 0
+        self._map = None
+        self._create(capacity)
+
+    def _create(self, capacity: int) -> None:
+        """创建新的映射文件并原子替换旧文件，读取方通过 inode 变化感知"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(HEADER.size + capacity)
+        fd = os.open(tmp_path, os.O_RDWR)
+        try:
+            new_map = mmap.mmap(fd, HEADER.size + capacity)
+        finally:
+            os.close(fd)
+        # 新文件沿用当前版本号，保证读取方看到的版本单调递增
+        HEADER.pack_into(new_map, 0, MAGIC, self.version, 0)
+        os.replace(tmp_path, self.path)
+        if self._map is not None:
+            self._map.close()
+        self._map = new_map
+        self.capacity = capacity
+
+    def publish(self, data: Dict[str, Any]) -> int:
+        """发布新快照
+
+        Args:
+            data: 可JSON序列化的快照内容
+
+        Returns:
+            int: 新的版本号
+        """
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.capacity:
+            capacity = self.capacity
+            while capacity < len(payload):
+                capacity *= 2
+            logger.info(f"快照容量扩展至 {capacity} 字节")
+            self._create(capacity)
+
+        # 版本号为奇数表示正在写入
+        self.version += 1
+        HEADER.pack_into(self._map, 0, MAGIC, self.version, 0)
+        self._map[HEADER.size:HEADER.size + len(payload)] = payload
+        self.version += 1
+        HEADER.pack_into(self._map, 0, MAGIC, self.version, len(payload))
+        return self.version
+
+    def close(self) -> None:
+        """关闭映射"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class SnapshotReader:
+    """快照读取方（可在任意多个进程中使用）"""
+    def __init__(self, path: str, max_retries: int = 100):
+        """初始化读取方
+
+        Args:
+            path: 映射文件路径
+            max_retries: 遇到并发写入时的最大重试次数
+        """
+        self.path = path
+        self.max_retries = max_retries
+        self._map = None
+        self._inode = None
+        self._version = -1
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _remap(self) -> bool:
+        """文件被替换（扩容或写入方重启）时重新映射"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+        if inode == self._inode and self._map is not None:
+            return True
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size:
+                return False
+            new_map = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        if self._map is not None:
+            self._map.close()
+        self._map = new_map
+        self._inode = inode
+        # 新文件的版本号与旧文件无关，强制重新解码
+        self._version = -1
+        return True
+
+    def read(self) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """读取最新快照
+
+        Returns:
+            Tuple[int, Optional[Dict[str, Any]]]: (版本号, 快照内容)，尚无快照时内容为 None
+        """
+        if not self._remap():
+            return self._version, self._data
+
+        for _ in range(self.max_retries):
+            magic, version, length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                return self._version, self._data
+            if version == self._version:
+                return self._version, self._data
+            if version % 2 == 1:
+                time.sleep(0)
+                continue
+            view = memoryview(self._map)[HEADER.size:HEADER.size + length]
+            error = None
+            try:
+                data = _decode(view) if length else None
+            except ValueError as e:
+                # 可能是解析期间被写入方覆盖，先校验版本号再决定是否报错
+                data, error = None, e
+            finally:
+                view.release()
+            # 解析期间版本号未变化，说明数据完整
+            if HEADER.unpack_from(self._map, 0)[1] != version:
+                continue
+            if error is not None:
+                raise error
+            self._data = data
+            self._version = version
+            return self._version, self._data
+
+        logger.warning("读取状态快照重试次数过多，返回上一份快照")
+        return self._version, self._data
+
+    def close(self) -> None:
+        """关闭映射"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,72 @@
+"""启动耗时统计
+
+记录进程启动各阶段（导入、初始化数据库、创建监控等）以及按需加载的子系统
+（截图浏览器、图床上传）首次使用时的耗时，可通过 /debug/startup 查看。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from . import metrics
+
+STARTUP_SECONDS = metrics.REGISTRY.gauge('startup_phase_seconds', '启动各阶段耗时', ['phase'])
+
+
+def _process_start_time() -> Optional[float]:
+    """进程启动时间（Unix时间戳，仅Linux）"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+class StartupTimer:
+    """启动阶段计时器"""
+    def __init__(self):
+        self.process_started = _process_start_time()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个启动阶段的耗时"""
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.phases.append({'phase': name, 'start': wall, 'seconds': round(duration, 4)})
+            STARTUP_SECONDS.set(round(duration, 4), phase=name)
+            logger.debug(f"启动阶段 {name}: {duration * 1000:.1f}ms")
+
+    def mark_ready(self) -> None:
+        """应用可以开始处理请求"""
+        self.ready_at = time.time()
+        since = self.ready_at - self.process_started if self.process_started else None
+        summary = '，'.join(f"{item['phase']} {item['seconds'] * 1000:.0f}ms" for item in self.phases)
+        logger.info(f"启动完成{f'（进程启动后 {since:.2f} 秒）' if since is not None else ''}: {summary}")
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            'process_started': self.process_started,
+            'ready_at': self.ready_at,
+            'ready_after_seconds': round(self.ready_at - self.process_started, 3)
+            if self.ready_at and self.process_started else None,
+            'phases': phases,
+        }
+
+
+STARTUP = StartupTimer()
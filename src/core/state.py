@@ -0,0 +1,63 @@
+"""监控运行状态持久化
+
+定期（以及退出时）把状态缓存、上次截图时间和当前直播记录ID写入磁盘，
+重启后恢复，避免所有直播中的UP主在启动时立刻被重新截图。
+写入先落到临时文件再原子替换，进程在写入中途被杀也不会留下损坏的文件。
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from . import clock
+
+STATE_VERSION = 1
+
+
+class MonitorStateStore:
+    """监控状态文件"""
+    def __init__(self, path: Optional[str] = None, save_interval: Optional[float] = None):
+        """初始化状态文件
+
+        Args:
+            path: 文件路径，默认取 MONITOR_STATE_PATH 环境变量
+            save_interval: 定期保存的间隔（秒，由监控的计时轮触发），默认取 STATE_SAVE_INTERVAL 环境变量
+        """
+        self.path = path or os.getenv('MONITOR_STATE_PATH', os.path.join('data', 'monitor_state.json'))
+        self.save_interval = save_interval if save_interval is not None else float(
+            os.getenv('STATE_SAVE_INTERVAL', '60')
+        )
+        self.last_saved = 0.0
+        self._lock = threading.Lock()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """读取上次保存的状态，不存在或格式不对时返回 None"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取监控状态失败，忽略: {str(e)}")
+            return None
+        if state.get('version') != STATE_VERSION:
+            logger.warning(f"监控状态版本不匹配，忽略: {state.get('version')}")
+            return None
+        return state
+
+    def save(self, state: Dict[str, Any]) -> None:
+        """原子地写入状态"""
+        data = dict(state, version=STATE_VERSION, saved_at=clock.now())
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.last_saved = clock.now()
+            except OSError as e:
+                logger.error(f"保存监控状态失败: {str(e)}")
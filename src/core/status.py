@@ -0,0 +1,159 @@
+"""直播状态记录
+
+状态缓存中每个UP主一条 __slots__ 记录，轮询时原地更新而不是每轮新建字典；
+用户名和标题经过驻留（sys.intern），各轮之间相同的字符串共用同一个对象。
+批量接口的响应只取出用到的字段，其余字段随解析结果一起立即释放。
+记录支持字典式读取（record['name']、record.get('title')），原有调用方式不变。
+每条记录带一个内容摘要（状态、房间号、标题、封面、分区的哈希），
+差异检测（src.core.diff）只需比较摘要就能跳过没有变化的UP主。
+"""
+import json
+import sys
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    # 可选：安装了 orjson 时用它解析响应（比标准库快数倍）
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+FIELDS = ('status', 'room_id', 'title', 'name', 'online', 'live_time', 'cover', 'area', 'timestamp')
+_FIELD_SET = frozenset(FIELDS)
+
+
+def _intern(value) -> str:
+    return sys.intern(value) if isinstance(value, str) else ''
+
+
+class StatusRecord(Mapping):
+    """单个UP主的直播状态"""
+    __slots__ = FIELDS + ('digest',)
+
+    def __init__(self, status: int = 0, room_id: int = 0, title: str = '', name: str = '',
+                 online: int = 0, live_time: int = 0, cover: str = '', area: str = '',
+                 timestamp: float = 0.0):
+        self.set(status, room_id, title, name, online, live_time, cover, area, timestamp)
+
+    def set(self, status: int, room_id: int, title: str, name: str,
+            online: int, live_time: int, cover: str, area: str, timestamp: float) -> None:
+        """原地更新全部字段"""
+        self.status = status
+        self.room_id = room_id
+        self.title = _intern(title)
+        self.name = _intern(name)
+        self.online = online
+        self.live_time = live_time
+        self.cover = _intern(cover)
+        self.area = _intern(area)
+        self.timestamp = timestamp
+        # 在线人数、时间戳每轮都会变，不计入摘要
+        self.digest = hash((status, room_id, self.title, self.cover, self.area))
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> 'StatusRecord':
+        return cls(**{field: data[field] for field in FIELDS if data.get(field) is not None})
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __repr__(self) -> str:
+        return f'StatusRecord({self.to_dict()})'
+
+
+class StatusCache(MutableMapping):
+    """mid -> StatusRecord 的状态缓存"""
+    def __init__(self):
+        self._records: Dict[str, StatusRecord] = {}
+
+    def put(self, mid: str, status: int, room_id: int, title: str, name: str,
+            online: int, live_time: int, cover: str, area: str, timestamp: float) -> StatusRecord:
+        """写入状态，已有记录时原地更新并返回该记录"""
+        record = self._records.get(mid)
+        if record is None:
+            record = self._records[sys.intern(str(mid))] = StatusRecord(
+                status, room_id, title, name, online, live_time, cover, area, timestamp
+            )
+        else:
+            record.set(status, room_id, title, name, online, live_time, cover, area, timestamp)
+        return record
+
+    def __getitem__(self, mid: str) -> StatusRecord:
+        return self._records[mid]
+
+    def __setitem__(self, mid: str, value: Mapping) -> None:
+        record = value if isinstance(value, StatusRecord) else StatusRecord.from_mapping(value)
+        self._records[sys.intern(str(mid))] = record
+
+    def __delitem__(self, mid: str) -> None:
+        del self._records[mid]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, mid) -> bool:
+        return mid in self._records
+
+    def evict(self, mids: Iterable[str]) -> int:
+        """移除不再监控的UP主
+
+        Returns:
+            int: 移除的条目数
+        """
+        removed = 0
+        for mid in mids:
+            if self._records.pop(mid, None) is not None:
+                removed += 1
+        return removed
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """转换为可 JSON 序列化的字典（用于状态文件和进程间快照）"""
+        return {mid: record.to_dict() for mid, record in list(self._records.items())}
+
+
+def decode_status_batch(content: bytes) -> Tuple[Optional[int], Optional[Dict[str, tuple]], Any]:
+    """解析批量状态接口的响应，只保留用到的字段
+
+    Args:
+        content: 响应体
+
+    Returns:
+        Tuple: (code, {uid: (status, room_id, title, name, online, live_time, cover, area)}, 原始数据)
+               code 为 0 时原始数据为 None（不再保留），否则用于日志
+    """
+    data = _loads(content)
+    code = data.get('code')
+    items = data.get('data')
+    if code == 0 and items == []:
+        # 列表中的UP主都没有直播间时接口返回空列表
+        items = {}
+    if code != 0 or not isinstance(items, dict):
+        return code, None, data
+    return code, {
+        uid: (
+            item.get('live_status', 0),
+            item.get('room_id', 0),
+            item.get('title', ''),
+            item.get('uname', ''),
+            item.get('online', 0),
+            item.get('live_time', 0),
+            item.get('cover_from_user', ''),
+            item.get('area_v2_name', ''),
+        )
+        for uid, item in items.items()
+    }, None
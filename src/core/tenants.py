@@ -0,0 +1,73 @@
+"""多租户订阅
+
+多个团队共用一个监控实例，每个租户有自己的订阅列表和通知渠道（Server酱密钥）。
+监控轮询的是所有租户订阅与默认监控列表（配置项 monitor_mids）的并集，
+同一个UP主无论被多少租户订阅都只查询、截图一次，状态变化按订阅关系分发给各租户的渠道。
+上游请求量只与去重后的UP主数量有关。
+
+租户和订阅存放在数据库中，每次变更递增配置项 tenants_version，
+监控每轮只比较版本号，变化时才重新加载。
+"""
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from ..utils.notifier import ServerChanNotifier
+
+VERSION_KEY = 'tenants_version'
+
+
+class TenantRegistry:
+    """租户、订阅关系和各租户通知渠道的内存视图"""
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.version: Optional[str] = None
+        self.tenants: Dict[str, Dict[str, Any]] = {}
+        # mid -> 订阅的租户ID（按订阅先后）
+        self._subscribers: Dict[str, List[str]] = {}
+        # Server酱密钥 -> 通知器，重新加载时复用
+        self._channels: Dict[str, ServerChanNotifier] = {}
+
+    def current_version(self) -> Optional[str]:
+        return self.db_manager.get_config(VERSION_KEY)
+
+    def load(self, version: Optional[str] = None) -> None:
+        """从数据库重新加载租户和订阅"""
+        self.tenants = {tenant['id']: tenant for tenant in self.db_manager.get_tenants()}
+        subscribers: Dict[str, List[str]] = {}
+        for tenant_id, mid in self.db_manager.get_tenant_subscriptions():
+            subscribers.setdefault(mid, []).append(tenant_id)
+        self._subscribers = subscribers
+        keys = {tenant['server_chan_key'] for tenant in self.tenants.values() if tenant['server_chan_key']}
+        self._channels = {
+            key: self._channels.get(key) or ServerChanNotifier(key) for key in keys
+        }
+        self.version = version
+        logger.debug(f"已加载 {len(self.tenants)} 个租户，订阅 {len(subscribers)} 个UP主")
+
+    def mids(self) -> List[str]:
+        """所有租户订阅的UP主（去重）"""
+        return list(self._subscribers)
+
+    def subscribers(self, mid: str) -> List[str]:
+        """订阅了该UP主的租户"""
+        return self._subscribers.get(str(mid), [])
+
+    def channels(self, mid: str, option: Optional[str] = None) -> List[ServerChanNotifier]:
+        """该UP主的状态变化需要发往的租户通知渠道
+
+        Args:
+            mid: UP主ID
+            option: 租户的通知开关字段（如 notify_title_change），为真的租户才会收到
+        """
+        channels = []
+        for tenant_id in self._subscribers.get(str(mid), ()):
+            tenant = self.tenants.get(tenant_id)
+            if not tenant or not tenant['server_chan_key']:
+                continue
+            if option and not tenant.get(option):
+                continue
+            channel = self._channels[tenant['server_chan_key']]
+            if channel not in channels:
+                channels.append(channel)
+        return channels
@@ -0,0 +1,140 @@
+"""定时任务（哈希计时轮）
+
+监控的定时工作（截图间隔、待确认状态复查、下一轮检查、出错重试、状态保存、数据库维护）
+都登记在同一个计时轮上：
+- 按到期时间散列到固定数量的槽位，登记和取消都是 O(1)
+- 每次推进只访问经过的槽位，每轮的开销与到期（及同槽位）的任务数成正比，与任务总数无关
+- 任务按键登记，同一个键再次登记时替换原任务，便于随时调整截止时间
+- 使用单调时间（src.core.clock.monotonic），回放时随虚拟时钟推进
+
+到期的回调在调用 advance 的线程中按到期时间顺序执行，回调的异常只记录日志。
+监控中只有监控循环线程调用 advance，推送处理等其他线程只登记、取消和查询任务。
+"""
+import itertools
+import math
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from loguru import logger
+
+from . import clock
+
+
+class Timer:
+    """一个登记在计时轮上的任务"""
+    __slots__ = ('key', 'deadline', 'seq', 'callback', 'args', 'slot')
+
+    def __init__(self, key: Hashable, deadline: float, seq: int, callback: Callable, args: tuple, slot: int):
+        self.key = key
+        self.deadline = deadline
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.slot = slot
+
+
+class TimingWheel:
+    """哈希计时轮"""
+    def __init__(self, tick: float = 1.0, slots: int = 512, clock_source=None):
+        """初始化计时轮
+
+        Args:
+            tick: 每个槽位的时间跨度（秒），也是 run 循环的推进间隔
+            slots: 槽位数，超过 tick * slots 的任务留在槽位中等下一圈
+            clock_source: 提供 monotonic() 的时钟，默认使用 src.core.clock 的全局时钟
+        """
+        self.tick = tick
+        self._clock = clock_source
+        self._slots: List[Dict[Hashable, Timer]] = [{} for _ in range(slots)]
+        self._timers: Dict[Hashable, Timer] = {}
+        self._seq = itertools.count()
+        # 下次推进从这个刻度开始（当前刻度的槽位每次都要重新检查）
+        self._cursor = self._tick_of(self.now())
+        self._lock = threading.RLock()
+
+    def now(self) -> float:
+        return self._clock.monotonic() if self._clock else clock.monotonic()
+
+    def _tick_of(self, deadline: float) -> int:
+        return math.floor(deadline / self.tick)
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable, *args: Any) -> Timer:
+        """登记任务（同一个键已登记时替换）
+
+        Args:
+            key: 任务键
+            delay: 多少秒后到期（不大于 0 时下次推进即执行）
+            callback: 到期时调用 callback(*args)
+        """
+        with self._lock:
+            self._remove(key)
+            deadline = self.now() + max(delay, 0)
+            # 已经过去的刻度不会再访问，放到下次推进的第一个槽位
+            slot = max(self._tick_of(deadline), self._cursor) % len(self._slots)
+            timer = Timer(key, deadline, next(self._seq), callback, args, slot)
+            self._slots[slot][key] = timer
+            self._timers[key] = timer
+            return timer
+
+    def every(self, key: Hashable, interval: float, callback: Callable, *args: Any) -> Timer:
+        """登记周期任务，每次执行前登记下一次（执行出错也不会中断），取消键即停止"""
+        def repeat():
+            self.schedule(key, interval, repeat)
+            callback(*args)
+        return self.schedule(key, interval, repeat)
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消任务，任务不存在时返回 False"""
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key: Hashable) -> bool:
+        """（调用方持有锁）"""
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        del self._slots[timer.slot][key]
+        return True
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """任务还有多少秒到期，未登记时返回 None"""
+        timer = self._timers.get(key)
+        return None if timer is None else timer.deadline - self.now()
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """执行到期的任务
+
+        Args:
+            now: 推进到的单调时间，默认当前时间
+
+        Returns:
+            int: 执行的任务数
+        """
+        with self._lock:
+            now = self.now() if now is None else now
+            target = self._tick_of(now)
+            due = []
+            if target >= self._cursor:
+                # 间隔超过一圈时每个槽位只需访问一次
+                for tick in range(self._cursor, min(target, self._cursor + len(self._slots) - 1) + 1):
+                    slot = self._slots[tick % len(self._slots)]
+                    if slot:
+                        expired = [timer for timer in slot.values() if timer.deadline <= now]
+                        for timer in expired:
+                            del slot[timer.key]
+                            del self._timers[timer.key]
+                        due.extend(expired)
+                self._cursor = target
+        due.sort(key=lambda timer: (timer.deadline, timer.seq))
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error(f"定时任务 {timer.key} 执行失败: {str(e)}")
+        return len(due)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def __len__(self) -> int:
+        return len(self._timers)
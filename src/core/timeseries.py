@@ -0,0 +1,159 @@
+"""直播采样时间序列存储
+
+每次轮询得到的在线人数等数据按直播场次采样，不逐条落库：
+- 同一场直播的样本按固定大小分块，每块一行
+- 时间戳和数值分别做差分后以 int32 数组存储，再经 zlib 压缩写入 BLOB
+- 读取时用 NumPy 解压、累加还原，并支持降采样以便绘图
+"""
+import os
+import sys
+import threading
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+SAMPLE_FIELDS = ('online',)
+
+
+def encode_deltas(values, base: int = 0) -> bytes:
+    """差分编码整数序列
+
+    Args:
+        values: 整数序列
+        base: 基准值，首项保存为与基准值的差
+    """
+    deltas = array('i', [0] * len(values))
+    previous = base
+    for i, value in enumerate(values):
+        deltas[i] = value - previous
+        previous = value
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes())
+
+
+def decode_deltas(blob: bytes, base: int = 0):
+    """解码差分序列（NumPy 向量化）"""
+    import numpy as np
+
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype='<i4'), dtype=np.int64) + base
+
+
+class _Chunk:
+    """一场直播正在写入的分块"""
+    __slots__ = ('start', 'timestamps', 'values', 'dirty')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.timestamps = array('q')
+        self.values = {field: array('q') for field in SAMPLE_FIELDS}
+        self.dirty = 0
+
+
+class TimeSeriesRecorder:
+    """直播采样记录器"""
+    def __init__(self, db_manager):
+        """初始化记录器
+
+        Args:
+            db_manager: 数据库管理器
+        """
+        self.db = db_manager
+        self.chunk_size = int(os.getenv('SAMPLE_CHUNK_SIZE', '240'))
+        # 未满的分块每积累若干个样本就覆盖写入一次，减少进程退出时的数据丢失
+        self.flush_every = int(os.getenv('SAMPLE_FLUSH_EVERY', '10'))
+        self._chunks: Dict[int, _Chunk] = {}
+        self._lock = threading.Lock()
+
+    def record(self, live_id: int, timestamp: int, **values: int) -> None:
+        """记录一个样本
+
+        Args:
+            live_id: 直播记录ID
+            timestamp: 采样时间（秒）
+            **values: 各字段的采样值，例如 online=1234
+        """
+        with self._lock:
+            chunk = self._chunks.get(live_id)
+            if chunk is None:
+                chunk = self._chunks[live_id] = _Chunk(int(timestamp))
+            chunk.timestamps.append(int(timestamp))
+            for field in SAMPLE_FIELDS:
+                chunk.values[field].append(int(values.get(field) or 0))
+            chunk.dirty += 1
+
+            if len(chunk.timestamps) >= self.chunk_size:
+                self._write(live_id, chunk)
+                del self._chunks[live_id]
+            elif chunk.dirty >= self.flush_every:
+                self._write(live_id, chunk)
+
+    def close(self, live_id: int) -> None:
+        """直播结束时写入剩余样本"""
+        with self._lock:
+            chunk = self._chunks.pop(live_id, None)
+            if chunk and chunk.dirty:
+                self._write(live_id, chunk)
+
+    def flush_all(self) -> None:
+        """写入全部未保存的样本（监控保存运行状态和退出时调用）"""
+        with self._lock:
+            for live_id, chunk in self._chunks.items():
+                if chunk.dirty:
+                    self._write(live_id, chunk)
+
+    def _write(self, live_id: int, chunk: _Chunk) -> None:
+        try:
+            self.db.save_sample_chunk(
+                live_id,
+                chunk.start,
+                len(chunk.timestamps),
+                # 时间戳以分块起始时间为基准，避免绝对时间超出 int32 范围
+                encode_deltas(chunk.timestamps, chunk.start),
+                encode_deltas(chunk.values['online'])
+            )
+            chunk.dirty = 0
+        except Exception as e:
+            logger.error(f"写入采样数据失败: {str(e)}")
+
+
+def load_samples(db_manager, live_id: int, max_points: Optional[int] = None) -> Dict[str, List[int]]:
+    """读取一场直播的采样序列
+
+    Args:
+        db_manager: 数据库管理器
+        live_id: 直播记录ID
+        max_points: 最大点数，超过时按等宽分桶取平均降采样
+
+    Returns:
+        Dict[str, List[int]]: {'time': [...], 'online': [...]}
+    """
+    import numpy as np
+
+    chunks = db_manager.get_sample_chunks(live_id)
+    if not chunks:
+        return {'time': [], **{field: [] for field in SAMPLE_FIELDS}}
+
+    timestamps = np.concatenate([decode_deltas(chunk['ts_blob'], chunk['chunk_start']) for chunk in chunks])
+    series = {
+        'online': np.concatenate([decode_deltas(chunk['online_blob']) for chunk in chunks])
+    }
+
+    if max_points and len(timestamps) > max_points:
+        bucket = -(-len(timestamps) // max_points)
+        usable = len(timestamps) // bucket * bucket
+        # 尾部不足一个桶的样本单独成桶
+        tail = len(timestamps) - usable
+        ts_parts = [timestamps[:usable].reshape(-1, bucket)[:, 0]]
+        if tail:
+            ts_parts.append(timestamps[usable:usable + 1])
+        timestamps = np.concatenate(ts_parts)
+        for field, values in series.items():
+            parts = [values[:usable].reshape(-1, bucket).mean(axis=1).round().astype(np.int64)]
+            if tail:
+                parts.append(np.array([round(values[usable:].mean())], dtype=np.int64))
+            series[field] = np.concatenate(parts)
+
+    return {'time': timestamps.tolist(), **{field: values.tolist() for field, values in series.items()}}
@@ -0,0 +1,119 @@
+"""轻量级链路追踪
+
+每轮检查（以及每次推送处理）是一棵 span 树，结束后放入固定长度的环形缓冲区，
+可通过 /debug/traces 查看最近若干轮各阶段的耗时。
+没有处于活动状态的追踪时，span() 不做任何记录，开销只有一次线程局部变量读取。
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# 单个 span 最多记录的子 span 数量，超出部分只计数
+MAX_CHILDREN = 200
+
+
+class Span:
+    """一个计时区间"""
+    __slots__ = ('name', 'attrs', 'start', 'wall_start', 'duration', 'children', 'dropped', 'error')
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+        self.children: List['Span'] = []
+        self.dropped = 0
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'name': self.name,
+            'start': self.wall_start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['children'] = [child.to_dict() for child in self.children]
+        if self.dropped:
+            data['dropped_children'] = self.dropped
+        return data
+
+
+class Tracer:
+    """追踪器"""
+    def __init__(self, capacity: int = None):
+        """初始化追踪器
+
+        Args:
+            capacity: 保留的追踪数量，默认取 TRACE_CAPACITY 环境变量
+        """
+        self.traces = deque(maxlen=capacity or int(os.getenv('TRACE_CAPACITY', '50')))
+        self._local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """开始一棵新的追踪树（已有活动追踪时等同于 span）"""
+        stack = self._stack()
+        if stack:
+            with self.span(name, **attrs) as span:
+                yield span
+            return
+
+        root = Span(name, attrs)
+        stack.append(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            root.duration = time.perf_counter() - root.start
+            stack.pop()
+            self.traces.append(root)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """在当前追踪中记录一个子区间"""
+        stack = getattr(self._local, 'stack', None)
+        if not stack:
+            yield None
+            return
+
+        parent = stack[-1]
+        span = Span(name, attrs)
+        if len(parent.children) < MAX_CHILDREN:
+            parent.children.append(span)
+        else:
+            parent.dropped += 1
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取最近的追踪（最新的在前）"""
+        traces = list(self.traces)[::-1]
+        if limit:
+            traces = traces[:limit]
+        return [trace.to_dict() for trace in traces]
+
+
+TRACER = Tracer()
@@ -0,0 +1,336 @@
+"""出站HTTP传输层
+
+所有对外请求（B站接口、Server酱、图床）共用同一个调优过的适配器：
+- 按主机划分的长连接池，大小随配置的并发数（身份池大小）调整
+- 建连失败自动重试（请求尚未发出，POST 也不会重复）
+- 带 TTL 的 DNS 缓存，新建连接不再每次解析域名；连接失败时丢弃缓存重新解析
+- 安装了 brotli 时接受 br 压缩
+- 启动时预先建立到各上游的连接（TLS 握手不计入第一轮检查）
+- 按主机统计请求耗时和错误（http_request_seconds / http_errors_total）
+- 可中断的请求范围：看门狗判定阶段超时后，只断开该阶段正在使用的连接
+
+requests 不支持 HTTP/2，这里用保持长连接的 HTTP/1.1 连接池代替多路复用；
+流量录制和回放都基于 requests 适配器，继续沿用 requests。
+"""
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+try:
+    import brotli  # noqa: F401  urllib3 检测到 brotli 后自动解码 br 响应
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# 长连接保活：空闲60秒后开始探测，避免NAT/负载均衡静默断开连接
+KEEPALIVE_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    KEEPALIVE_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4),
+    ]
+
+
+class DNSCache:
+    """带 TTL 的域名解析缓存"""
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str) -> str:
+        """解析域名，返回缓存的地址（IP地址原样返回）"""
+        if not self.ttl:
+            return host
+        now = time.monotonic()
+        entry = self._entries.get(host)
+        if entry and entry[1] > now:
+            return entry[0]
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in host else socket.AF_INET, host)
+            return host
+        except OSError:
+            pass
+        address = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)[0][4][0]
+        with self._lock:
+            self._entries[host] = (address, now + self.ttl)
+        return address
+
+    def invalidate(self, host: str) -> None:
+        with self._lock:
+            self._entries.pop(host, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+DNS_CACHE = DNSCache(float(os.getenv('DNS_CACHE_TTL', '300')))
+
+
+class _CachedDNSMixin:
+    """新建连接时使用 DNS 缓存中的地址
+
+    只在建立 socket 时替换解析用的主机名，TLS 的 SNI 和证书校验仍使用原域名。
+    """
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            self._dns_host = DNS_CACHE.resolve(host)
+        except socket.gaierror:
+            # 交给 urllib3 按原逻辑解析并抛出 NameResolutionError
+            return super()._new_conn()
+        try:
+            return super()._new_conn()
+        except OSError:
+            DNS_CACHE.invalidate(host)
+            raise
+        finally:
+            self._dns_host = host
+
+
+class RequestScope:
+    """可中断的请求范围
+
+    记录范围内当前线程正在使用的连接。abort() 只断开这些连接的 socket，
+    阻塞中的读写立即出错返回；共享连接池里的其他连接不受影响。
+    中断后范围内再发出的请求直接失败，不会继续重试。
+    """
+    def __init__(self):
+        self.aborted = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def attach(self, conn) -> None:
+        with self._lock:
+            if self.aborted:
+                raise ConnectionAbortedError('请求已被中断')
+            self._connections.add(conn)
+            conn._request_scope = self
+
+    def detach(self, conn) -> None:
+        with self._lock:
+            self._connections.discard(conn)
+            if getattr(conn, '_request_scope', None) is self:
+                conn._request_scope = None
+
+    def abort(self) -> int:
+        """断开范围内正在使用的连接
+
+        Returns:
+            int: 断开的连接数
+        """
+        with self._lock:
+            self.aborted = True
+            connections = list(self._connections)
+            self._connections.clear()
+        aborted = 0
+        for conn in connections:
+            sock = getattr(conn, 'sock', None)
+            if sock is None:
+                continue
+            try:
+                # 直接关闭底层 TCP 连接：SSLSocket.shutdown 会在其他线程读写时拆除 TLS 状态
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+                aborted += 1
+            except OSError:
+                pass
+        logger.warning(f"已中断 {aborted} 个请求连接")
+        return aborted
+
+
+_LOCAL = threading.local()
+
+
+class _AbortableMixin:
+    """发送请求时把连接登记到当前线程的请求范围"""
+    def request(self, *args, **kwargs):
+        scope = getattr(_LOCAL, 'scope', None)
+        if scope is not None:
+            scope.attach(self)
+        return super().request(*args, **kwargs)
+
+
+class _ScopedPoolMixin:
+    """连接归还连接池时离开请求范围，之后不会被中断"""
+    def _put_conn(self, conn):
+        scope = getattr(conn, '_request_scope', None)
+        if scope is not None:
+            scope.detach(conn)
+        super()._put_conn(conn)
+
+
+class _HTTPConnection(_AbortableMixin, _CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_AbortableMixin, _CachedDNSMixin, HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(_ScopedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(_ScopedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+POOL_CLASSES = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """调优过的 requests 适配器（连接池、建连重试、DNS缓存、按主机统计）"""
+    def __init__(self, pool_size: Optional[int] = None):
+        pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '10'))
+        # 只重试建连失败：此时请求还没发出，重试不会导致重复发送
+        retries = Retry(total=2, connect=2, read=0, status=0, other=0, redirect=5,
+                        backoff_factor=0.1, raise_on_status=False)
+        super().__init__(pool_connections=16, pool_maxsize=pool_size, max_retries=retries)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('socket_options', KEEPALIVE_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault('socket_options', KEEPALIVE_OPTIONS)
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = POOL_CLASSES
+        return manager
+
+    def set_pool_size(self, size: int) -> None:
+        """调整之后新建的主机连接池大小"""
+        self._pool_maxsize = size
+        self.poolmanager.connection_pool_kw['maxsize'] = size
+        for manager in self.proxy_manager.values():
+            manager.connection_pool_kw['maxsize'] = size
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).netloc
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as e:
+            metrics.HTTP_ERRORS.inc(host=host, error=type(e).__name__)
+            raise
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, host=host)
+        return response
+
+
+class _SharedSession(requests.Session):
+    """挂载共享适配器的会话
+
+    close() 不关闭共享适配器：关闭它会清空所有主机的连接池，影响其他会话。
+    """
+    def __init__(self, shared: HTTPAdapter):
+        super().__init__()
+        self._shared = shared
+
+    def close(self) -> None:
+        for adapter in self.adapters.values():
+            if adapter is not self._shared:
+                adapter.close()
+
+
+class Transport:
+    """进程内共享的出站传输"""
+    def __init__(self):
+        self.adapter = TunedHTTPAdapter()
+        self.pool_size = self.adapter._pool_maxsize
+
+    def session(self, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+        """创建使用共享连接池的会话（cookie、代理等会话级设置互不影响）"""
+        session = _SharedSession(self.adapter)
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        if headers:
+            session.headers.update(headers)
+        session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        return session
+
+    @contextmanager
+    def abortable(self):
+        """当前线程的可中断请求范围，scope.abort 可作为看门狗阶段的终止回调"""
+        previous = getattr(_LOCAL, 'scope', None)
+        scope = RequestScope()
+        _LOCAL.scope = scope
+        try:
+            yield scope
+        finally:
+            _LOCAL.scope = previous
+
+    def ensure_pool_size(self, concurrency: int) -> None:
+        """保证每个主机的连接池至少能容纳 concurrency 个并发请求"""
+        if concurrency > self.pool_size:
+            self.pool_size = concurrency
+            self.adapter.set_pool_size(concurrency)
+            logger.debug(f"HTTP连接池大小调整为 {concurrency}")
+
+    def prewarm(self, urls: Iterable[str], proxies: Iterable[str] = (), timeout: float = 5) -> None:
+        """在后台预先建立到各上游的连接（发送 HEAD 请求，响应内容不关心）"""
+        urls = [url for url in urls if url]
+        routes = [None] + [proxy for proxy in proxies if proxy]
+
+        def warm():
+            for proxy in routes:
+                for url in urls:
+                    start = time.perf_counter()
+                    try:
+                        self._pool_for(url, proxy).urlopen(
+                            'HEAD', url, retries=False, timeout=timeout, redirect=False,
+                            headers={'Accept-Encoding': ACCEPT_ENCODING}
+                        ).release_conn()
+                        logger.debug(f"预连接 {url}: {(time.perf_counter() - start) * 1000:.0f}ms")
+                    except Exception as e:
+                        logger.debug(f"预连接 {url} 失败: {str(e)}")
+
+        threading.Thread(target=warm, name='http-prewarm', daemon=True).start()
+
+    def _pool_for(self, url: str, proxy: Optional[str] = None):
+        """取 requests 发送该地址时会使用的连接池（连接池按 TLS 配置区分，需与 requests 一致）"""
+        # 与会话发送请求时一样合并环境变量（REQUESTS_CA_BUNDLE、HTTP(S)_PROXY 等）
+        settings = requests.Session().merge_environment_settings(
+            url, {'http': proxy, 'https': proxy} if proxy else {}, None, None, None
+        )
+        request = requests.Request('HEAD', url).prepare()
+        if hasattr(self.adapter, 'get_connection_with_tls_context'):
+            return self.adapter.get_connection_with_tls_context(request, settings['verify'], settings['proxies'])
+        return self.adapter.get_connection(url, settings['proxies'])
+
+    def stats(self) -> Dict[str, Any]:
+        """按主机汇总的请求数、平均耗时、P95 和错误数"""
+        hosts: Dict[str, Dict[str, Any]] = {}
+        p95 = metrics.HTTP_REQUEST_SECONDS.quantiles(0.95)
+        for (host,), (count, total) in metrics.HTTP_REQUEST_SECONDS.totals().items():
+            hosts[host] = {
+                'requests': count,
+                'avg_ms': round(total / count * 1000, 1) if count else None,
+                'p95_ms': round(p95[(host,)] * 1000, 1) if p95.get((host,)) is not None else None,
+                'errors': {},
+            }
+        for (host, error), count in metrics.HTTP_ERRORS.values().items():
+            entry = hosts.setdefault(host, {'requests': 0, 'avg_ms': None, 'p95_ms': None, 'errors': {}})
+            entry['errors'][error] = count
+        return {'pool_size': self.pool_size, 'dns_cache': len(DNS_CACHE), 'hosts': hosts}
+
+
+TRANSPORT = Transport()
+
+
+def create_session(headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """创建使用共享传输的会话"""
+    return TRANSPORT.session(headers)
@@ -0,0 +1,151 @@
+"""监控看门狗
+
+- 监控循环每轮结束调用 beat()，看门狗根据配置的检查间隔计算延迟
+- 可能卡住的阶段（浏览器截图、图片上传、通知发送）用 stage() 包裹，
+  超过时限后调用该阶段注册的终止回调（杀掉 ChromeDriver 进程、断开正在使用的连接）；
+  终止回调必须能让阻塞中的调用立即返回，关闭 requests 会话不会中断进行中的请求。
+  没有终止回调的阶段只能等待其自身超时，或在持续未就绪后由看门狗退出进程
+- readiness() 在检测落后或监控线程退出时返回未就绪，/ready 据此返回 503
+- 长时间未就绪时主动退出进程，交给 Docker 的 restart 策略重启
+"""
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from . import metrics
+
+STALLS = metrics.REGISTRY.counter('watchdog_stalls_total', '阶段超时次数', ['stage'])
+LAG = metrics.REGISTRY.gauge('monitor_cycle_lag_seconds', '距离上次完成检查的时间')
+
+
+class _Stage:
+    __slots__ = ('name', 'started', 'timeout', 'on_stall', 'thread', 'stalled')
+
+    def __init__(self, name: str, timeout: float, on_stall: Optional[Callable[[], None]]):
+        self.name = name
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.on_stall = on_stall
+        self.thread = threading.current_thread().name
+        self.stalled = False
+
+
+class Watchdog:
+    """看门狗"""
+    def __init__(self):
+        self.check_period = float(os.getenv('WATCHDOG_CHECK_PERIOD', '5'))
+        # 允许的延迟 = 检查间隔 × 倍数 + 宽限时间
+        self.lag_factor = float(os.getenv('WATCHDOG_LAG_FACTOR', '3'))
+        self.lag_grace = float(os.getenv('WATCHDOG_LAG_GRACE', '120'))
+        # 连续未就绪超过该时间后退出进程，0 表示不退出
+        self.exit_after = float(os.getenv('WATCHDOG_EXIT_AFTER', '900'))
+        self.interval = 60.0
+        self.last_beat: Optional[float] = None
+        self.started_at = time.monotonic()
+        self.unready_since: Optional[float] = None
+        self.monitor_thread: Optional[threading.Thread] = None
+        self._stages: Dict[int, _Stage] = {}
+        self._ids = itertools.count()
+        self._thread = None
+
+    def beat(self) -> None:
+        """监控循环完成一轮"""
+        self.last_beat = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str, timeout: float, on_stall: Optional[Callable[[], None]] = None):
+        """登记一个可能卡住的阶段
+
+        Args:
+            name: 阶段名称（browser / upload / notify 等）
+            timeout: 超时时间（秒）
+            on_stall: 超时后调用的终止回调，需要真正中断阻塞中的调用
+        """
+        token = next(self._ids)
+        self._stages[token] = _Stage(name, timeout, on_stall)
+        try:
+            yield
+        finally:
+            self._stages.pop(token, None)
+
+    def watch_thread(self, thread: threading.Thread) -> None:
+        """登记监控线程，线程退出时视为未就绪"""
+        self.monitor_thread = thread
+
+    def readiness(self) -> Dict[str, Any]:
+        """获取就绪状态"""
+        now = time.monotonic()
+        limit = self.interval * self.lag_factor + self.lag_grace
+        reference = self.last_beat if self.last_beat is not None else self.started_at
+        lag = now - reference
+        reasons = []
+        if self.monitor_thread is not None and not self.monitor_thread.is_alive():
+            reasons.append('监控线程已退出')
+        if lag > limit:
+            reasons.append(f'检测落后 {lag:.0f} 秒（上限 {limit:.0f} 秒）')
+        stalled = [
+            {'stage': stage.name, 'thread': stage.thread, 'elapsed': round(now - stage.started, 1)}
+            for stage in list(self._stages.values())
+            if now - stage.started > stage.timeout
+        ]
+        if stalled:
+            reasons.append('存在超时阶段')
+        return {
+            'ready': not reasons,
+            'reasons': reasons,
+            'lag': round(lag, 1),
+            'lag_limit': limit,
+            'stalled': stalled,
+        }
+
+    def start(self) -> None:
+        """启动后台检查线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name='watchdog', daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.check_period)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"看门狗检查失败: {str(e)}")
+
+    def check(self) -> None:
+        """检查一次：处理超时阶段，并在长时间未就绪时退出进程"""
+        now = time.monotonic()
+        for stage in list(self._stages.values()):
+            if stage.stalled or now - stage.started <= stage.timeout:
+                continue
+            stage.stalled = True
+            STALLS.inc(stage=stage.name)
+            logger.error(f"阶段超时: {stage.name}（线程 {stage.thread}，已运行 {now - stage.started:.0f} 秒）")
+            if not stage.on_stall:
+                logger.warning(f"阶段 {stage.name} 无法中断，只能等待其自身超时或由看门狗退出进程")
+                continue
+            try:
+                stage.on_stall()
+            except Exception as e:
+                logger.error(f"终止超时阶段失败: {stage.name} - {str(e)}")
+
+        state = self.readiness()
+        LAG.set(state['lag'])
+        if state['ready']:
+            self.unready_since = None
+            return
+        if self.unready_since is None:
+            self.unready_since = now
+            logger.warning(f"监控未就绪: {'；'.join(state['reasons'])}")
+        elif self.exit_after and now - self.unready_since > self.exit_after:
+            logger.critical(f"监控持续 {now - self.unready_since:.0f} 秒未就绪，退出进程等待重启")
+            os._exit(1)
+
+
+WATCHDOG = Watchdog()
@@ -6,8 +6,15 @@ from src.core.database import DatabaseManager
 from dotenv import load_dotenv
 import sys
 
-def init_project():
-    """初始化项目目录结构"""
+_logging_configured = False
+
+def configure_logging():
+    """配置日志（控制台 + 按天轮转的文件），每个进程只配置一次"""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    
     # 首先移除默认的日志处理器
     logger.remove()
     
@@ -18,21 +25,8 @@ def init_project():
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {module}:{function}:{line} - {message}"
     )
     
-    directories = {
-        'data': '数据存储',
-        'logs': '日志文件',
-        'temp': '临时文件'
-    }
-    
-    # 确保目录存在并有正确的权限
-    for dir_name, description in directories.items():
-        path = os.path.join(os.getcwd(), dir_name)
-        os.makedirs(path, exist_ok=True)
-        # 设置目录权限
-        os.chmod(path, 0o777)
-        logger.info(f"创建目录: {dir_name}/ ({description})")
-    
     # 配置文件日志
+    os.makedirs('logs', exist_ok=True)
     log_file = os.path.join('logs', 'monitor_{time:YYYY-MM-DD}.log')
     try:
         logger.add(
@@ -47,6 +41,31 @@ def init_project():
     except Exception as e:
         logger.error(f"配置日志文件失败: {str(e)}")
         # 继续运行，但只使用控制台输出
+
+def init_project(db: DatabaseManager = None) -> DatabaseManager:
+    """初始化项目目录结构
+    
+    Args:
+        db: 已创建的数据库管理器，不传时新建
+        
+    Returns:
+        DatabaseManager: 数据库管理器（供调用方复用）
+    """
+    configure_logging()
+    
+    directories = {
+        'data': '数据存储',
+        'logs': '日志文件',
+        'temp': '临时文件'
+    }
+    
+    # 确保目录存在并有正确的权限
+    for dir_name, description in directories.items():
+        path = os.path.join(os.getcwd(), dir_name)
+        os.makedirs(path, exist_ok=True)
+        # 设置目录权限
+        os.chmod(path, 0o777)
+        logger.info(f"创建目录: {dir_name}/ ({description})")
     
     # 创建 .env 文件（仅当不存在时）
     if not os.path.exists('.env'):
@@ -57,7 +76,8 @@ def init_project():
             logger.warning("未找到 .env.example 文件")
     
     # 初始化数据库
-    db = DatabaseManager(os.path.join('data', 'database.db'))
+    if db is None:
+        db = DatabaseManager(os.path.join('data', 'database.db'))
     
     # 从环境变量加载配置
     load_dotenv()
@@ -79,6 +99,7 @@ def init_project():
             logger.debug(f"设置初始配置: {key}")
     
     logger.info("项目初始化完成")
+    return db
 
 if __name__ == "__main__":
     init_project()
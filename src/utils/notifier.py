@@ -1,18 +1,22 @@
 """通知模块"""
-import requests
+from src.core.transport import TRANSPORT, create_session
 from loguru import logger
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import time
 import os
 from src.core.database import DatabaseManager
+from src.core import clock, metrics
+from src.core.tracing import TRACER
+from src.core.watchdog import WATCHDOG
 
 class ServerChanNotifier:
     """Server酱通知器"""
     def __init__(self, sendkey: str):
         self.sendkey = sendkey
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.api_base = os.getenv('SERVER_CHAN_API_BASE', 'https://sctapi.ftqq.com').rstrip('/')
+        self.session = create_session({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json, text/plain, */*',
             'Content-Type': 'application/json'
@@ -29,6 +33,21 @@ class ServerChanNotifier:
         Returns:
             bool: 是否发送成功
         """
+        start = time.perf_counter()
+        # 3次尝试，每次最长30秒，间隔5秒；超时后只断开本次发送使用的连接
+        with TRACER.span('serverchan.send'), TRANSPORT.abortable() as scope, \
+                WATCHDOG.stage('notify', 150, scope.abort):
+            success = self._send(title, content, **kwargs)
+        metrics.NOTIFY_SECONDS.observe(
+            time.perf_counter() - start,
+            result='success' if success else 'failure'
+        )
+        if not success:
+            metrics.NOTIFY_FAILURES.inc()
+        return success
+    
+    def _send(self, title: str, content: str, **kwargs) -> bool:
+        """发送通知（含重试）"""
         retry_count = 3  # 添加重试次数
         retry_delay = 5  # 重试延迟（秒）
         
@@ -39,7 +58,7 @@ class ServerChanNotifier:
                     return False
                 
                 # 修改URL格式
-                url = f"https://sctapi.ftqq.com/{self.sendkey}.send"
+                url = f"{self.api_base}/{self.sendkey}.send"
                 
                 data = {
                     'title': title,
@@ -64,7 +83,7 @@ class ServerChanNotifier:
                     error_msg = f"Server酱通知发送失败: {result}"
                     if attempt < retry_count - 1:  # 如果不是最后一次尝试
                         logger.warning(f"{error_msg}，将在{retry_delay}秒后重试")
-                        time.sleep(retry_delay)
+                        clock.sleep(retry_delay)
                         continue
                     else:
                         logger.error(error_msg)
@@ -74,7 +93,7 @@ class ServerChanNotifier:
                 error_msg = f"Server酱通知发送出错: {str(e)}"
                 if attempt < retry_count - 1:  # 如果不是最后一次尝试
                     logger.warning(f"{error_msg}，将在{retry_delay}秒后重试")
-                    time.sleep(retry_delay)
+                    clock.sleep(retry_delay)
                     continue
                 else:
                     logger.error(error_msg)
@@ -89,8 +108,8 @@ class LiveNotifier:
             server_chan_key: Server酱密钥
         """
         self.notifier = ServerChanNotifier(server_chan_key)
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.api_base = os.getenv('BILIBILI_API_BASE', 'https://api.live.bilibili.com').rstrip('/')
+        self.session = create_session({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json'
         })
@@ -98,10 +117,14 @@ class LiveNotifier:
     def get_live_info(self, room_id: int) -> Dict[str, Any]:
         """获取直播间信息"""
         try:
-            url = "https://api.live.bilibili.com/room/v1/Room/get_info"
+            url = f"{self.api_base}/room/v1/Room/get_info"
             params = {'room_id': room_id}
-            response = self.session.get(url, params=params, timeout=10)
+            start = time.perf_counter()
+            with TRACER.span('bilibili.room_info', room_id=room_id):
+                response = self.session.get(url, params=params, timeout=10)
+            metrics.BILIBILI_REQUEST_SECONDS.observe(time.perf_counter() - start, api='room_info')
             data = response.json()
+            metrics.BILIBILI_RESPONSES.inc(api='room_info', code=data.get('code'))
             
             if data['code'] == 0 and 'data' in data:
                 return {
@@ -135,8 +158,28 @@ class LiveNotifier:
         except:
             return "未知"
     
-    def notify_live_start(self, name: str, room_id: int, title: str) -> bool:
-        """发送开播通知"""
+    def broadcast(self, recipients: Optional[List[ServerChanNotifier]], title: str, content: str, short: str) -> bool:
+        """把同一条通知发往多个渠道（多租户时并发发送）
+        
+        Args:
+            recipients: 通知渠道，为 None 时只发往默认渠道
+            
+        Returns:
+            bool: 是否全部发送成功
+        """
+        if recipients is None:
+            recipients = [self.notifier]
+        if len(recipients) <= 1:
+            return all(channel.send(title=title, content=content, short=short) for channel in recipients)
+        with ThreadPoolExecutor(max_workers=min(len(recipients), 8), thread_name_prefix='notify') as executor:
+            results = list(executor.map(
+                lambda channel: channel.send(title=title, content=content, short=short), recipients
+            ))
+        return all(results)
+    
+    def notify_live_start(self, name: str, room_id: int, title: str,
+                          recipients: Optional[List[ServerChanNotifier]] = None) -> bool:
+        """发送开播通知（直播间信息只查询一次，发往所有渠道）"""
         # 获取直播间信息
         live_info = self.get_live_info(room_id)
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -165,14 +208,11 @@ class LiveNotifier:
         )
         
         short = f"{name} 开播了：{title}"
-        return self.notifier.send(
-            title=title_text,
-            content=content,
-            short=short
-        )
+        return self.broadcast(recipients, title_text, content, short)
     
-    def notify_live_end(self, name: str, room_id: int, title: str) -> bool:
-        """发送下播通知"""
+    def notify_live_end(self, name: str, room_id: int, title: str,
+                        recipients: Optional[List[ServerChanNotifier]] = None) -> bool:
+        """发送下播通知（直播间信息只查询一次，发往所有渠道）"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # 获取直播信息
@@ -215,8 +255,21 @@ class LiveNotifier:
         )
         
         short = f"{name} 的直播已结束（直播了{duration}）"
-        return self.notifier.send(
-            title=title_text,
-            content=content,
-            short=short
+        return self.broadcast(recipients, title_text, content, short)
+    
+    def notify_title_change(self, name: str, room_id: int, old_title: str, new_title: str,
+                            recipients: Optional[List[ServerChanNotifier]] = None) -> bool:
+        """发送直播中修改标题的通知"""
+        title_text = f"✏️标题变更：{name} 修改了直播标题"
+        content = (
+            f"# {name} 修改了直播标题\n\n"
+            f"- 📝 新标题：**{new_title}**\n"
+            f"- 🗒️ 原标题：{old_title}\n"
+            f"- 🏠 房间号：**{room_id}**\n"
+            f"- 🔗 直播间：[点击进入直播间](https://live.bilibili.com/{room_id})\n\n"
+            "---\n"
+            "*由 Bilibili Live Monitor 自动发送*"
         )
+        
+        short = f"{name} 修改了直播标题：{new_title}"
+        return self.broadcast(recipients, title_text, content, short)
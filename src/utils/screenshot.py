@@ -9,10 +9,38 @@ import time
 import os
 from datetime import datetime
 from loguru import logger
+from src.core import metrics
+from src.core.tracing import TRACER
+from src.core.watchdog import WATCHDOG
+import signal
+
+def _child_pids(pid: int) -> list:
+    """通过 /proc 查找进程的所有子孙进程（仅Linux）"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 进程名可能包含空格，取最后一个右括号之后的字段
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
 
 class LiveScreenshot:
     def __init__(self):
         self.chrome_options = self._init_chrome_options()
+        self._driver = None  # 当前正在使用的浏览器，供看门狗终止
+        # 正常截图约需30秒（页面加载 + 等待20秒 + 5秒缓冲）
+        self.stall_timeout = float(os.getenv('SCREENSHOT_STALL_TIMEOUT', '120'))
 
     def _init_chrome_options(self):
         """初始化Chrome选项"""
@@ -60,19 +88,55 @@ class LiveScreenshot:
                 })
         return cookies
 
-    def capture(self, room_id: int, cookies_str: str) -> tuple:
+    def capture(self, room_id: int, cookies_str: str, proxy: str = None) -> tuple:
         """获取直播间截图
         
         Args:
             room_id: 直播间ID
             cookies_str: B站cookies字符串
+            proxy: 浏览器使用的出口代理，为空时直连
             
         Returns:
             tuple: (临时文件路径, 是否成功)
         """
+        with TRACER.span('browser.capture', room_id=room_id), \
+                WATCHDOG.stage('browser', self.stall_timeout, self.abort):
+            return self._capture(room_id, cookies_str, proxy)
+
+    def abort(self) -> None:
+        """强制结束卡住的浏览器：杀掉 ChromeDriver 及其启动的 Chromium 进程
+        
+        正在等待浏览器响应的截图调用会随之抛出异常并按失败处理
+        """
+        driver = self._driver
+        if driver is None:
+            return
+        process = getattr(getattr(driver, 'service', None), 'process', None)
+        if process is None:
+            return
+        pids = [process.pid]
+        try:
+            pids += _child_pids(process.pid)
+        except OSError:
+            pass
+        for pid in reversed(pids):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        logger.warning(f"已终止卡住的浏览器进程: {pids}")
+
+    def _capture(self, room_id: int, cookies_str: str, proxy: str = None) -> tuple:
+        """执行截图"""
         driver = None
+        start = time.perf_counter()
         try:
-            driver = webdriver.Chrome(options=self.chrome_options)
+            options = self.chrome_options
+            if proxy:
+                options = self._init_chrome_options()
+                options.add_argument(f'--proxy-server={proxy}')
+            driver = webdriver.Chrome(options=options)
+            self._driver = driver
             
             # 访问直播间
             url = f'https://live.bilibili.com/{room_id}'
@@ -110,13 +174,16 @@ class LiveScreenshot:
             img_cropped.save(temp_path)
             
             logger.info(f"截图成功: {temp_path}")
+            metrics.SCREENSHOT_SECONDS.observe(time.perf_counter() - start, result='success')
             return temp_path, True
             
         except Exception as e:
             logger.error(f"截图失败: {str(e)}")
+            metrics.SCREENSHOT_SECONDS.observe(time.perf_counter() - start, result='failure')
             return None, False
             
         finally:
+            self._driver = None
             if driver:
                 try:
                     driver.quit()
@@ -1,9 +1,20 @@
 """图床上传模块"""
-import requests
+from src.core.transport import TRANSPORT, create_session
 import os
+import heapq
+import itertools
 import mimetypes
+import random
+import threading
+import uuid
+from collections import OrderedDict
+import requests
 from loguru import logger
-from typing import Optional, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
+import time
+from src.core import metrics
+from src.core.tracing import TRACER
+from src.core.watchdog import WATCHDOG
 
 class CloudflareUploader:
     """Cloudflare图床上传器"""
@@ -15,15 +26,18 @@ class CloudflareUploader:
             auth_code: 认证码
         """
         self.domain = domain.rstrip('/')  # 移除末尾的斜杠
+        # 域名可以带协议（例如压测时的 http://127.0.0.1:8080），默认使用 https
+        self.base_url = self.domain if '://' in self.domain else f"https://{self.domain}"
         self.auth_code = auth_code
-        self.session = requests.Session()
-        self.session.headers.update({
+        # 单次上传的读取超时（秒）
+        self.timeout = float(os.getenv('UPLOAD_TIMEOUT', '30'))
+        self.session = create_session({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json'
         })
     
     def upload(self, file_path: str, compress: bool = True) -> Tuple[Optional[str], bool]:
-        """上传文件到图床
+        """上传文件到图床（单次尝试，重试由 UploadQueue 负责）
         
         Args:
             file_path: 文件路径
@@ -32,6 +46,27 @@ class CloudflareUploader:
         Returns:
             Tuple[Optional[str], bool]: (图片URL, 是否成功)
         """
+        url, _ = self.try_upload(file_path, compress)
+        return url, url is not None
+    
+    def try_upload(self, file_path: str, compress: bool = True) -> Tuple[Optional[str], bool]:
+        """上传文件到图床
+        
+        Returns:
+            Tuple[Optional[str], bool]: (图片URL, 失败时是否值得重试)
+        """
+        start = time.perf_counter()
+        with TRACER.span('image.upload'), TRANSPORT.abortable() as scope, \
+                WATCHDOG.stage('upload', 120, scope.abort):
+            url, retryable = self._upload(file_path, compress)
+        metrics.UPLOAD_SECONDS.observe(
+            time.perf_counter() - start,
+            result='success' if url else 'failure'
+        )
+        return url, retryable
+    
+    def _upload(self, file_path: str, compress: bool) -> Tuple[Optional[str], bool]:
+        """执行上传请求"""
         try:
             if not os.path.exists(file_path):
                 logger.error(f"文件不存在: {file_path}")
@@ -41,37 +76,39 @@ class CloudflareUploader:
             content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
             
             # 准备上传
-            url = f"https://{self.domain}/upload"
+            url = f"{self.base_url}/upload"
             params = {
                 'authCode': self.auth_code,
                 'serverCompress': 'true' if compress else 'false'
             }
             
-            with open(file_path, 'rb') as f:
-                files = {
-                    'file': (os.path.basename(file_path), f, content_type)
-                }
-                
-                logger.debug(f"开始上传文件: {file_path}")
-                response = self.session.post(
-                    url,
-                    params=params,
-                    files=files,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if isinstance(data, list) and len(data) > 0:
-                        file_path = data[0].get('src', '')
-                        if file_path:
-                            image_url = f"https://{self.domain}{file_path}"
-                            logger.info(f"文件上传成功: {image_url}")
-                            return image_url, True
-                
-                logger.error(f"上传失败，响应: {response.text}")
-                return None, False
+            # 请求体按块从文件读取，不把整张图片载入内存
+            body = MultipartFile('file', file_path, content_type)
+            logger.debug(f"开始上传文件: {file_path}")
+            response = self.session.post(
+                url,
+                params=params,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=(10, self.timeout)
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if isinstance(data, list) and len(data) > 0:
+                    file_path = data[0].get('src', '')
+                    if file_path:
+                        image_url = f"{self.base_url}{file_path}"
+                        logger.info(f"文件上传成功: {image_url}")
+                        return image_url, False
+            
+            logger.error(f"上传失败，响应: {response.text}")
+            # 限流和服务端错误可以重试，其他错误（认证失败、文件不被接受等）重试也不会成功
+            return None, response.status_code == 429 or response.status_code >= 500
                 
+        except (requests.ConnectionError, requests.Timeout) as e:
+            logger.warning(f"上传文件时网络错误: {str(e)}")
+            return None, True
         except Exception as e:
             logger.error(f"上传文件时出错: {str(e)}")
             return None, False
@@ -85,18 +122,56 @@ class CloudflareUploader:
         Returns:
             Tuple[Optional[str], bool]: (图片URL, 是否成功)
         """
+        url, _ = self.try_upload_screenshot(screenshot_path)
+        return url, url is not None
+    
+    def try_upload_screenshot(self, screenshot_path: str) -> Tuple[Optional[str], bool]:
+        """上传截图
+        
+        Returns:
+            Tuple[Optional[str], bool]: (图片URL, 失败时是否值得重试)
+        """
         try:
             # 检查文件大小
             file_size = os.path.getsize(screenshot_path)
             # 如果大于5MB，启用压缩
             compress = file_size > 5 * 1024 * 1024
             
-            return self.upload(screenshot_path, compress=compress)
+            return self.try_upload(screenshot_path, compress=compress)
             
         except Exception as e:
             logger.error(f"上传截图时出错: {str(e)}")
             return None, False
 
+class MultipartFile:
+    """流式 multipart/form-data 请求体（只含一个文件字段）
+    
+    提供长度（请求带 Content-Length，不使用分块传输），迭代时才打开文件并按块读取，
+    每次尝试都要新建一个实例。
+    """
+    def __init__(self, field: str, file_path: str, content_type: str, chunk_size: int = 1 << 16):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{os.path.basename(file_path)}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._size = os.path.getsize(file_path)
+    
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+    
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self.file_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.chunk_size), b''):
+                yield block
+        yield self._tail
+
 class ImageUploader:
     """图片上传管理器"""
     def __init__(self, config):
@@ -134,3 +209,179 @@ class ImageUploader:
         """
         url, success = self.uploader.upload_screenshot(screenshot_path)
         return url if success else None
+    
+    def try_upload_screenshot(self, screenshot_path: str) -> Tuple[Optional[str], bool]:
+        """上传截图（单次尝试）
+        
+        Returns:
+            Tuple[Optional[str], bool]: (图片URL, 失败时是否值得重试)
+        """
+        return self.uploader.try_upload_screenshot(screenshot_path)
+
+class _UploadJob:
+    """一个待上传的文件及等待其结果的回调"""
+    __slots__ = ('key', 'path', 'callbacks', 'attempt', 'finished')
+
+    def __init__(self, key: str, path: str):
+        self.key = key
+        self.path = path
+        self.callbacks: List[Callable[[Optional[str]], None]] = []
+        self.attempt = 0
+        self.finished = False
+
+class UploadQueue:
+    """图床异步上传队列
+    
+    截图流程只把本地文件交给队列就返回，图床慢或不可用不会拖慢检测和开播/下播通知：
+    - 固定数量的工作线程并发上传（UPLOAD_WORKERS）
+    - 网络错误、限流和服务端错误按指数退避重试（UPLOAD_MAX_ATTEMPTS 次），
+      等待重试的任务不占用工作线程
+    - 按内容摘要去重：同一内容正在上传时合并回调，最近上传过的直接返回已有地址
+    - 排队的任务超过 UPLOAD_QUEUE_SIZE 时拒绝新任务（截图仍保存在本地存储中）
+    完成后回调图床地址，最终失败时为 None。
+    """
+    # 记住最近上传成功的内容数
+    RECENT_SIZE = 1024
+    
+    def __init__(self, uploader: ImageUploader, workers: Optional[int] = None):
+        """初始化队列
+        
+        Args:
+            uploader: 图床上传管理器
+            workers: 工作线程数，默认 UPLOAD_WORKERS（2）
+        """
+        self.uploader = uploader
+        self.workers = workers or int(os.getenv('UPLOAD_WORKERS', '2'))
+        self.max_attempts = int(os.getenv('UPLOAD_MAX_ATTEMPTS', '4'))
+        # 第 n 次重试前等待 base * 2^(n-1) 秒，不超过 max
+        self.retry_base = float(os.getenv('UPLOAD_RETRY_BASE', '2'))
+        self.retry_max = float(os.getenv('UPLOAD_RETRY_MAX', '60'))
+        self.max_pending = int(os.getenv('UPLOAD_QUEUE_SIZE', '500'))
+        # (可以开始的时间, 序号, 任务)，序号保证同一时间的任务先进先出
+        self._heap: List[Tuple[float, int, _UploadJob]] = []
+        self._seq = itertools.count()
+        # 内容摘要 -> 排队中、上传中或正在回调的任务
+        self._jobs: 'OrderedDict[str, _UploadJob]' = OrderedDict()
+        # 内容摘要 -> 图床地址
+        self._recent: 'OrderedDict[str, str]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+    
+    def submit(self, path: str, callback: Callable[[Optional[str]], None], key: Optional[str] = None) -> None:
+        """加入上传队列
+        
+        Args:
+            path: 本地文件路径（上传期间不能删除）
+            callback: 完成回调，参数为图床地址，失败时为 None（在工作线程中调用）
+            key: 内容摘要，用于去重，默认为文件路径
+        """
+        key = key or path
+        with self._cond:
+            url = self._recent.get(key)
+            if url is not None:
+                self._recent.move_to_end(key)
+                metrics.UPLOAD_DEDUPLICATED.inc()
+            else:
+                job = self._jobs.get(key)
+                if job is not None and not job.finished:
+                    job.callbacks.append(callback)
+                    metrics.UPLOAD_DEDUPLICATED.inc()
+                    return
+                if len(self._jobs) >= self.max_pending:
+                    metrics.UPLOAD_DROPPED.inc()
+                    logger.warning(f"上传队列已满（{len(self._jobs)}），跳过: {path}")
+                else:
+                    job = self._jobs[key] = _UploadJob(key, path)
+                    job.callbacks.append(callback)
+                    self._schedule(job, time.monotonic())
+                    self._start_workers()
+                    return
+        # 已有地址或队列已满，直接在调用方线程回调
+        self._invoke(callback, url)
+    
+    def _schedule(self, job: _UploadJob, ready_at: float) -> None:
+        """（调用方持有锁）"""
+        heapq.heappush(self._heap, (ready_at, next(self._seq), job))
+        metrics.UPLOAD_QUEUE_DEPTH.set(len(self._jobs))
+        self._cond.notify_all()
+    
+    def _start_workers(self) -> None:
+        """（调用方持有锁）"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f'image-upload-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+    
+    def _next_job(self) -> _UploadJob:
+        """取出下一个到期的任务，没有时等待"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+    
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            job.attempt += 1
+            try:
+                url, retryable = self._upload(job.path)
+            except Exception as e:
+                logger.error(f"上传截图失败: {str(e)}")
+                url, retryable = None, True
+            
+            with self._cond:
+                if url is None and retryable and job.attempt < self.max_attempts:
+                    delay = min(self.retry_base * 2 ** (job.attempt - 1), self.retry_max)
+                    # 加入随机抖动，避免图床恢复时所有重试同时到达
+                    delay *= random.uniform(0.8, 1.2)
+                    metrics.UPLOAD_RETRIES.inc()
+                    logger.info(f"上传失败，{delay:.1f} 秒后第 {job.attempt + 1} 次尝试: {job.path}")
+                    self._schedule(job, time.monotonic() + delay)
+                    continue
+                job.finished = True
+                if url is not None:
+                    self._recent[job.key] = url
+                    while len(self._recent) > self.RECENT_SIZE:
+                        self._recent.popitem(last=False)
+            
+            for callback in job.callbacks:
+                self._invoke(callback, url)
+            
+            with self._cond:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                metrics.UPLOAD_QUEUE_DEPTH.set(len(self._jobs))
+                self._cond.notify_all()
+    
+    def _upload(self, path: str) -> Tuple[Optional[str], bool]:
+        if not path or not os.path.exists(path):
+            # 上传前已被本地存储淘汰
+            return None, False
+        try_upload = getattr(self.uploader, 'try_upload_screenshot', None)
+        if try_upload is None:
+            # 只提供 upload_screenshot 的上传器（测试替身等），失败不重试
+            return self.uploader.upload_screenshot(path), False
+        return try_upload(path)
+    
+    @staticmethod
+    def _invoke(callback: Callable[[Optional[str]], None], url: Optional[str]) -> None:
+        try:
+            callback(url)
+        except Exception as e:
+            logger.error(f"上传完成回调失败: {str(e)}")
+    
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的上传（含重试和回调）全部完成
+        
+        Returns:
+            bool: 超时返回 False
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs, timeout)
+    
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
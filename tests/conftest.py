@@ -0,0 +1,46 @@
+"""测试共用的夹具"""
+import json
+
+import pytest
+
+
+@pytest.fixture
+def make_monitor(tmp_path, monkeypatch):
+    """在临时工作目录中创建监控实例
+
+    Args（返回的工厂函数）:
+        base: B站接口、Server酱和图床地址，默认指向不可连接的本地端口
+        mids: 监控列表
+        env: 额外的环境变量
+    """
+    def make(base='http://127.0.0.1:9', mids=('1',), **env):
+        monkeypatch.chdir(tmp_path)
+        env = {
+            'BILIBILI_API_BASE': base,
+            'SERVER_CHAN_API_BASE': base,
+            'LOG_LEVEL': 'ERROR',
+            'CAPTURE_PATH': '',
+            'CLUSTER_MODE': 'false',
+            'PUSH_MODE': 'false',
+            'MAINTENANCE_INTERVAL': '0',
+            **env,
+        }
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+
+        from src.core.database import DatabaseManager
+        from src.core.monitor import BilibiliMonitor
+
+        db = DatabaseManager('data/database.db')
+        for key, value in {
+            'cloudflare_domain': base,
+            'cloudflare_auth_code': 'test',
+            'server_chan_key': 'SCTtest',
+            'bilibili_cookies': 'a=1',
+            'monitor_mids': json.dumps(list(mids)),
+            'check_interval': '60',
+        }.items():
+            db.set_config(key, value)
+        return BilibiliMonitor()
+
+    return make
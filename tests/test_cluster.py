@@ -0,0 +1,104 @@
+"""分片协调测试：两个节点共享同一个临时 SQLite 数据库"""
+import pytest
+
+from src.core import cluster
+from src.core.cluster import ShardCoordinator, SQLiteLeaseStore
+from src.core.database import DatabaseManager
+
+LEASE_TTL = 30
+CLOCK_SKEW = 2
+SHARDS = 32
+
+
+class _Clock:
+    """替换 cluster 模块的 time，系统时间和单调时间一起推进"""
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(cluster, 'time', fake)
+    monkeypatch.setenv('CLUSTER_CLOCK_SKEW', str(CLOCK_SKEW))
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteLeaseStore(DatabaseManager(str(tmp_path / 'database.db')))
+
+
+def _node(store, node_id):
+    return ShardCoordinator(store, node_id=node_id, shard_count=SHARDS, lease_ttl=LEASE_TTL)
+
+
+def _split(a, b):
+    """两个节点先后心跳，直到分配稳定"""
+    for _ in range(2):
+        a.refresh()
+        b.refresh()
+
+
+def test_split_ownership(clock, store):
+    a, b = _node(store, 'a'), _node(store, 'b')
+    assert a.refresh() == set(range(SHARDS))
+    # a 的租约未过期，b 暂时拿不到分片
+    assert b.refresh() == set()
+    _split(a, b)
+    assert a.owned_shards and b.owned_shards
+    assert a.owned_shards.isdisjoint(b.owned_shards)
+    assert a.owned_shards | b.owned_shards == set(range(SHARDS))
+
+    mids = [str(mid) for mid in range(200)]
+    assert sorted(a.filter_mids(mids) + b.filter_mids(mids), key=int) == mids
+    assert all(a.owns(mid) != b.owns(mid) for mid in mids)
+
+
+def test_stop_hands_off_immediately(clock, store):
+    a, b = _node(store, 'a'), _node(store, 'b')
+    _split(a, b)
+    a.stop()
+    assert a.owned_shards == set() and a.filter_mids(['1']) == []
+    assert b.refresh() == set(range(SHARDS))
+
+
+def test_expired_lease_is_taken_over_after_clock_skew(clock, store):
+    a, b = _node(store, 'a'), _node(store, 'b')
+    _split(a, b)
+    held_by_a = set(a.owned_shards)
+
+    # a 失联（不再心跳）：租约过期但未超过时钟偏差时不接管
+    clock.now += LEASE_TTL + CLOCK_SKEW - 0.5
+    assert b.refresh().isdisjoint(held_by_a)
+
+    clock.now += 1
+    assert b.refresh() == set(range(SHARDS))
+
+
+def test_failed_renewal_stops_ownership_before_takeover(clock, store, monkeypatch):
+    a, b = _node(store, 'a'), _node(store, 'b')
+    _split(a, b)
+    mids = [str(mid) for mid in range(50)]
+    assert a.filter_mids(mids)
+
+    def locked(*args):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(a.store, 'heartbeat', locked)
+
+    # 续租失败但仍在有效期内，继续处理
+    clock.now += LEASE_TTL / 3
+    a._renew()
+    assert a.filter_mids(mids)
+
+    # 距上次成功续租达到 租约有效期 - 时钟偏差，在其他节点能接管之前放弃全部分片
+    clock.now = a.renewed_at + LEASE_TTL - CLOCK_SKEW
+    assert a.filter_mids(mids) == [] and not any(a.owns(mid) for mid in mids)
+    a._renew()
+    assert a.owned_shards == set()
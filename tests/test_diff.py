@@ -0,0 +1,29 @@
+"""状态快照差异检测测试"""
+from src.core.diff import TITLE_CHANGED, WENT_LIVE, WENT_OFFLINE, SnapshotDiffer
+
+
+def _status(status=0, title='t'):
+    return {'status': status, 'room_id': 1, 'title': title, 'cover': '', 'area': ''}
+
+
+def test_changes_repeat_until_committed():
+    differ = SnapshotDiffer()
+    live = _status(1)
+    assert [e.type for e in differ.diff({'1': live})['1']] == [WENT_LIVE]
+    # 处理失败（没有提交）时下一轮仍产生同样的变化
+    assert [e.type for e in differ.diff({'1': live})['1']] == [WENT_LIVE]
+    assert not differ.live
+
+    differ.commit('1', live)
+    assert differ.diff({'1': live}) == {}
+    assert list(differ.live) == ['1']
+
+
+def test_field_and_status_events_against_committed_snapshot():
+    differ = SnapshotDiffer()
+    differ.commit('1', _status(1, 'a'))
+    assert [(e.type, e.old, e.new) for e in differ.diff({'1': _status(1, 'b')})['1']] == [(TITLE_CHANGED, 'a', 'b')]
+    offline = _status(0, 'a')
+    assert [e.type for e in differ.diff({'1': offline})['1']] == [WENT_OFFLINE]
+    differ.commit('1', offline)
+    assert not differ.live
@@ -0,0 +1,110 @@
+"""本地截图存储和 /images 路由测试"""
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.routes import images
+from src.core import imagestore
+from src.core.imagestore import DEFAULT_THUMBNAIL_SIZES, ImageStore
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _png(path, width=800, height=600, color=(200, 30, 30)):
+    Image.new('RGB', (width, height), color).save(path, 'PNG')
+    return str(path)
+
+
+@pytest.fixture
+def client(tmp_path):
+    store = ImageStore(root=str(tmp_path / 'images'), quota_bytes=1 << 30)
+    app = FastAPI()
+    app.state.image_store = store
+    app.include_router(images.router)
+    return TestClient(app), store
+
+
+def test_range_and_etag(client, tmp_path):
+    client, store = client
+    digest = store.put_file(_png(tmp_path / 'a.png'))
+    with open(store.path(digest), 'rb') as f:
+        content = f.read()
+
+    response = client.get(f'/images/{digest}', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.content == content[:10]
+    assert response.headers['content-range'] == f'bytes 0-9/{len(content)}'
+
+    etag = client.get(f'/images/{digest}').headers['etag']
+    assert client.get(f'/images/{digest}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_thumbnail(client, tmp_path):
+    client, store = client
+    digest = store.put_file(_png(tmp_path / 'a.png'))
+    response = client.get(f'/images/{digest}', params={'w': 100})
+    assert response.status_code == 200
+    with Image.open(store.thumbnail(digest, 100)) as image:
+        assert image.width == 320
+    assert client.get(f'/images/{"0" * 64}').status_code == 404
+
+
+def test_empty_thumbnail_sizes_fall_back_to_defaults(tmp_path, monkeypatch):
+    monkeypatch.setenv('IMAGE_THUMBNAIL_SIZES', '')
+    store = ImageStore(root=str(tmp_path / 'images'))
+    assert store.thumbnail_sizes == DEFAULT_THUMBNAIL_SIZES
+    digest = store.put_file(_png(tmp_path / 'a.png'))
+    assert store.thumbnail(digest, 5000).endswith(f'_{DEFAULT_THUMBNAIL_SIZES[-1]}.jpg')
+
+
+def test_only_the_owner_evicts(tmp_path):
+    root = str(tmp_path / 'images')
+    owner = ImageStore(root=root, quota_bytes=1 << 30)
+    first = owner.put_file(_png(tmp_path / 'a.png', color=(1, 2, 3)))
+    second = owner.put_file(_png(tmp_path / 'b.png', color=(4, 5, 6)))
+
+    # 读取方的配额再小也不删除文件
+    reader = ImageStore(root=root, quota_bytes=1, evict=False)
+    assert reader.thumbnail(first, 320) is not None
+    assert os.path.exists(owner.path(first)) and os.path.exists(owner.path(second))
+
+    # 负责淘汰的一方删除后，读取方不再返回失效的路径
+    owner.quota_bytes = 1
+    owner.put_file(_png(tmp_path / 'c.png', color=(7, 8, 9)))
+    assert reader.path(first) is None
+
+
+def test_concurrent_thumbnail_renders_are_counted_once(tmp_path, monkeypatch):
+    store = ImageStore(root=str(tmp_path / 'images'), quota_bytes=1 << 30)
+    digest = store.put_file(_png(tmp_path / 'a.png'))
+    original = store.total_bytes
+    # 两个请求都没看到已生成的缩略图，各自生成一次
+    monkeypatch.setattr(imagestore.os.path, 'exists', lambda path: False)
+    target = store.thumbnail(digest, 320)
+    assert store.thumbnail(digest, 320) == target
+    assert store.total_bytes == original + os.path.getsize(target)
+
+    # 重新加载后按文件名恢复已计入的宽度
+    monkeypatch.undo()
+    reloaded = ImageStore(root=str(tmp_path / 'images'), quota_bytes=1 << 30)
+    assert reloaded.total_bytes == store.total_bytes
+    reloaded.thumbnail(digest, 320)
+    assert reloaded.total_bytes == store.total_bytes
+
+
+def test_thumbnail_of_an_image_evicted_while_rendering_is_removed(tmp_path, monkeypatch):
+    store = ImageStore(root=str(tmp_path / 'images'), quota_bytes=1 << 30)
+    digest = store.put_file(_png(tmp_path / 'a.png'))
+    lookup = store.path
+
+    def evicted_after_lookup(digest):
+        path = lookup(digest)
+        with store._lock:
+            store._forget(digest)
+        return path
+    monkeypatch.setattr(store, 'path', evicted_after_lookup)
+
+    assert store.thumbnail(digest, 320) is None
+    assert not [name for name in os.listdir(os.path.join(store.root, digest[:2])) if '_' in name]
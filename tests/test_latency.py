@@ -0,0 +1,20 @@
+"""检测延迟统计测试"""
+from src.core.database import DatabaseManager
+from src.core.latency import summarize_latency
+
+
+def test_reconciled_records_are_excluded(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'database.db'))
+    db.add_live_record('1', 10, 'live', upstream_live_time=1000, detected_at=1003, notified_at=1004)
+    # 停机期间开播、重启后校准补录：检测时间是重启时间
+    db.add_live_record('2', 20, 'missed', upstream_live_time=1000, detected_at=8200, notified_at=8201,
+                       reconciled=True)
+
+    records = db.get_latency_records()
+    assert [record['mid'] for record in records] == [1]
+    summary = summarize_latency(records)
+    assert summary['overall']['detection']['max'] == 3
+
+    # 调用方传入未过滤的记录时同样跳过
+    assert summarize_latency([{'mid': 2, 'upstream_live_time': 1000, 'detected_at': 8200,
+                               'notified_at': None, 'reconciled': 1}])['overall']['detection'] == {'count': 0}
@@ -0,0 +1,158 @@
+"""直播间广播推送检测测试
+
+数据包编解码的往返测试，以及 LivePushDetector 连接本地替身 WebSocket 服务的端到端测试。
+"""
+import asyncio
+import json
+import queue
+import threading
+import zlib
+
+import pytest
+
+from src.core import live_ws
+from src.core.live_ws import (
+    HEADER, OP_AUTH, OP_AUTH_REPLY, OP_HEARTBEAT, OP_HEARTBEAT_REPLY, OP_MESSAGE,
+    PROTO_BROTLI, PROTO_JSON, PROTO_ZLIB, LivePushDetector, decode_packets, encode_packet,
+)
+
+brotli = pytest.importorskip('brotli')
+websockets = pytest.importorskip('websockets')
+
+
+def _message(cmd: str, **fields) -> bytes:
+    return encode_packet(OP_MESSAGE, json.dumps(dict(cmd=cmd, **fields)).encode('utf-8'), PROTO_JSON)
+
+
+def test_round_trip_plain_packets():
+    data = (
+        _message('LIVE', roomid=1)
+        + encode_packet(OP_HEARTBEAT_REPLY, (1234).to_bytes(4, 'big'))
+        + encode_packet(OP_AUTH_REPLY, b'{"code":0}', PROTO_JSON)
+    )
+    assert list(decode_packets(data)) == [
+        (OP_MESSAGE, {'cmd': 'LIVE', 'roomid': 1}),
+        (OP_HEARTBEAT_REPLY, 1234),
+        (OP_AUTH_REPLY, {'code': 0}),
+    ]
+
+
+def test_round_trip_header_fields():
+    packet = encode_packet(OP_HEARTBEAT, b'abc', seq=7)
+    assert HEADER.unpack_from(packet) == (HEADER.size + 3, HEADER.size, 1, OP_HEARTBEAT, 7)
+
+
+@pytest.mark.parametrize('protover, compress', [
+    (PROTO_ZLIB, zlib.compress),
+    (PROTO_BROTLI, lambda data: brotli.compress(data)),
+])
+def test_round_trip_compressed_bodies(protover, compress):
+    inner = _message('LIVE', roomid=1) + _message('PREPARING', roomid=1)
+    data = encode_packet(OP_MESSAGE, compress(inner), protover) + _message('ROUND', roomid=1)
+    assert [body['cmd'] for _, body in decode_packets(data)] == ['LIVE', 'PREPARING', 'ROUND']
+
+
+def test_nested_compression():
+    inner = encode_packet(OP_MESSAGE, zlib.compress(_message('LIVE')), PROTO_ZLIB)
+    data = encode_packet(OP_MESSAGE, brotli.compress(inner), PROTO_BROTLI)
+    assert list(decode_packets(data)) == [(OP_MESSAGE, {'cmd': 'LIVE'})]
+
+
+def test_truncated_packet_is_dropped():
+    complete = _message('LIVE')
+    truncated = _message('PREPARING')[:-3]
+    assert list(decode_packets(complete + truncated)) == [(OP_MESSAGE, {'cmd': 'LIVE'})]
+    # 压缩包被截断时不把残缺的数据交给解压
+    compressed = encode_packet(OP_MESSAGE, zlib.compress(_message('LIVE')), PROTO_ZLIB)
+    assert list(decode_packets(compressed[:-2])) == []
+
+
+def test_negative_body_length_is_dropped():
+    # 包总长度小于头部长度，包体长度为负
+    bad = HEADER.pack(HEADER.size - 4, HEADER.size, PROTO_JSON, OP_MESSAGE, 1) + b'{}'
+    assert list(decode_packets(_message('LIVE') + bad + _message('ROUND'))) == [(OP_MESSAGE, {'cmd': 'LIVE'})]
+    # 头部长度小于固定头部
+    bad_header = HEADER.pack(HEADER.size, 4, PROTO_JSON, OP_MESSAGE, 1)
+    assert list(decode_packets(bad_header)) == []
+
+
+def test_corrupt_compressed_body_is_skipped():
+    data = encode_packet(OP_MESSAGE, b'not zlib', PROTO_ZLIB) + _message('LIVE')
+    assert list(decode_packets(data)) == [(OP_MESSAGE, {'cmd': 'LIVE'})]
+
+
+class _StandInServer:
+    """本地替身广播服务：校验认证包和心跳，然后依次推送 LIVE / PREPARING / ROUND"""
+    def __init__(self, room_id: int):
+        self.room_id = room_id
+        self.auth = None
+        self.heartbeats = 0
+        self.loop = asyncio.new_event_loop()
+        self.url = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        assert self._ready.wait(5)
+        return self
+
+    def __exit__(self, *exc):
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+
+        async def start():
+            self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+            port = next(iter(self._server.sockets)).getsockname()[1]
+            self.url = f'ws://127.0.0.1:{port}/sub'
+
+        self.loop.run_until_complete(start())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _handle(self, ws):
+        (op, body), = decode_packets(await ws.recv())
+        assert op == OP_AUTH
+        self.auth = json.loads(body)
+        await ws.send(encode_packet(OP_AUTH_REPLY, b'{"code":0}', PROTO_JSON))
+
+        (op, _), = decode_packets(await ws.recv())
+        assert op == OP_HEARTBEAT
+        self.heartbeats += 1
+        await ws.send(encode_packet(OP_HEARTBEAT_REPLY, (42).to_bytes(4, 'big')))
+
+        await ws.send(_message('LIVE', roomid=self.room_id))
+        await ws.send(encode_packet(OP_MESSAGE, zlib.compress(_message('PREPARING', roomid=self.room_id)), PROTO_ZLIB))
+        await ws.send(encode_packet(OP_MESSAGE, brotli.compress(_message('ROUND', roomid=self.room_id)), PROTO_BROTLI))
+        await ws.wait_closed()
+
+
+def test_detector_against_stand_in_server(monkeypatch):
+    monkeypatch.setenv('LIVE_WS_HEARTBEAT', '30')
+    room_id = 1234
+    statuses = queue.Queue()
+    messages = []
+
+    with _StandInServer(room_id) as server:
+        detector = LivePushDetector(lambda room, status: statuses.put((room, status)), url=server.url)
+        detector.message_handlers.append(lambda room, cmd, data: messages.append((room, cmd)))
+        detector.start()
+        try:
+            detector.sync_rooms({room_id})
+            received = [statuses.get(timeout=5) for _ in range(3)]
+        finally:
+            detector.stop()
+
+    assert received == [(room_id, 1), (room_id, 0), (room_id, 2)]
+    assert server.auth['roomid'] == room_id
+    assert server.auth['protover'] == (PROTO_BROTLI if live_ws.brotli else PROTO_ZLIB)
+    assert server.heartbeats == 1
+    assert (room_id, 'HEARTBEAT_REPLY') in messages
@@ -0,0 +1,43 @@
+"""监控循环测试"""
+import threading
+
+from src.core import clock
+
+
+def test_pushes_are_processed_on_the_monitor_thread(make_monitor, monkeypatch):
+    monitor = make_monitor()
+    handled = []
+    monkeypatch.setattr(
+        monitor, 'handle_push_status',
+        lambda room_id, status, detected_at: handled.append((room_id, status, detected_at, threading.get_ident()))
+    )
+
+    start = clock.now()
+    pusher = threading.Thread(target=monitor.enqueue_push, args=(42, 1))
+    pusher.start()
+    pusher.join()
+    # 推送线程只排队，不处理
+    assert handled == []
+
+    assert monitor.process_pushes() == 1
+    (room_id, status, detected_at, thread_id), = handled
+    assert (room_id, status) == (42, 1)
+    assert detected_at >= start
+    assert thread_id == threading.get_ident()
+    assert monitor.process_pushes() == 0
+
+
+def test_failed_push_does_not_block_the_queue(make_monitor, monkeypatch):
+    monitor = make_monitor()
+    handled = []
+
+    def handle(room_id, status, detected_at):
+        if room_id == 1:
+            raise RuntimeError('boom')
+        handled.append(room_id)
+    monkeypatch.setattr(monitor, 'handle_push_status', handle)
+
+    monitor.enqueue_push(1, 1)
+    monitor.enqueue_push(2, 1)
+    assert monitor.process_pushes(timeout=0.1) == 2
+    assert handled == [2]
@@ -0,0 +1,54 @@
+"""录制回放测试：对模拟服务录制一次正常运行，回放结果应与原始运行一致"""
+import threading
+
+import pytest
+
+from benchmarks.fake_server import FakeBilibili, FakeServer
+from src.core.replay import replay
+from src.core.transport import TRANSPORT
+
+
+class _NoBrowser:
+    """截图替身：不启动浏览器，截图一律失败"""
+    def capture(self, room_id, cookies=None, proxy=None):
+        return None, False
+
+    def abort(self):
+        pass
+
+
+@pytest.fixture
+def fake():
+    fake = FakeBilibili(seed=1)
+    server = FakeServer(fake)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.base_url = server.base_url
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def test_replay_of_a_normal_run_is_identical(make_monitor, fake, tmp_path):
+    mids = [str(100 + i) for i in range(6)]
+    # 停机期间开播的UP主，启动校准时汇总通知
+    fake.flip([100, 101], 1)
+    monitor = make_monitor(
+        base=fake.base_url, mids=mids,
+        CAPTURE_PATH='data/capture.jsonl.gz', BATCH_SIZE='4', SCREENSHOT_INTERVAL='999999'
+    )
+    monitor.screenshot = _NoBrowser()
+    monitor.update_monitor_list()
+    monitor.reconcile()
+    for uids, status in (([102], 1), ([100], 0), ([103, 104], 1), ([102, 103], 0)):
+        fake.flip(uids, status)
+        monitor.run_once()
+    monitor.recorder.close()
+    # 录制不另建连接池，请求经过共享传输适配器
+    assert monitor.session.get_adapter(fake.base_url).adapter is TRANSPORT.adapter
+
+    report = replay(str(tmp_path / 'data' / 'capture.jsonl.gz'), str(tmp_path / 'data' / 'database.db'))
+    assert report['identical'], report
+    assert report['unused_responses'] == 0
+    # 校准汇总通知和之后检查中的开播通知（下播需要防抖确认）
+    assert report['notifications']['original'] == report['notifications']['replay'] >= 3
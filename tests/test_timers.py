@@ -0,0 +1,103 @@
+"""哈希计时轮测试（虚拟时钟）"""
+import pytest
+
+from src.core.clock import VirtualClock
+from src.core.timers import TimingWheel
+
+SLOTS = 8
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock(1000)
+
+
+@pytest.fixture
+def wheel(clock):
+    return TimingWheel(tick=1.0, slots=SLOTS, clock_source=clock)
+
+
+def _advance(wheel, clock, seconds):
+    clock.sleep(seconds)
+    return wheel.advance()
+
+
+def test_fires_once_at_deadline(wheel, clock):
+    fired = []
+    wheel.schedule('a', 3, fired.append, 'a')
+    assert wheel.remaining('a') == 3
+    assert _advance(wheel, clock, 2.5) == 0
+    assert _advance(wheel, clock, 0.5) == 1
+    assert fired == ['a'] and 'a' not in wheel
+    assert _advance(wheel, clock, 10) == 0
+
+
+def test_schedule_replaces_by_key(wheel, clock):
+    fired = []
+    wheel.schedule('a', 2, fired.append, 'first')
+    wheel.schedule('a', 5, fired.append, 'second')
+    assert len(wheel) == 1
+    _advance(wheel, clock, 3)
+    assert fired == []
+    _advance(wheel, clock, 2)
+    assert fired == ['second']
+
+
+def test_cancel(wheel, clock):
+    fired = []
+    wheel.schedule('a', 1, fired.append, 'a')
+    assert wheel.cancel('a')
+    assert not wheel.cancel('a')
+    assert wheel.remaining('a') is None
+    _advance(wheel, clock, 5)
+    assert fired == []
+
+
+def test_every_reschedules_until_cancelled(wheel, clock):
+    fired = []
+    wheel.every('tick', 2, lambda: fired.append(clock.now()))
+    for _ in range(6):
+        _advance(wheel, clock, 1)
+    assert fired == [1002, 1004, 1006]
+    assert wheel.remaining('tick') == 2
+
+    # 回调出错也会登记下一次
+    def failing():
+        fired.append('failed')
+        raise RuntimeError('boom')
+    wheel.every('tick', 2, failing)
+    _advance(wheel, clock, 2)
+    assert fired[-1] == 'failed' and 'tick' in wheel
+
+    wheel.cancel('tick')
+    _advance(wheel, clock, 10)
+    assert fired[-1] == 'failed' and len(fired) == 4
+
+
+def test_deadline_beyond_one_rotation_waits_for_its_round(wheel, clock):
+    fired = []
+    # 与 1 秒后的任务落在同一个槽位，但要多等两圈
+    wheel.schedule('far', 1 + 2 * SLOTS, fired.append, 'far')
+    wheel.schedule('near', 1, fired.append, 'near')
+    _advance(wheel, clock, 1)
+    assert fired == ['near']
+    for _ in range(2 * SLOTS - 1):
+        _advance(wheel, clock, 1)
+    assert fired == ['near']
+    _advance(wheel, clock, 1)
+    assert fired == ['near', 'far']
+
+
+def test_single_advance_across_several_rotations(wheel, clock):
+    fired = []
+    delays = [0.5, 3, SLOTS + 2, 2 * SLOTS + 5, 3 * SLOTS - 1]
+    for delay in reversed(delays):
+        wheel.schedule(delay, delay, fired.append, delay)
+    wheel.schedule('later', 4 * SLOTS, fired.append, 'later')
+
+    # 一次推进超过三圈：所有到期任务按到期时间顺序执行，未到期的保留
+    assert _advance(wheel, clock, 3 * SLOTS + 0.5) == len(delays)
+    assert fired == delays
+    assert len(wheel) == 1 and 'later' in wheel
+    _advance(wheel, clock, SLOTS)
+    assert fired[-1] == 'later'
@@ -0,0 +1,104 @@
+"""出站传输层测试
+
+可中断请求范围：看门狗中断卡住的请求时只断开该请求的连接，共享连接池继续可用。
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.core.transport import Transport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/hang':
+            # 收到请求后不响应，模拟卡死的上游
+            self.server.release.wait(10)
+            return
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.release = threading.Event()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_abort_interrupts_only_the_stuck_request(server):
+    transport = Transport()
+    session = transport.session()
+    other = transport.session()
+    assert other.get(f'{server}/ok', timeout=5).text == 'ok'
+
+    errors = []
+    scopes = []
+    started = threading.Event()
+
+    def stuck():
+        with transport.abortable() as scope:
+            scopes.append(scope)
+            started.set()
+            try:
+                session.get(f'{server}/hang', timeout=30)
+            except requests.RequestException as e:
+                errors.append(e)
+            # 中断后范围内的新请求直接失败
+            try:
+                session.get(f'{server}/ok', timeout=5)
+            except requests.RequestException as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=stuck)
+    thread.start()
+    assert started.wait(5)
+    time.sleep(0.3)
+
+    start = time.monotonic()
+    assert scopes[0].abort() == 1
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 5
+    assert len(errors) == 2
+
+    # 其他会话和共享连接池不受影响
+    assert other.get(f'{server}/ok', timeout=5).text == 'ok'
+    assert session.get(f'{server}/ok', timeout=5).text == 'ok'
+
+
+def test_released_connections_leave_the_scope(server):
+    transport = Transport()
+    session = transport.session()
+    with transport.abortable() as scope:
+        assert session.get(f'{server}/ok', timeout=5).text == 'ok'
+        assert scope.abort() == 0
+    assert session.get(f'{server}/ok', timeout=5).text == 'ok'
+
+
+def test_closing_a_session_keeps_the_shared_pools(server):
+    transport = Transport()
+    session = transport.session()
+    other = transport.session()
+    assert other.get(f'{server}/ok', timeout=5).text == 'ok'
+    pools = len(transport.adapter.poolmanager.pools)
+    session.close()
+    assert len(transport.adapter.poolmanager.pools) == pools
+    assert other.get(f'{server}/ok', timeout=5).text == 'ok'